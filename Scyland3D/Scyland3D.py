@@ -6,41 +6,154 @@
 # Created   15/02/2018
 #
 
+import io
 import os
 import csv
 import sys
+import stat
+import shutil
+import json
+import time
+import bisect
+import locale
+import heapq
+import fnmatch
+import struct
+import tarfile
+import zipfile
+import socket
+import hashlib
 import argparse
-import numpy as np
+import tempfile
+import subprocess
+import threading
+import functools
+import importlib
+import contextlib
+import multiprocessing
+import multiprocessing.pool
 
+try:
+    import queue
+    import socketserver
+except ImportError:
+    import Queue as queue
+    import SocketServer as socketserver
 
-def _export2csv(data, nb_landmark, outdir=None, feature_names=None, modif=""):
-    """export2csv
-    Export data to a CSV named indir + "../landmarks" + modif + ".csv".
+
+class _LazyModule(object):
+    """LazyModule
+    Import a module on the first access to one of its attributes, so that the command line starts
+    without waiting for the import of NumPy when it is not needed, e.g. to print the help or list the
+    files.
+
+    Args:
+        name (str): The name of the module.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__dict__["_name"])
+        # Further accesses do not go through __getattr__
+        self.__dict__.update(vars(module))
+        return getattr(module, attr)
+
+
+np = _LazyModule("numpy")
+
+# Default relative tolerance used to detect duplicated landmarks, needs to be between 4e-5 and 4e-7
+EPSILON = 1e-6
+# Number of points below which every pair of points is compared to find the duplicated landmarks
+_NB_DENSE_POINT = 256
+# Number of files processed together and kept in memory before being exported
+_CHUNK_SIZE = 1024
+# Version of the cached entries, to increment whenever the processing of a .pts file changes, and
+# statistics of the processing of each file stored in its entry
+_CACHE_VERSION = 2
+_CACHED_COUNTS = ["bytes", "points", "duplicates"]
+# Size in bytes of the header of the .npy files, large enough to store any shape
+_NPY_HEADER_SIZE = 128
+# Notations of the coordinates in the csv and their formats, the default one being used when a
+# precision is supplied
+_NOTATIONS = {"general": "g", "fixed": "f"}
+_NOTATION = "general"
+# Maximum number of iterations and convergence tolerance of the Generalized Procrustes Analysis
+_GPA_MAX_ITER = 100
+_GPA_TOLERANCE = 1e-10
+# Criteria minimized when sliding the semilandmarks along their curves, default maximum number of
+# iterations and relative change of the sum of squared Procrustes distances below which the sliding
+# has converged
+_SLIDING_METHODS = ["bending_energy", "procrustes"]
+_SLIDE_MAX_ITER = 10
+_SLIDE_TOLERANCE = 1e-4
+# Names of the values computed from the landmarks that can be exported between the coordinates
+# and the features
+_EXTRA_NAMES = ["centroid_size"]
+# Minimum duration in seconds between two progress reports and number of slowest files reported
+_PROGRESS_INTERVAL = 1.0
+_NB_SLOWEST = 10
+# Maximum difference between the coordinates of two specimens centered and scaled to a unit
+# centroid size below which they are duplicates, and number of random projections of the landmarks
+# rounded to find the candidate duplicates
+_DUPLICATE_TOLERANCE = 1e-3
+_NB_PROJECTION = 3
+# Modified z-score (deviation from the median relatively to the median absolute deviation) above
+# which the number of points or the centroid size of a specimen is an outlier
+_OUTLIER_THRESHOLD = 3.5
+# Maximum number of IDs printed for each kind of difference found by the compare subcommand
+_NB_SHOWN = 10
+# Number of threads writing the shards of a sharded output and maximum number of shards whose
+# temporary file is kept open, the least recently written ones being closed and reopened if needed
+_SHARD_THREADS = 4
+_MAX_OPEN_SHARDS = 64
+# Maximum size in bytes of the members of a tar archive read before their turn and kept in memory
+_MAX_PENDING_BYTES = 64 * 2 ** 20
+# Default glob pattern of the names of the files to process
+_PTS_PATTERN = "*.pts"
+# Default duration in seconds between two polls of the input directory in watch mode, and duration
+# without any change to wait before processing a burst of changes
+_WATCH_INTERVAL = 2.0
+_WATCH_DEBOUNCE = 1.0
+# Default number of jobs run concurrently by the server and number of jobs waiting to be run above
+# which the server stops reading new jobs
+_SERVER_JOBS = 4
+_SERVER_QUEUE_SIZE = 16
+# Functions that can be called by the jobs sent to the server
+_SERVER_FUNCTIONS = ["pts2csv", "compare"]
+
+# CPU time of the current process, time.process_time is not available in python 2
+_cpu_time = getattr(time, "process_time", None) or time.clock
+# Permission mask of the process, read once at import because it can only be read by changing it,
+# which is not safe once several threads write output files
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _csv_header(nb_landmark, nb_feature, feature_names=None, extra_names=()):
+    """csv_header
+    Generate the header of the csv.
 
     Args:
-        data (array): The landmarks to export.
         nb_landmark (int): The number of landmarks.
-        outdir (str): The name of the directory where the output files will be stored. If not
-            provided the current working directory will be used.
+        nb_feature (int): The number of features detected in the file names.
         feature_names (str or array of str): String describing each feature names separated with a
             comma or array of string (e.g. "age,sex,size" if supplied from the command line or
             ["age", "sex", "size"] if supplied in python script).
-        modif (str): The name of the modification applied to the data (e.g. none, reversed, and/or
-            reordered).
+        extra_names (array of str): The names of the columns computed from the landmarks that are
+            inserted between the coordinates and the features (e.g. ["centroid_size"]).
+
+    Returns:
+        An array of str containing the name of each column.
     """
-    # Generate the header of the csv and store it in fieldnames
     fieldnames = ["ID"]
     assert nb_landmark > 0, "The number of landmarks must be positive."
     # First add the numbered coordinates (e.g. x1,y1,z1,...,xN,yN,zN)
     for numb in range(1, nb_landmark + 1):
         for axe in ["x", "y", "z"]:
             fieldnames.append(axe + str(numb))
-    # Gather the number of features, i.e. observable variables, that corresponds to the length
-    # (i.e. number of columns) of one row of the data, minus the number of 3D coordinates,
-    # minus one that corresponds to the ID. Example:
-    # ID,x1,y1,z1,x2,y2,z2,...xN,yN,zN,feature1,feature2,...,featureM
-    # 200118G,25.6,11.6,23.9,26.5,23.5,14.9,...,25.5,11.5,23.8,mediterranean,female,...,mature
-    nb_feature = len(data[0]) - nb_landmark * 3 - 1
+    fieldnames.extend(extra_names)
     # Use generic feature names for the header if no feature_names has been provided by the user
     if feature_names is not None:
         if isinstance(feature_names, str):
@@ -57,289 +170,3915 @@ def _export2csv(data, nb_landmark, outdir=None, feature_names=None, modif=""):
     else:
         for numb in range(1, nb_feature + 1):
             fieldnames.append("Feature" + str(numb))
-    # Use the current folder if no output directory has been supplied by the user
-    if outdir is None:
-        outdir = "./"
-    output_filename = os.path.join(os.path.abspath(outdir), "landmarks" + modif + ".csv")
-    # Export the header and the data
-    # newline='' is use to fix #11. On Windows the csv package add an extra '\r' that is not
-    # observed on Unix systems.
-    # Additionally, this fix only works on python 3 as python 2 open's does not support the
-    # `newline` argument.
-    if sys.version_info[0] == 2:
-        access = 'wb'
-        kwargs = {}
-    else:
-        access = 'wt'
-        kwargs = {'newline':''}
-    with open(output_filename, access, **kwargs) as out_file:
-        csv.DictWriter(out_file, fieldnames=fieldnames).writeheader()
-        csv.writer(out_file).writerows(data)
-    print("File successfully generated: " + output_filename)
+    return fieldnames
 
 
-def _list_pts(indir):
-    """list_pts
-    Recursively lists all .pts file from indir.
+def _csv_field(field):
+    """csv_field
+    Quote a text field as csv.writer does, i.e. only when it contains a comma, a quote or a line
+    break.
 
     Args:
-        indir (str): The name of the directory where the .pts files are stored.
+        field (str): The text of the field.
 
     Returns:
-        An array of .pts file names to process. 
+        A str containing the field as written in the csv.
     """
-    assert os.path.exists(indir) and os.path.isdir(indir), indir + " not found."
-    filenames = [
-        os.path.join(dp, f)
-        for dp, dn, fn in os.walk(os.path.expanduser(indir))
-        for f in fn
+    field = str(field)
+    if any(char in field for char in ',"\r\n'):
+        return '"' + field.replace('"', '""') + '"'
+    return field
+
+
+def _format_coords(coords, precision=None, notation=_NOTATION):
+    """format_coords
+    Format a block of coordinates at once, one line per specimen.
+    Without precision, each value is written with the shortest representation that is read back as
+    the same float, as csv.writer does. This representation is computed in a single call for the
+    whole block by converting it to a nested list, except for float32 values which are written with
+    their own shortest representation instead of the one of the float64 they would be converted to.
+
+    Args:
+        coords (array): The values of shape (number of specimens, number of values).
+        precision (int): The number of significant digits in the general notation or of digits
+            after the decimal point in the fixed notation, None to write the exact values.
+        notation (str): "general" to use the scientific notation for large or small values, as with
+            "%g", or "fixed" to always use the decimal notation, as with "%f".
+
+    Returns:
+        An array of str containing the values of each specimen separated with a comma.
+    """
+    assert notation in _NOTATIONS, (
+        "The notation (" + str(notation) + ") must be one of " + ", ".join(sorted(_NOTATIONS)) + "."
+    )
+    if len(coords) == 0:
+        return []
+    if precision is None:
+        if coords.dtype == np.float32:
+            return [",".join(map(str, values)) for values in coords]
+        return [line.replace(", ", ",") for line in repr(coords.tolist())[2:-2].split("], [")]
+    assert precision >= 0, "The precision must be positive or null."
+    line_format = ",".join(["%." + str(int(precision)) + _NOTATIONS[notation]] * coords.shape[1])
+    return [line_format % tuple(values) for values in coords.tolist()]
+
+
+def _format_rows(ids, landmarks, features, extra=None, precision=None, notation=_NOTATION):
+    """format_rows
+    Format the rows of the csv of several specimens.
+
+    Args:
+        ids (array of str): The ID of each specimen.
+        landmarks (array): The landmarks of shape (number of specimens, number of landmarks, 3).
+        features (array of array of str): The features of each specimen.
+        extra (array): The values of the extra columns of shape (number of specimens, number of
+            extra columns).
+        precision (int): The number of digits of the coordinates, None to write the exact values.
+        notation (str): "general" or "fixed".
+
+    Returns:
+        An array of str containing each line of the csv with its line terminator.
+    """
+    coords = landmarks.reshape(landmarks.shape[0], -1)
+    if extra is not None:
+        coords = np.concatenate((coords, np.asarray(extra, dtype=coords.dtype)), axis=1)
+    return [
+        _csv_field(ident)
+        + ","
+        + line
+        + "".join("," + _csv_field(feature) for feature in factors)
+        + "\r\n"
+        for ident, line, factors in zip(ids, _format_coords(coords, precision, notation), features)
     ]
-    filenames = [filen for filen in filenames if ".pts" in filen]
-    # Fix #11 by sorting filenames to guarantee consistency between OS.
-    filenames.sort()
-    assert filenames, "There are no .pts files in " + indir
-    return filenames
 
 
-def _remove_duplicates(data):
-    """remove_duplicates
-    Remove the duplicates landmarks and semi-landmarks.
+def _replace(tmp_filename, filen):
+    """replace
+    Give a completed temporary file the default permissions instead of the private ones of
+    temporary files and rename it to its final name, replacing any existing file.
 
     Args:
-        data (array): Contains the landmarks.
+        tmp_filename (str): The path and name of the temporary file.
+        filen (str): The final path and name of the file.
+    """
+    os.chmod(tmp_filename, 0o666 & ~_UMASK)
+    # os.rename cannot overwrite an existing file on Windows with python 2
+    getattr(os, "replace", os.rename)(tmp_filename, filen)
+
+
+class _CsvExporter(object):
+    """CsvExporter
+    Stream rows to a CSV named outdir + "/landmarks" + modif + ".csv".
+    The header is written as soon as the exporter is created and the rows are appended as they are
+    produced through a bounded write buffer, so the memory used does not depend on the number of
+    rows. The rows are written to a temporary file in outdir that is renamed when the export is
+    completed, so an incomplete file is never left under the final name.
+
+    Args:
+        nb_landmark (int): The number of landmarks.
+        nb_feature (int): The number of features detected in the file names.
+        outdir (str): The name of the directory where the output files will be stored. If not
+            provided the current working directory will be used.
+        feature_names (str or array of str): String describing each feature names separated with a
+            comma or array of string (e.g. "age,sex,size" if supplied from the command line or
+            ["age", "sex", "size"] if supplied in python script).
+        extra_names (array of str): The names of the columns inserted between the coordinates and
+            the features.
+        buffer_size (int): The size in bytes of the write buffer.
+        precision (int): The number of digits of the coordinates, None to write the exact values.
+        notation (str): "general" to use the scientific notation for large or small values or
+            "fixed" to always use the decimal notation, when a precision is supplied.
+    """
+
+    def __init__(
+        self,
+        nb_landmark,
+        nb_feature,
+        outdir=None,
+        feature_names=None,
+        extra_names=(),
+        buffer_size=2 ** 20,
+        precision=None,
+        notation=_NOTATION,
+    ):
+        assert notation in _NOTATIONS, (
+            "The notation (" + str(notation) + ") must be one of "
+            + ", ".join(sorted(_NOTATIONS)) + "."
+        )
+        self.precision = precision
+        self.notation = notation
+        fieldnames = _csv_header(nb_landmark, nb_feature, feature_names, extra_names)
+        # Use the current folder if no output directory has been supplied by the user
+        if outdir is None:
+            outdir = "./"
+        self.outdir = os.path.abspath(outdir)
+        # newline='' is use to fix #11. On Windows the csv package add an extra '\r' that is not
+        # observed on Unix systems.
+        # Additionally, this fix only works on python 3 as python 2 open's does not support the
+        # `newline` argument.
+        if sys.version_info[0] == 2:
+            access = 'wb'
+            kwargs = {}
+        else:
+            access = 'wt'
+            kwargs = {'newline':''}
+        filed, self.tmp_filename = tempfile.mkstemp(
+            prefix=".landmarks", suffix=".csv.tmp", dir=self.outdir
+        )
+        self.out_file = os.fdopen(filed, access, buffer_size, **kwargs)
+        # Arguments used to reopen the temporary file to append rows once suspended
+        self.reopen_args = (access.replace("w", "a"), buffer_size)
+        self.reopen_kwargs = kwargs
+        self.suspended = False
+        self.writer = csv.writer(self.out_file)
+        self.writer.writerow(fieldnames)
+
+    def suspend(self):
+        """suspend
+        Close the temporary file to release its file descriptor until more rows are written.
+        """
+        self.out_file.close()
+        self.suspended = True
+
+    def _resume(self):
+        """resume
+        Reopen the temporary file of a suspended export to append rows.
+        """
+        if self.suspended:
+            self.out_file = open(self.tmp_filename, *self.reopen_args, **self.reopen_kwargs)
+            self.writer = csv.writer(self.out_file)
+            self.suspended = False
+
+    def writerows(self, rows):
+        """writerows
+        Append rows to the CSV.
+
+        Args:
+            rows (array): The rows to append.
+        """
+        self._resume()
+        self.writer.writerows(rows)
+
+    def write(self, ids, landmarks, features, extra=None):
+        """write
+        Append the rows of several specimens to the CSV, their coordinates being formatted at once.
+
+        Args:
+            ids (array of str): The ID of each specimen.
+            landmarks (array): The landmarks of shape (number of specimens, number of landmarks, 3).
+            features (array of array of str): The features of each specimen.
+            extra (array): The values of the extra columns of shape (number of specimens, number
+                of extra columns).
+        """
+        self._resume()
+        self.out_file.writelines(
+            _format_rows(ids, landmarks, features, extra, self.precision, self.notation)
+        )
+
+    def writelines(self, lines):
+        """writelines
+        Append rows already formatted as CSV lines.
+
+        Args:
+            lines (array of str): The lines to append, each ending with its line terminator.
+        """
+        self._resume()
+        self.out_file.writelines(lines)
+
+    def finish(self):
+        """finish
+        Complete the temporary file and release its file descriptor. No row can be written
+        afterwards, and the file keeps its temporary name until close() is called, when the name of
+        the output is known.
+        """
+        self.out_file.close()
+        self.suspended = False
+
+    def close(self, modif=""):
+        """close
+        Complete the export by renaming the temporary file to its final name.
+
+        Args:
+            modif (str): The name of the modification applied to the data (e.g. none, reversed,
+                and/or reordered).
+
+        Returns:
+            The path and name of the generated file.
+        """
+        self.finish()
+        output_filename = os.path.join(self.outdir, "landmarks" + modif + ".csv")
+        _replace(self.tmp_filename, output_filename)
+        self.filenames = [output_filename]
+        print("File successfully generated: " + output_filename)
+        return output_filename
+
+    def abort(self):
+        """abort
+        Stop the export and remove the temporary file.
+        """
+        self.out_file.close()
+        if os.path.exists(self.tmp_filename):
+            os.remove(self.tmp_filename)
+
+
+def _savez_tmp(dirn, **arrays):
+    """savez_tmp
+    Save arrays in an uncompressed temporary .npz file, to be renamed with _replace() once its final
+    name is known.
+
+    Args:
+        dirn (str): The name of the directory of the temporary file.
+        arrays (dict of array): The arrays to save, indexed by their name.
 
     Returns:
-        An array of landmarks where duplicates were removed.
-    """
-    data = data[7:]
-    # Remove easy duplicates in the coordinates where the string are an exact match
-    data = sorted(set(data), key=data.index)
-    # Remove the other duplicates because some landmarks and semilandmarks are sometimes exported twice.
-    coord = []
-    # Convert the coordinates from str to float
-    for item in data:
-        coord.append([float(xyz) for xyz in item.split(",")])
-    index_to_remove = []
-    # Check which landmarks have similar coordinates up to epsilon
-    epsilon = 1e-6 # needs to be between 4e-5 and 4e-7
-    for i in range(len(coord) - 1):
-        for j in range(len(coord) - i - 1):
-            if (abs(coord[i][0] - coord[i + j + 1][0]) < (epsilon * coord[i][0]) and abs(coord[i][1] - coord[i + j + 1][1]) < (epsilon * coord[i][1]) and abs(coord[i][2] - coord[i + j + 1][2]) < (epsilon * coord[i][2])):
-                index_to_remove.append(i + j + 1)
-    # Return only landmarks that have not been detected as duplicates 
-    new_data = []
-    for i, item in enumerate(coord):
-        if i not in index_to_remove:
-            new_data.append(item)
-    return new_data
+        The path and name of the temporary file.
+    """
+    filed, tmp_filename = tempfile.mkstemp(prefix=".landmarks", suffix=".npz.tmp", dir=dirn)
+    with os.fdopen(filed, "wb") as filep:
+        np.savez(filep, **arrays)
+    return tmp_filename
 
 
-def _reverse_z(data):
-    """reverse_z
-    Find the relative z-axis for a given set of point by computing a plane that minimizes the
-    difference between it and the given points.
-    Then reverses the set of points relatively to this new plane, so no user specific plane has to
-    be supplied.
-    Inspired from https://www.youtube.com/watch?v=86lwcXeZoiA and the suggestion from
-    https://stackoverflow.com/questions/8954326/how-to-calculate-the-mirror-point-along-a-line#8954454
-    is not applicable here as it is not valid in 3D and does not take into account relative axes. 
+def _savez(filen, **arrays):
+    """savez
+    Save arrays in an uncompressed .npz file through a temporary file that is renamed once written.
 
     Args:
-        data (array): Contains the landmarks.
+        filen (str): The path and name of the .npz file.
+        arrays (dict of array): The arrays to save, indexed by their name.
+    """
+    _replace(_savez_tmp(os.path.dirname(os.path.abspath(filen)), **arrays), filen)
+
+
+def _npy_header(shape, dtype):
+    """npy_header
+    Generate the header of a .npy file padded to a fixed length, so that the header of a file whose
+    number of rows is not known yet can be rewritten once all the rows have been written.
+
+    Args:
+        shape (tuple of int): The shape of the array.
+        dtype (numpy.dtype): The type of the array.
 
     Returns:
-        An array of landmarks inverted along the z-axis.
+        The bytes of the header of the .npy file (version 1.0).
     """
-    matrix_xy = []
-    matrix_z = []
-    # Split the coordinates in an xy plane and a z axis
-    for xyz in data:
-        x = xyz[0]
-        y = xyz[1]
-        z = xyz[2]
-        matrix_xy.append([x, y, 1])
-        matrix_z.append(z)
-    # Gather the coefficients for a linear fitting
-    b = np.matrix(matrix_z).T
-    A = np.matrix(matrix_xy)
-    # Compute the linear fit for the plane going through all landmarks points
-    fit = (A.T * A).I * A.T * b
-
-    # Gather the parameters for the plane (A,B,C,D) defined by A*x + B*y + C*z + D
-    A = fit[0]
-    B = fit[1]
-    # Compute the inversion coefficients for the mirroring
-    C = -1.0
-    D = -fit[2]
-    data_mirror = []
-    for xyz in data:
-        x = xyz[0]
-        y = xyz[1]
-        z = xyz[2]
-        # Compute the symmetry point that is the intersection between the plane (A,B,C,D) and a
-        # perpendicular line to that plane that go through the point of interest defined by (x,y,z).
-        t = float((D - A * x - B * y - C * z) / (A * A + B * B + C * C))
-        # Compute the resulting value for the mirrored points where the new coordinate is equal to
-        # twice the distance between the old coordinate and the symmetry point.
-        xp = float(x + 2.0 * A * t)
-        yp = float(y + 2.0 * B * t)
-        zp = float(z + 2.0 * C * t)
-        data_mirror.append([xp, yp, zp])
-    return data_mirror
+    header = "{'descr': " + repr(np.lib.format.dtype_to_descr(np.dtype(dtype)))
+    header += ", 'fortran_order': False, 'shape': " + repr(tuple(shape)) + ", }"
+    # The magic string, the version and the length of the header take 10 bytes
+    header = header.ljust(_NPY_HEADER_SIZE - 10 - 1) + "\n"
+    assert len(header) == _NPY_HEADER_SIZE - 10, "The shape " + str(shape) + " is too long."
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
 
 
-def _get_path(filen):
-    """_get_path
-    Return the absolute path of the provided file name from the absolute resources directory.
+class _NpyExporter(object):
+    """NpyExporter
+    Stream the landmarks to a memory-mappable .npy file named outdir + "/landmarks" + modif + ".npy"
+    containing an array of shape (number of specimens, number of landmarks, 3), the IDs, the features
+    and their names being stored in a companion file named "landmarks" + modif + "_factors.npz".
+    If npz is True, everything is stored instead in a single file named "landmarks" + modif + ".npz".
+    The landmarks are appended to a temporary file as they are produced and the files are renamed
+    when the export is completed. Use load_landmarks() to read the generated files.
 
     Args:
-        filen (str): The name of the file in the relative path of the package.
+        nb_landmark (int): The number of landmarks.
+        nb_feature (int): The number of features detected in the file names.
+        outdir (str): The name of the directory where the output files will be stored. If not
+            provided the current working directory will be used.
+        feature_names (str or array of str): String describing each feature names separated with a
+            comma or array of string.
+        extra_names (array of str): The names of the values computed from the landmarks that are
+            stored in the companion file (e.g. ["centroid_size"]).
+        npz (bool): Whether to store everything in a single .npz file.
+    """
+
+    def __init__(
+        self,
+        nb_landmark,
+        nb_feature,
+        outdir=None,
+        feature_names=None,
+        extra_names=(),
+        npz=False,
+    ):
+        fieldnames = _csv_header(nb_landmark, nb_feature, feature_names, extra_names)
+        self.feature_names = fieldnames[1 + nb_landmark * 3 + len(extra_names) :]
+        self.extra_names = list(extra_names)
+        self.nb_landmark = nb_landmark
+        self.npz = npz
+        # The landmarks are stored with the type of the first landmarks written
+        self.dtype = None
+        self.ids = []
+        self.features = []
+        self.extra = []
+        # Temporary file of the IDs and features of a .npy file once the export is finished
+        self.tmp_factors = None
+        if outdir is None:
+            outdir = "./"
+        self.outdir = os.path.abspath(outdir)
+        filed, self.tmp_filename = tempfile.mkstemp(
+            prefix=".landmarks", suffix=".npy.tmp", dir=self.outdir
+        )
+        self.out_file = os.fdopen(filed, "wb")
+        self.suspended = False
+        self.out_file.write(_npy_header((0, nb_landmark, 3), np.float64))
+
+    def suspend(self):
+        """suspend
+        Close the temporary file to release its file descriptor until more landmarks are written.
+        """
+        self.out_file.close()
+        self.suspended = True
+
+    def _resume(self):
+        """resume
+        Reopen the temporary file of a suspended export to append landmarks.
+        """
+        if self.suspended:
+            # The file is not opened in append mode so that its header can be rewritten
+            self.out_file = open(self.tmp_filename, "r+b")
+            self.out_file.seek(0, os.SEEK_END)
+            self.suspended = False
+
+    def write(self, ids, landmarks, features, extra=None):
+        """write
+        Append the landmarks of several specimens.
+
+        Args:
+            ids (array of str): The ID of each specimen.
+            landmarks (array): The landmarks of shape (number of specimens, number of landmarks, 3).
+            features (array of array of str): The features of each specimen.
+            extra (array): The values computed from the landmarks of shape (number of specimens,
+                number of extra values).
+        """
+        if self.dtype is None:
+            self.dtype = np.dtype(landmarks.dtype if landmarks.dtype.kind == "f" else np.float64)
+            self.dtype = self.dtype.newbyteorder("<")
+        self._resume()
+        self.out_file.write(np.ascontiguousarray(landmarks, dtype=self.dtype).tobytes())
+        self.ids.extend(ids)
+        self.features.extend(features)
+        if extra is not None:
+            self.extra.append(np.asarray(extra, dtype=np.float64))
+
+    def finish(self):
+        """finish
+        Complete the temporary files by writing the final shape in the header and the companion
+        arrays, and release the file descriptor and the IDs and features kept in memory. No
+        landmarks can be written afterwards, and the files keep their temporary names until close()
+        is called, when the name of the output is known.
+        """
+        if self.out_file.closed and not self.suspended:
+            return
+        self._resume()
+        self.out_file.seek(0)
+        self.out_file.write(
+            _npy_header((len(self.ids), self.nb_landmark, 3), self.dtype or np.dtype("<f8"))
+        )
+        self.out_file.close()
+        factors = {
+            "ids": np.array(self.ids, dtype=np.str_),
+            "features": np.array(self.features, dtype=np.str_).reshape(
+                len(self.ids), len(self.feature_names)
+            ),
+            "feature_names": np.array(self.feature_names, dtype=np.str_),
+        }
+        if self.extra_names:
+            extra = np.concatenate(self.extra, axis=0)
+            for index, name in enumerate(self.extra_names):
+                factors[name] = extra[:, index]
+        if self.npz:
+            landmarks = np.load(self.tmp_filename, mmap_mode="r")
+            tmp_filename = _savez_tmp(self.outdir, landmarks=landmarks, **factors)
+            del landmarks
+            os.remove(self.tmp_filename)
+            self.tmp_filename = tmp_filename
+        else:
+            self.tmp_factors = _savez_tmp(self.outdir, **factors)
+        self.ids = self.features = self.extra = None
+
+    def close(self, modif=""):
+        """close
+        Complete the export and rename the files to their final names.
+
+        Args:
+            modif (str): The name of the modification applied to the data (e.g. none, reversed,
+                and/or reordered).
+
+        Returns:
+            The path and name of the generated file.
+        """
+        self.finish()
+        output_filename = os.path.join(self.outdir, "landmarks" + modif)
+        if self.npz:
+            output_filename += ".npz"
+            _replace(self.tmp_filename, output_filename)
+            self.filenames = [output_filename]
+        else:
+            _replace(self.tmp_factors, output_filename + "_factors.npz")
+            self.filenames = [output_filename + ".npy", output_filename + "_factors.npz"]
+            output_filename += ".npy"
+            _replace(self.tmp_filename, output_filename)
+        print("File successfully generated: " + output_filename)
+        return output_filename
+
+    def abort(self):
+        """abort
+        Stop the export and remove the temporary files.
+        """
+        self.out_file.close()
+        for tmp_filename in [self.tmp_filename, self.tmp_factors]:
+            if tmp_filename is not None and os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+
+def _load_csv(filen, chunk_size=_CHUNK_SIZE):
+    """load_csv
+    Load the landmarks of a csv generated by pts2csv(). The rows are split with the csv module and
+    the coordinates of each chunk of rows are converted to floats at once.
+
+    Args:
+        filen (str): The path and name of the .csv file.
+        chunk_size (int): The number of rows converted at once.
 
     Returns:
-        An absolute path to the custom resources provided with the package.
+        The same arrays as load_landmarks().
     """
-    return os.path.join(os.path.abspath(os.path.dirname(__file__)), filen)
+    with open(filen, "r") as filep:
+        reader = csv.reader(filep)
+        header = next(reader)
+        nb_coord = 0
+        while 1 + nb_coord < len(header) and header[1 + nb_coord][:1] in "xyz" and header[
+            1 + nb_coord
+        ][1:].isdigit():
+            nb_coord += 1
+        assert nb_coord > 0 and nb_coord % 3 == 0, filen + " does not contain landmarks."
+        # Skip the values computed from the landmarks, inserted before the features
+        start = 1 + nb_coord
+        while start < len(header) and header[start] in _EXTRA_NAMES:
+            start += 1
+        ids = []
+        features = []
+        chunks = []
+        for rows in _chunks(reader, chunk_size):
+            ids.extend(row[0] for row in rows)
+            features.extend(row[start:] for row in rows)
+            chunks.append(
+                np.array(
+                    [val for row in rows for val in row[1 : 1 + nb_coord]], dtype=np.float64
+                ).reshape(len(rows), nb_coord // 3, 3)
+            )
+    landmarks = np.concatenate(chunks) if chunks else np.empty((0, nb_coord // 3, 3))
+    return (
+        np.array(ids, dtype=np.str_),
+        landmarks,
+        np.array(features, dtype=np.str_).reshape(len(ids), len(header) - start),
+        np.array(header[start:], dtype=np.str_),
+    )
 
 
-def pts2csv(
-    indir=None,
-    outdir=None,
-    mirror_factor=None,
-    order=None,
-    order_factor=None,
-    feature_names=None,
-    verbose=False,
+def load_landmarks(filen, mmap_mode="r"):
+    """load_landmarks
+    Load the landmarks exported by pts2csv() in the csv, npy or npz output format.
+
+    Args:
+        filen (str): The path and name of the .csv, .npy or .npz file.
+        mmap_mode (str): The mode used to memory-map the landmarks of a .npy file (see numpy.load),
+            None loading them in memory.
+
+    Returns:
+        An array of str containing the ID of each specimen, an array of float of shape (number of
+        specimens, number of landmarks, 3) containing the landmarks, an array of str of shape
+        (number of specimens, number of features) containing the features and an array of str
+        containing the feature names.
+    """
+    assert os.path.isfile(filen), filen + " not found."
+    if filen.endswith(".csv"):
+        return _load_csv(filen)
+    if filen.endswith(".npz"):
+        with np.load(filen) as data:
+            return data["ids"], data["landmarks"], data["features"], data["feature_names"]
+    assert filen.endswith(".npy"), "The landmarks must be stored in a .csv, .npy or .npz file."
+    landmarks = np.load(filen, mmap_mode=mmap_mode)
+    with np.load(filen[: -len(".npy")] + "_factors.npz") as data:
+        return data["ids"], landmarks, data["features"], data["feature_names"]
+
+
+def _export2csv(
+    data, nb_landmark, outdir=None, feature_names=None, modif="", precision=None, notation=_NOTATION
 ):
-    """pts2csv
-    Convert .pts files from indir to a single .csv file
+    """export2csv
+    Export data to a CSV named outdir + "/landmarks" + modif + ".csv".
+
+    Args:
+        data (array): The landmarks to export.
+        nb_landmark (int): The number of landmarks.
+        outdir (str): The name of the directory where the output files will be stored. If not
+            provided the current working directory will be used.
+        feature_names (str or array of str): String describing each feature names separated with a
+            comma or array of string (e.g. "age,sex,size" if supplied from the command line or
+            ["age", "sex", "size"] if supplied in python script).
+        modif (str): The name of the modification applied to the data (e.g. none, reversed, and/or
+            reordered).
+        precision (int): The number of digits of the coordinates, None to write the exact values.
+        notation (str): "general" to use the scientific notation for large or small values or
+            "fixed" to always use the decimal notation, when a precision is supplied.
+
+    Returns:
+        The path and name of the generated file.
+    """
+    # Gather the number of features, i.e. observable variables, that corresponds to the length
+    # (i.e. number of columns) of one row of the data, minus the number of 3D coordinates,
+    # minus one that corresponds to the ID. Example:
+    # ID,x1,y1,z1,x2,y2,z2,...xN,yN,zN,feature1,feature2,...,featureM
+    # 200118G,25.6,11.6,23.9,26.5,23.5,14.9,...,25.5,11.5,23.8,mediterranean,female,...,mature
+    nb_feature = len(data[0]) - nb_landmark * 3 - 1
+    exporter = _CsvExporter(
+        nb_landmark,
+        nb_feature,
+        outdir=outdir,
+        feature_names=feature_names,
+        precision=precision,
+        notation=notation,
+    )
+    try:
+        # Format the coordinates of all the rows at once
+        exporter.write(
+            [row[0] for row in data],
+            np.array([row[1 : 1 + nb_landmark * 3] for row in data], dtype=np.float64),
+            [row[1 + nb_landmark * 3 :] for row in data],
+        )
+    except BaseException:
+        exporter.abort()
+        raise
+    return exporter.close(modif)
+
+
+# Exporters used for each output format
+_EXPORTERS = {
+    "csv": _CsvExporter,
+    "npy": _NpyExporter,
+    "npz": functools.partial(_NpyExporter, npz=True),
+}
+
+
+def _shard_name(value):
+    """shard_name
+    Return a str that can be used in a file name to identify the value of a feature.
+
+    Args:
+        value (str): The value of the feature.
+
+    Returns:
+        A str containing only letters, digits, dots and dashes.
+    """
+    return "".join(char if char.isalnum() or char in ".-" else "-" for char in value)
+
+
+class _ShardedExporter(object):
+    """ShardedExporter
+    Split an output in several files, either one file per value of a feature, files of at most
+    chunk_size rows, or files of at most chunk_size rows for each value of a feature. Each shard is
+    exported by its own exporter of the chosen output format, created when its first row is
+    written and finished as soon as it contains chunk_size rows. At most max_open shards keep their
+    temporary file open: the least recently written ones are suspended and their file is reopened
+    when they receive more rows, so that the number of open files does not depend on the number of
+    values of the feature. The IDs and features of the npy and npz shards are kept in memory until
+    they are finished. The shards of each chunk of rows are written concurrently by a pool of
+    threads.
+    A manifest named "landmarks" + modif + "_manifest.json" lists the files of each shard with its
+    number of rows and the IDs of its first and last rows.
+
+    Args:
+        create (function): The function creating the exporter of a shard.
+        chunk_size (int): The maximum number of rows of each shard, None for no maximum.
+        shard_by (int): The position of the feature whose values are written in different shards,
+            None to only split the rows by chunk_size.
+        shard_name (str): The name of that feature, stored in the manifest.
+        threads (int): The number of threads writing the shards.
+        max_open (int): The maximum number of shards whose temporary file is open.
+    """
+
+    def __init__(
+        self,
+        create,
+        chunk_size=None,
+        shard_by=None,
+        shard_name=None,
+        threads=_SHARD_THREADS,
+        max_open=_MAX_OPEN_SHARDS,
+    ):
+        assert chunk_size is not None or shard_by is not None, "Must supply chunk_size or shard_by."
+        assert chunk_size is None or chunk_size > 0, "The chunk_size must be positive."
+        assert max_open > 0, "The maximum number of open shards must be positive."
+        self.create = create
+        self.chunk_size = chunk_size
+        self.shard_by = shard_by
+        self.shard_name = shard_name
+        self.shards = {}
+        self.keys = []
+        self.counts = {}
+        self.max_open = max_open
+        # Keys of the shards whose file is open, from the least to the most recently written
+        self.open = []
+        self.pool = multiprocessing.pool.ThreadPool(threads) if threads > 1 else None
+
+    def _map(self, func, items):
+        """map
+        Apply func to each item, concurrently if there are several items.
+        """
+        if self.pool is None or len(items) < 2:
+            return [func(item) for item in items]
+        return self.pool.map(func, items)
+
+    def write(self, ids, landmarks, features, extra=None):
+        """write
+        Append the rows of several specimens to their shards.
+
+        Args:
+            ids (array of str): The ID of each specimen.
+            landmarks (array): The landmarks of shape (number of specimens, number of landmarks, 3).
+            features (array of array of str): The features of each specimen.
+            extra (array): The values of the extra columns of shape (number of specimens, number
+                of extra columns).
+        """
+        groups = {}
+        for row, feature in enumerate(features):
+            value = feature[self.shard_by] if self.shard_by is not None else None
+            count = self.counts.get(value, 0)
+            self.counts[value] = count + 1
+            key = (value, count // self.chunk_size if self.chunk_size is not None else None)
+            if key not in groups:
+                groups[key] = []
+                if key not in self.shards:
+                    self.shards[key] = {"exporter": self.create(), "rows": 0, "first_id": ids[row]}
+                    self.keys.append(key)
+            groups[key].append(row)
+
+        def write_shard(task):
+            exporter, rows, full = task
+            exporter.write(
+                [ids[row] for row in rows],
+                landmarks[rows],
+                [features[row] for row in rows],
+                extra[rows] if extra is not None else None,
+            )
+            # No other row is written to a full shard, which only waits to be renamed by close()
+            if full:
+                exporter.finish()
+
+        keys = list(groups)
+        for start in range(0, len(keys), self.max_open):
+            batch = keys[start : start + self.max_open]
+            # Suspend the least recently written shards so that at most max_open files are open
+            self.open = [key for key in self.open if key not in set(batch)]
+            nb_suspended = max(len(self.open) + len(batch) - self.max_open, 0)
+            for key in self.open[:nb_suspended]:
+                self.shards[key]["exporter"].suspend()
+            del self.open[:nb_suspended]
+            tasks = []
+            for key in batch:
+                shard = self.shards[key]
+                shard["rows"] += len(groups[key])
+                shard["last_id"] = ids[groups[key][-1]]
+                full = shard["rows"] == self.chunk_size
+                tasks.append((shard["exporter"], np.array(groups[key], dtype=np.intp), full))
+                if not full:
+                    self.open.append(key)
+            self._map(write_shard, tasks)
+
+    def _suffix(self, key):
+        """suffix
+        Return the suffix of the name of the files of a shard.
+        """
+        value, index = key
+        suffix = ""
+        if value is not None:
+            suffix += "_" + _shard_name(value)
+        if index is not None:
+            suffix += "_%05d" % index
+        return suffix
+
+    def close(self, modif=""):
+        """close
+        Complete the export of all the shards and write the manifest.
+
+        Args:
+            modif (str): The name of the modification applied to the data.
+
+        Returns:
+            The path and name of the manifest.
+        """
+        try:
+            self._map(
+                lambda key: self.shards[key]["exporter"].close(modif + self._suffix(key)), self.keys
+            )
+        finally:
+            self._close_pool()
+        outdir = self.shards[self.keys[0]]["exporter"].outdir
+        manifest = {"chunk_size": self.chunk_size, "shard_by": self.shard_name, "shards": []}
+        self.filenames = []
+        for key in self.keys:
+            shard = self.shards[key]
+            filenames = shard["exporter"].filenames
+            self.filenames.extend(filenames)
+            manifest["shards"].append(
+                {
+                    "files": [os.path.basename(filen) for filen in filenames],
+                    "value": key[0],
+                    "rows": shard["rows"],
+                    "first_id": shard["first_id"],
+                    "last_id": shard["last_id"],
+                }
+            )
+        manifest["rows"] = sum(shard["rows"] for shard in manifest["shards"])
+        output_filename = os.path.join(outdir, "landmarks" + modif + "_manifest.json")
+        filed, tmp_filename = tempfile.mkstemp(prefix=".", suffix=".json.tmp", dir=outdir)
+        with os.fdopen(filed, "w") as filep:
+            json.dump(manifest, filep, indent=2)
+        _replace(tmp_filename, output_filename)
+        self.filenames.append(output_filename)
+        print("File successfully generated: " + output_filename)
+        return output_filename
+
+    def _close_pool(self):
+        """close_pool
+        Stop the threads writing the shards.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def abort(self):
+        """abort
+        Stop the export and remove the temporary files of all the shards.
+        """
+        self._close_pool()
+        for key in self.keys:
+            self.shards[key]["exporter"].abort()
+
+
+def _split_patterns(patterns):
+    """split_patterns
+    Return a list of glob patterns from a string of patterns separated with a comma (if supplied
+    from the command line) or from a list of patterns.
+
+    Args:
+        patterns (str or array of str): The patterns, or None.
+
+    Returns:
+        An array of str containing the patterns.
+    """
+    if patterns is None:
+        return []
+    if isinstance(patterns, str):
+        patterns = patterns.split(",")
+    return [pattern.strip() for pattern in patterns if pattern.strip()]
+
+
+def _scandir(dirn):
+    """scandir
+    List the entries of a directory with os.scandir, which gives the type of the entries without
+    an additional system call, or with os.listdir on python 2.
+
+    Args:
+        dirn (str): The name of the directory.
+
+    Returns:
+        An array of tuples containing the name of each entry, its path and whether it is a directory.
+    """
+    if hasattr(os, "scandir"):
+        return [
+            (entry.name, entry.path, entry.is_dir(follow_symlinks=False))
+            for entry in os.scandir(dirn)
+        ]
+    entries = []
+    for name in os.listdir(dirn):
+        path = os.path.join(dirn, name)
+        entries.append((name, path, os.path.isdir(path) and not os.path.islink(path)))
+    return entries
+
+
+def _match_name(name, include, exclude):
+    """match_name
+    Return True if a file name matches one of the include patterns and none of the exclude
+    patterns.
+
+    Args:
+        name (str): The name of the file, without its directory.
+        include (array of str): The glob patterns that the name must match.
+        exclude (array of str): The glob patterns of the names to ignore.
+
+    Returns:
+        A bool indicating if the file must be processed.
+    """
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in include) and not any(
+        fnmatch.fnmatchcase(name, pattern) for pattern in exclude
+    )
+
+
+def _walk_pts(dirn, include, exclude, exclude_dirs):
+    """walk_pts
+    Recursively yield the files of dirn whose names match the include patterns and none of the
+    exclude patterns, without walking the directories that match the exclude_dirs patterns.
+    The entries of each directory are sorted so that the files are yielded in the same order as
+    the sorted array of their paths, a directory being sorted as its name followed by a separator.
+
+    Args:
+        dirn (str): The name of the directory to walk.
+        include (array of str): The glob patterns that the file names must match.
+        exclude (array of str): The glob patterns of the file names to ignore.
+        exclude_dirs (array of str): The glob patterns of the directory names to ignore.
+
+    Returns:
+        A generator of file names.
+    """
+    entries = _scandir(dirn)
+    entries.sort(key=lambda entry: entry[0] + os.sep if entry[2] else entry[0])
+    for name, path, is_dir in entries:
+        if is_dir:
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in exclude_dirs):
+                continue
+            try:
+                for filen in _walk_pts(path, include, exclude, exclude_dirs):
+                    yield filen
+            except OSError:
+                # Ignore the directories that cannot be read, as os.walk() does
+                continue
+        elif _match_name(name, include, exclude):
+            yield path
+
+
+def _iter_pts(indir, include=None, exclude=None, exclude_dirs=None):
+    """iter_pts
+    Recursively yield the .pts files from indir while walking the directories, so that the files
+    can be processed before the walk is over. The files are yielded in the sorted order of their
+    paths in order to guarantee consistency between OS (#11).
+
+    Args:
+        indir (str): The name of the directory where the .pts files are stored.
+        include (str or array of str): The glob patterns that the file names must match, "*.pts"
+            by default.
+        exclude (str or array of str): The glob patterns of the file names to ignore.
+        exclude_dirs (str or array of str): The glob patterns of the names of the directories that
+            are not walked.
+
+    Returns:
+        A generator of .pts file names.
+    """
+    indir = os.path.expanduser(indir)
+    assert os.path.exists(indir) and os.path.isdir(indir), indir + " not found."
+    include = _split_patterns(include) or [_PTS_PATTERN]
+    return _walk_pts(indir, include, _split_patterns(exclude), _split_patterns(exclude_dirs))
+
+
+def _list_pts(indir, include=None, exclude=None, exclude_dirs=None):
+    """list_pts
+    Return the sorted list of the .pts files from indir.
+
+    Args:
+        indir (str): The name of the directory where the .pts files are stored.
+        include (str or array of str): The glob patterns that the file names must match.
+        exclude (str or array of str): The glob patterns of the file names to ignore.
+        exclude_dirs (str or array of str): The glob patterns of the directory names to ignore.
+
+    Returns:
+        An array of str containing the .pts file names.
+    """
+    list_pts_files = list(_iter_pts(indir, include, exclude, exclude_dirs))
+    assert list_pts_files, "There are no .pts files in " + indir
+    return list_pts_files
+
+
+class _ArchiveMember(object):
+    """ArchiveMember
+    A .pts file stored in an archive, read in memory instead of being extracted.
+
+    Attributes:
+        path (str): The path and name the file would have if the archive was extracted in its
+            directory, used to compute the ID and the features.
+        content (bytes): The content of the file.
+        signature (dict): The archive, size, modification time and possibly checksum of the
+            member, used by the cache.
+    """
+
+    def __init__(self, path, content, signature):
+        self.path = path
+        self.content = content
+        self.signature = signature
+
+
+def _is_archive(indir):
+    """is_archive
+    Return True if indir is a zip or tar archive (possibly compressed with gzip, bzip2 or xz)
+    rather than a directory.
+
+    Args:
+        indir (str): The name of the directory or archive where the .pts files are stored.
+
+    Returns:
+        A bool indicating if indir is an archive.
+    """
+    return os.path.isfile(indir) and (zipfile.is_zipfile(indir) or tarfile.is_tarfile(indir))
+
+
+def _archive_path(archive, name, include, exclude, exclude_dirs):
+    """archive_path
+    Return the path a member of an archive would have if the archive was extracted in its
+    directory, or None if the member must be ignored.
+
+    Args:
+        archive (str): The path and name of the archive.
+        name (str): The name of the member in the archive, whose directories are separated by "/".
+        include (array of str): The glob patterns that the file names must match.
+        exclude (array of str): The glob patterns of the file names to ignore.
+        exclude_dirs (array of str): The glob patterns of the directory names to ignore.
+
+    Returns:
+        A str containing the path of the member, or None.
+    """
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    # The members that would be extracted outside of the directory of the archive are ignored
+    if not parts or name.startswith("/") or ".." in parts:
+        return None
+    if not _match_name(parts[-1], include, exclude):
+        return None
+    if any(fnmatch.fnmatchcase(part, pattern) for part in parts[:-1] for pattern in exclude_dirs):
+        return None
+    return os.path.join(os.path.dirname(archive), *parts)
+
+
+def _iter_zip(archive, include, exclude, exclude_dirs):
+    """iter_zip
+    Yield the .pts files of a zip archive in the sorted order of their paths. The members are read
+    directly from their offset in the archive, listed by its central directory.
+
+    Args:
+        archive (str): The path and name of the zip archive.
+        include (array of str): The glob patterns that the file names must match.
+        exclude (array of str): The glob patterns of the file names to ignore.
+        exclude_dirs (array of str): The glob patterns of the directory names to ignore.
+
+    Returns:
+        A generator of _ArchiveMember.
+    """
+    with zipfile.ZipFile(archive) as zfile:
+        members = {}
+        for info in zfile.infolist():
+            path = None if info.filename.endswith("/") else _archive_path(
+                archive, info.filename, include, exclude, exclude_dirs
+            )
+            if path is not None:
+                # When a name is stored several times, the last member is the one extracted
+                members[path] = info
+        for path in sorted(members):
+            info = members[path]
+            signature = {
+                "archive": os.path.abspath(archive),
+                "size": info.file_size,
+                "mtime": list(info.date_time),
+                "crc": info.CRC,
+            }
+            yield _ArchiveMember(path, zfile.read(info), signature)
+
+
+def _iter_tar(archive, include, exclude, exclude_dirs, max_pending=_MAX_PENDING_BYTES):
+    """iter_tar
+    Yield the .pts files of a tar archive in the sorted order of their paths. The archive is read
+    sequentially, which never seeks backward in compressed archives, and the members are kept in
+    memory until all the members that precede them in the sorted order have been yielded. As this
+    order is only known once all the headers have been read, at most max_pending bytes of members
+    are kept: when a larger archive is not stored in the sorted order, it is read again from the
+    start (and decompressed again) for each max_pending bytes of members stored out of order.
+
+    Args:
+        archive (str): The path and name of the tar archive.
+        include (array of str): The glob patterns that the file names must match.
+        exclude (array of str): The glob patterns of the file names to ignore.
+        exclude_dirs (array of str): The glob patterns of the directory names to ignore.
+        max_pending (int): The maximum size in bytes of the members kept in memory.
+
+    Returns:
+        A generator of _ArchiveMember.
+    """
+    with tarfile.open(archive, "r:*") as tfile:
+
+        def read(info, path):
+            signature = {"archive": os.path.abspath(archive), "size": info.size, "mtime": info.mtime}
+            return _ArchiveMember(path, tfile.extractfile(info).read(), signature)
+
+        # Read the headers and the first members in a single pass
+        members = {}
+        pending = {}
+        pending_size = 0
+        for info in tfile:
+            path = None if not info.isfile() else _archive_path(
+                archive, info.name, include, exclude, exclude_dirs
+            )
+            if path is None:
+                continue
+            # When a name is stored several times, the last member is the one extracted
+            members[path] = info
+            if path in pending:
+                pending_size -= len(pending.pop(path).content)
+            if pending_size + info.size <= max_pending:
+                pending[path] = read(info, path)
+                pending_size += info.size
+        paths = sorted(members)
+        next_index = 0
+        while True:
+            while next_index < len(paths) and paths[next_index] in pending:
+                member = pending.pop(paths[next_index])
+                pending_size -= len(member.content)
+                next_index += 1
+                yield member
+            if next_index == len(paths):
+                return
+            # Read the archive again for the members that were not kept, the next member to yield
+            # being always read so that each pass yields at least one member
+            for info in tfile.getmembers():
+                if next_index == len(paths):
+                    break
+                path = None if not info.isfile() else _archive_path(
+                    archive, info.name, include, exclude, exclude_dirs
+                )
+                if path is None or members[path] is not info or path in pending:
+                    continue
+                if path == paths[next_index] or (
+                    path > paths[next_index] and pending_size + info.size <= max_pending
+                ):
+                    pending[path] = read(info, path)
+                    pending_size += info.size
+                while next_index < len(paths) and paths[next_index] in pending:
+                    member = pending.pop(paths[next_index])
+                    pending_size -= len(member.content)
+                    next_index += 1
+                    yield member
+
+
+def _iter_archive(archive, include=None, exclude=None, exclude_dirs=None):
+    """iter_archive
+    Yield the .pts files of a zip or tar archive without extracting it, in the same order and with
+    the same paths as if the archive was extracted in its directory and that directory was walked
+    by _iter_pts().
+
+    Args:
+        archive (str): The path and name of the archive.
+        include (str or array of str): The glob patterns that the file names must match, "*.pts"
+            by default.
+        exclude (str or array of str): The glob patterns of the file names to ignore.
+        exclude_dirs (str or array of str): The glob patterns of the directory names to ignore.
+
+    Returns:
+        A generator of _ArchiveMember.
+    """
+    include = _split_patterns(include) or [_PTS_PATTERN]
+    iterate = _iter_zip if zipfile.is_zipfile(archive) else _iter_tar
+    return iterate(archive, include, _split_patterns(exclude), _split_patterns(exclude_dirs))
+
+
+def _remove_duplicates(data, epsilon=EPSILON, return_index=False):
+    """remove_duplicates
+    Remove the duplicates landmarks and semi-landmarks.
+    A point is considered as a duplicate of a previous point when each of its coordinates differs
+    from the coordinates of the previous point by less than epsilon times these coordinates. Only
+    the first occurrence of a duplicated point is kept and the order of the points is preserved.
+    Instead of comparing every pair of points, the points are grouped in cells of the size of the
+    epsilon window along x and y and sorted along z so that only the few points lying in the epsilon
+    window of each point are compared, i.e. O(n log n), unless there are only a few points.
+
+    Args:
+        data (array): Contains the landmarks as an array of shape (number of points, 3).
+        epsilon (float): The relative tolerance used to detect duplicates. Must be in ]0, 1[.
+        return_index (bool): Whether to also return the indices of the points that were kept.
+
+    Returns:
+        An array of landmarks where duplicates were removed and, if return_index is True, the
+        indices of the kept landmarks in data.
+    """
+    assert 0 < epsilon < 1, "The epsilon (" + str(epsilon) + ") must be between 0 and 1."
+    coord = np.asarray(data, dtype=np.float64).reshape(-1, 3)
+    nb_point = coord.shape[0]
+    # Remove easy duplicates where the coordinates are an exact match
+    _, index_first = np.unique(coord, axis=0, return_index=True)
+    to_remove = np.ones(nb_point, dtype=bool)
+    to_remove[index_first] = False
+    # Remove the other duplicates because some landmarks and semilandmarks are sometimes exported
+    # twice. A point b is a duplicate of a point a when abs(x_a - x_b) < epsilon * x_a, i.e. when
+    # x_a lies in ]x_b / (1 + epsilon), x_b / (1 - epsilon)[, and similarly for y and z, which
+    # requires positive coordinates. log(x_a) then differs from log(x_b) by less than the width of
+    # the window, so the logarithms of x and y are rounded on a grid of that size and only the points
+    # lying in the same or a neighboring cell along x and y and in the window along z are compared,
+    # the exact test being applied afterwards on the candidates. The window along z is slightly
+    # widened to be robust to rounding errors.
+    positive = np.flatnonzero(np.all(coord > 0, axis=1))
+    if nb_point <= _NB_DENSE_POINT:
+        # Compare every pair of points at once, which is faster for the few points of most files
+        close = np.ones((nb_point, nb_point), dtype=bool)
+        for axis in range(3):
+            values = coord[:, axis]
+            close &= np.abs(values[:, np.newaxis] - values) < epsilon * values[:, np.newaxis]
+        to_remove |= np.triu(close, 1).any(axis=0)
+    elif positive.shape[0] > 1:
+        nb_positive = positive.shape[0]
+        width = np.log1p(epsilon) - np.log1p(-epsilon)
+        cells = np.floor(np.log(coord[positive, :2]) / width).astype(np.int64)
+        # Number the cells along x and y, the rank of the previous and next cells being -1 when they
+        # contain no point, so that each cell is identified by a single integer
+        ranks = np.empty((2, 3, nb_positive), dtype=np.int64)
+        sizes = []
+        for axis in range(2):
+            unique = np.unique(cells[:, axis])
+            sizes.append(unique.shape[0])
+            ranks[axis, 1] = np.searchsorted(unique, cells[:, axis])
+            for shift in (-1, 1):
+                rank = np.clip(ranks[axis, 1] + shift, 0, unique.shape[0] - 1)
+                ranks[axis, shift + 1] = np.where(unique[rank] == cells[:, axis] + shift, rank, -1)
+        # Identify each point by its cell and the rank of its z coordinate, and the window along z by
+        # the ranks of its bounds
+        sorted_z = np.sort(coord[positive, 2])
+        rank_z = np.searchsorted(sorted_z, coord[positive, 2], side="left")
+        lower_z = np.searchsorted(sorted_z, coord[positive, 2] / (1.0 + epsilon) * (1.0 - 1e-12), side="left")
+        upper_z = np.searchsorted(sorted_z, coord[positive, 2] / (1.0 - epsilon) * (1.0 + 1e-12), side="right")
+        keys = (ranks[0, 1] * sizes[1] + ranks[1, 1]) * (nb_positive + 1) + rank_z
+        # Sort the points by key so that the neighboring cells are searched in order
+        order = np.argsort(keys, kind="mergesort")
+        positive, keys, ranks = positive[order], keys[order], ranks[:, :, order]
+        lower_z, upper_z = lower_z[order], upper_z[order]
+        position = np.arange(nb_positive)
+        for dx, dy in [(dx, dy) for dx in range(3) for dy in range(3)]:
+            # Find the candidates in the neighboring cell of each point, if this cell contains points
+            valid = (ranks[0, dx] >= 0) & (ranks[1, dy] >= 0)
+            cell = (ranks[0, dx] * sizes[1] + ranks[1, dy]) * (nb_positive + 1)
+            lower = np.searchsorted(keys, cell + lower_z, side="left")
+            nb_candidate = np.where(valid, np.searchsorted(keys, cell + upper_z, side="left") - lower, 0)
+            index_b = np.repeat(position, nb_candidate)
+            offset = np.cumsum(nb_candidate) - nb_candidate
+            index_a = positive[lower[index_b] + np.arange(index_b.shape[0]) - offset[index_b]]
+            index_b = positive[index_b]
+            # Only compare a point with the points that were exported before it
+            previous = index_a < index_b
+            index_a = index_a[previous]
+            index_b = index_b[previous]
+            duplicate = np.all(
+                np.abs(coord[index_a] - coord[index_b]) < epsilon * coord[index_a], axis=1
+            )
+            to_remove[index_b[duplicate]] = True
+    # Return only landmarks that have not been detected as duplicates
+    index = np.flatnonzero(~to_remove)
+    if return_index:
+        return coord[index], index
+    return coord[index]
+
+
+def _reverse_z(data):
+    """reverse_z
+    Find the relative z-axis for a given set of point by computing a plane that minimizes the
+    difference between it and the given points.
+    Then reverses the set of points relatively to this new plane, so no user specific plane has to
+    be supplied.
+    Inspired from https://www.youtube.com/watch?v=86lwcXeZoiA and the suggestion from
+    https://stackoverflow.com/questions/8954326/how-to-calculate-the-mirror-point-along-a-line#8954454
+    is not applicable here as it is not valid in 3D and does not take into account relative axes. 
+
+    Args:
+        data (array): Contains the landmarks.
+
+    Returns:
+        An array of landmarks inverted along the z-axis.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    return _reverse_z_batch(data[np.newaxis])[0]
+
+
+def _reverse_z_batch(data):
+    """reverse_z_batch
+    Batched version of _reverse_z that mirrors several sets of points at once.
+    For each set of points, the plane z = a * x + b * y + c that minimizes the difference between
+    it and the points is fitted by least squares, then all the points of all the sets are reversed
+    relatively to their plane with a few array operations.
+
+    Args:
+        data (array): Contains the landmarks as an array of shape (number of specimens, number of
+            landmarks, 3).
+
+    Returns:
+        An array of the same shape containing the landmarks inverted along the z-axis.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    assert data.ndim == 3 and data.shape[2] == 3, "The landmarks must be of shape (n, k, 3)."
+    nb_specimen = data.shape[0]
+    # Split the coordinates in an xy plane and a z axis
+    matrix_xy = np.concatenate((data[:, :, :2], np.ones(data.shape[:2] + (1,))), axis=2)
+    matrix_z = data[:, :, 2:]
+    # Compute the linear fit for the planes going through all landmarks points with a singular value
+    # decomposition of each set of points, which is numerically more stable than inverting A.T * A.
+    # As in np.linalg.lstsq, the negligible singular values are discarded.
+    u, sing, vt = np.linalg.svd(matrix_xy, full_matrices=False)
+    cutoff = np.finfo(np.float64).eps * max(data.shape[1], 3) * sing[:, :1]
+    inv_sing = np.zeros_like(sing)
+    np.divide(1.0, sing, out=inv_sing, where=sing > cutoff)
+    fit = np.matmul(
+        np.swapaxes(vt, 1, 2),
+        inv_sing[:, :, np.newaxis] * np.matmul(np.swapaxes(u, 1, 2), matrix_z),
+    )[:, :, 0]
+    # Gather the parameters for the planes (A,B,C,D) defined by A*x + B*y + C*z + D with the
+    # inversion coefficients for the mirroring (C = -1 and D = -c)
+    normal = np.concatenate((fit[:, :2], -np.ones((nb_specimen, 1))), axis=1)
+    D = -fit[:, 2]
+    # Compute the symmetry points that are the intersection between the planes (A,B,C,D) and the
+    # perpendicular lines to these planes that go through the points of interest.
+    t = (D[:, np.newaxis] - np.einsum("nkj,nj->nk", data, normal)) / np.sum(
+        normal * normal, axis=1
+    )[:, np.newaxis]
+    # Compute the resulting value for the mirrored points where the new coordinates are equal to
+    # twice the distance between the old coordinates and the symmetry points.
+    return data + 2.0 * t[:, :, np.newaxis] * normal[:, np.newaxis, :]
+
+
+def _parse_pts(content, filen="<string>"):
+    """parse_pts
+    Parse the content of a .pts file exported by Landmark Editor, i.e. a version header, a line
+    containing the number of points and one record per semi-landmark (S) or landmark (C) made of a
+    label followed by the three coordinates separated by one or more spaces. The records are split
+    and their coordinates converted at once, each record being only checked on its own to report
+    the invalid one when the fields do not form records of a label and 3 coordinates.
+
+    Args:
+        content (bytes): The content of the .pts file.
+        filen (str): The name of the .pts file used in error messages.
+
+    Returns:
+        A list of str containing the label of each record (e.g. "S000" or "C000-001") and an array
+        of float64 of shape (number of records, 3) containing their coordinates.
+    """
+    # The records start at the first line starting with S or C, after the header
+    starts = [content.find(b"\n" + label) + 1 for label in (b"S", b"C")]
+    starts = [0] if content[:1] in (b"S", b"C") else [start for start in starts if start > 0]
+    # Split all the records at once, which gives 4 fields per record when each record is made of
+    # a label followed by 3 coordinates
+    fields = content[min(starts):].split() if starts else []
+    labels = fields[0::4]
+    del fields[0::4]
+    joined = b" " + b" ".join(labels)
+    if len(fields) == 3 * len(labels) and joined.count(b" S") + joined.count(b" C") == len(labels):
+        try:
+            coord = np.fromstring(b" ".join(fields), dtype=np.float64, sep=" ")
+        except ValueError:
+            coord = np.zeros(0)
+        if coord.shape[0] == 3 * len(labels):
+            return [label.decode("ascii") for label in labels], coord.reshape(len(labels), 3)
+    # Otherwise check each record to report the invalid one, the other lines being ignored
+    labels = []
+    values = []
+    for number, line in enumerate(content.splitlines(), 1):
+        if line[:1] in (b"S", b"C"):
+            record = line.split()
+            # Check each record so that a missing value is not replaced by the next record
+            assert len(record) == 4, (
+                "Invalid record detected in "
+                + filen
+                + " at line "
+                + str(number)
+                + ", each record must contain a label and 3 coordinates: "
+                + line.decode("ascii", "replace")
+            )
+            labels.append(record[0].decode("ascii"))
+            values.extend(record[1:])
+    try:
+        coord = np.fromstring(b" ".join(values), dtype=np.float64, sep=" ")
+    except ValueError:
+        coord = np.zeros(0)
+    assert coord.shape[0] == 3 * len(labels), (
+        "Invalid coordinates detected in " + filen + ", each record must contain 3 coordinates."
+    )
+    return labels, coord.reshape(len(labels), 3)
+
+
+def _read_pts(filen):
+    """read_pts
+    Read the labels and coordinates of the records of a .pts file.
+
+    Args:
+        filen (str): The path and name of the .pts file.
+
+    Returns:
+        A list of str containing the label of each record and an array of float64 of shape (number
+        of records, 3) containing their coordinates.
+    """
+    with open(filen, "rb") as filep:
+        return _parse_pts(filep.read(), filen)
+
+
+def _cache_entry(cache_dir, filen):
+    """cache_entry
+    Return the path and name of the cache entry of a .pts file.
+
+    Args:
+        cache_dir (str): The name of the directory where the cache entries are stored.
+        filen (str): The path and name of the .pts file.
+
+    Returns:
+        The path and name of the .npz file storing the processed landmarks of filen.
+    """
+    key = hashlib.sha1(os.path.abspath(filen).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key + ".npz")
+
+
+def _cache_signature(filen, epsilon, cache_hash=False):
+    """cache_signature
+    Describe the state of a .pts file and the options used to process it, so that a cache entry can
+    only be used if neither the file nor the options have changed since the entry was stored.
+    The mirroring and reordering are not part of the signature because they are applied after the
+    cache, on all the files of a chunk at once.
+
+    Args:
+        filen (str or _ArchiveMember): The path and name of the .pts file, or a member of an
+            archive.
+        epsilon (float): The relative tolerance used to detect duplicated landmarks.
+        cache_hash (bool): Whether to also use a hash of the content of the file.
+
+    Returns:
+        A dict describing the file and the options.
+    """
+    if isinstance(filen, _ArchiveMember):
+        signature = dict(filen.signature, version=_CACHE_VERSION, path=os.path.abspath(filen.path))
+        signature["epsilon"] = epsilon
+        if cache_hash:
+            signature["hash"] = hashlib.sha1(filen.content).hexdigest()
+        return signature
+    file_stat = os.stat(filen)
+    signature = {
+        "version": _CACHE_VERSION,
+        "path": os.path.abspath(filen),
+        "size": file_stat.st_size,
+        "mtime": getattr(file_stat, "st_mtime_ns", file_stat.st_mtime),
+        "epsilon": epsilon,
+    }
+    if cache_hash:
+        with open(filen, "rb") as filep:
+            signature["hash"] = hashlib.sha1(filep.read()).hexdigest()
+    return signature
+
+
+def _rotation_to(landmarks, reference):
+    """rotation_to
+    Compute the rotation of each set of points that best fits the reference, i.e. the rotation
+    minimizing the sum of squared distances between the points and the reference, for all the sets
+    at once with a batched singular value decomposition (Kabsch algorithm). The sets of points and
+    the reference must be centered.
+
+    Args:
+        landmarks (array): The landmarks of shape (number of specimens, number of landmarks, 3).
+        reference (array): The reference of shape (number of landmarks, 3).
+
+    Returns:
+        An array of shape (number of specimens, 3, 3) containing the rotation matrices, to be
+        applied by multiplying the landmarks on the right.
+    """
+    u, _, vt = np.linalg.svd(np.einsum("nki,kj->nij", landmarks, reference))
+    # Flip the last axis of the rotations that would otherwise be reflections
+    u[:, :, 2] *= np.sign(np.linalg.det(np.matmul(u, vt)))[:, np.newaxis]
+    return np.matmul(u, vt)
+
+
+def _rotate_to(landmarks, reference):
+    """rotate_to
+    Rotate each set of points so that it best fits the reference. The sets of points and the
+    reference must be centered.
+
+    Args:
+        landmarks (array): The landmarks of shape (number of specimens, number of landmarks, 3).
+        reference (array): The reference of shape (number of landmarks, 3).
+
+    Returns:
+        An array of the same shape containing the rotated landmarks.
+    """
+    return np.matmul(landmarks, _rotation_to(landmarks, reference))
+
+
+def _procrustes(landmarks, max_iter=_GPA_MAX_ITER, tolerance=_GPA_TOLERANCE):
+    """procrustes
+    Align the landmarks of all the specimens with a Generalized Procrustes Analysis: each specimen
+    is centered and scaled to a unit centroid size, then all the specimens are iteratively rotated
+    to their mean shape until the mean shape does not change anymore.
+
+    Args:
+        landmarks (array): The landmarks of shape (number of specimens, number of landmarks, 3).
+        max_iter (int): The maximum number of iterations.
+        tolerance (float): The change of the mean shape below which the alignment has converged.
+
+    Returns:
+        An array of the same shape containing the aligned landmarks, an array containing the
+        centroid size of each specimen, the number of iterations done and the last change of the
+        mean shape.
+    """
+    landmarks = np.array(landmarks, dtype=np.float64)
+    # Translate the specimens to their centroid and scale them to a unit centroid size
+    landmarks -= landmarks.mean(axis=1)[:, np.newaxis, :]
+    centroid_size = np.sqrt(np.einsum("nkj,nkj->n", landmarks, landmarks))
+    assert np.all(centroid_size > 0), "The landmarks of a specimen are all at the same position."
+    landmarks /= centroid_size[:, np.newaxis, np.newaxis]
+    # Use the first specimen as the initial mean shape
+    mean = landmarks[0]
+    change = np.inf
+    nb_iter = 0
+    while nb_iter < max_iter and change >= tolerance:
+        nb_iter += 1
+        landmarks = _rotate_to(landmarks, mean)
+        new_mean = landmarks.mean(axis=0)
+        new_mean /= np.sqrt(np.sum(new_mean * new_mean))
+        change = np.sqrt(np.sum((new_mean - mean) ** 2))
+        mean = new_mean
+    return landmarks, centroid_size, nb_iter, change
+
+
+def _curve_neighbors(labels, coord, index):
+    """curve_neighbors
+    Find the semilandmarks that can slide along their curves from the records of a .pts file. The
+    records of each curve (e.g. "C002-000" to "C002-012") are ordered along the curve, and their
+    ends are generally exported again as landmarks (S). Each point inside a curve that is not a
+    landmark is a semilandmark, which slides along the tangent given by its two neighbors on the
+    curve.
+
+    Args:
+        labels (array of str): The label of each record.
+        coord (array): The coordinates of the records, of shape (number of records, 3).
+        index (array of int): The indices of the records kept after the duplicates were removed.
+
+    Returns:
+        Three arrays of int containing the positions of the semilandmarks in the deduplicated
+        landmarks and the positions of their previous and next neighbors on their curves.
+    """
+    position = np.full(len(labels), -1, dtype=np.intp)
+    position[index] = np.arange(len(index))
+    # A removed record is a duplicate of its closest kept landmark
+    kept = coord[index]
+    for record in np.flatnonzero(position < 0):
+        position[record] = np.argmin(np.sum((kept - coord[record]) ** 2, axis=1))
+    fixed = set(position[record] for record, label in enumerate(labels) if label[:1] == "S")
+    curves = {}
+    for label, point in zip(labels, position):
+        if label[:1] == "C":
+            curves.setdefault(label.split("-")[0], []).append(point)
+    neighbors = {}
+    for name in sorted(curves):
+        # Skip the points exported twice in a row on the same curve
+        points = [point for count, point in enumerate(curves[name]) if count == 0 or point != curves[name][count - 1]]
+        for before, point, after in zip(points[:-2], points[1:-1], points[2:]):
+            if point not in fixed and point not in neighbors:
+                neighbors[point] = (before, after)
+    sliding = np.array(sorted(neighbors), dtype=np.intp)
+    before = np.array([neighbors[point][0] for point in sliding], dtype=np.intp)
+    after = np.array([neighbors[point][1] for point in sliding], dtype=np.intp)
+    return sliding, before, after
+
+
+def _bending_energy(reference):
+    """bending_energy
+    Compute the bending energy matrix of the thin-plate spline interpolating the 3D reference, i.e.
+    the matrix L such that the bending energy of the deformation from the reference to landmarks Y
+    is the trace of Y.T L Y.
+
+    Args:
+        reference (array): The reference of shape (number of landmarks, 3).
+
+    Returns:
+        An array of shape (number of landmarks, number of landmarks).
+    """
+    nb_landmark = reference.shape[0]
+    system = np.zeros((nb_landmark + 4, nb_landmark + 4))
+    # The kernel of the thin-plate spline in 3D is the distance between the points
+    system[:nb_landmark, :nb_landmark] = np.sqrt(
+        np.sum((reference[:, np.newaxis] - reference[np.newaxis]) ** 2, axis=2)
+    )
+    system[:nb_landmark, nb_landmark] = 1.0
+    system[:nb_landmark, nb_landmark + 1 :] = reference
+    system[nb_landmark:, :nb_landmark] = system[:nb_landmark, nb_landmark:].T
+    return np.linalg.pinv(system)[:nb_landmark, :nb_landmark]
+
+
+def _slide(
+    landmarks,
+    sliding,
+    before,
+    after,
+    method="bending_energy",
+    max_iter=_SLIDE_MAX_ITER,
+    tolerance=_SLIDE_TOLERANCE,
+):
+    """slide
+    Slide the semilandmarks of all the specimens along their curves, i.e. along the tangent given by
+    their neighbors, toward the mean shape of a Generalized Procrustes Analysis. The displacements
+    minimize either the bending energy of the thin-plate spline from the mean shape to each
+    specimen, solved for all the specimens at once as a batch of linear systems, or the Procrustes
+    distance to the mean shape, for which each semilandmark is projected on its tangent. The
+    specimens are aligned again and the semilandmarks slid again until the sum of squared
+    Procrustes distances to the mean shape does not change anymore. The landmarks stay in the
+    coordinate system of each specimen.
+
+    Args:
+        landmarks (array): The landmarks of shape (number of specimens, number of landmarks, 3).
+        sliding (array of int): The positions of the semilandmarks.
+        before (array of int): The positions of the previous neighbors of the semilandmarks.
+        after (array of int): The positions of the next neighbors of the semilandmarks.
+        method (str): The criterion minimized, "bending_energy" or "procrustes".
+        max_iter (int): The maximum number of iterations.
+        tolerance (float): The relative change of the sum of squared Procrustes distances below
+            which the sliding has converged.
+
+    Returns:
+        An array of the same shape containing the landmarks with the slid semilandmarks, the number
+        of iterations done and the last relative change of the sum of squared Procrustes distances.
+    """
+    assert method in _SLIDING_METHODS, (
+        "The sliding method (" + str(method) + ") must be one of "
+        + ", ".join(_SLIDING_METHODS) + "."
+    )
+    assert len(sliding), "There are no semilandmarks (C) to slide along their curves."
+    landmarks = np.array(landmarks, dtype=np.float64)
+    # The semilandmarks slide on the tangents of the initial curves, so that the iterations do not
+    # make them drift away from the curves
+    tangent = landmarks[:, after] - landmarks[:, before]
+    length = np.sqrt(np.einsum("nmj,nmj->nm", tangent, tangent))
+    tangent /= np.where(length > 0, length, 1.0)[:, :, np.newaxis]
+    previous = None
+    change = np.inf
+    nb_iter = 0
+    while True:
+        aligned, centroid_size, _, _ = _procrustes(landmarks)
+        mean = aligned.mean(axis=0)
+        distance = np.sum((aligned - mean) ** 2)
+        if previous is not None:
+            change = abs(previous - distance) / max(previous, EPSILON)
+        if nb_iter >= max_iter or change < tolerance:
+            break
+        previous = distance
+        nb_iter += 1
+        mean /= np.sqrt(np.sum(mean * mean))
+        if method == "procrustes":
+            # Bring the mean shape in the coordinate system of each specimen and project the
+            # difference with each semilandmark on its tangent
+            centroid = landmarks.mean(axis=1)[:, np.newaxis, :]
+            rotation = _rotation_to(landmarks - centroid, mean)
+            reference = np.matmul(mean, np.swapaxes(rotation, 1, 2))
+            reference = reference * centroid_size[:, np.newaxis, np.newaxis] + centroid
+            shift = np.einsum("nmj,nmj->nm", reference[:, sliding] - landmarks[:, sliding], tangent)
+        else:
+            # Minimize the trace of (Y + U t).T L (Y + U t) where U moves each semilandmark along
+            # its tangent, i.e. solve (U.T L U) t = -U.T L Y for each specimen. The bending energy
+            # does not depend on the position, orientation and size of the specimens.
+            energy = _bending_energy(mean)
+            system = energy[np.ix_(sliding, sliding)] * np.matmul(tangent, np.swapaxes(tangent, 1, 2))
+            rhs = np.einsum("nmj,nmj->nm", np.matmul(energy[sliding], landmarks), tangent)
+            # A semilandmark whose neighbors are at the same position does not slide
+            still = np.nonzero(length == 0)
+            system[still[0], still[1], still[1]] = 1.0
+            try:
+                shift = -np.linalg.solve(system, rhs[:, :, np.newaxis])[:, :, 0]
+            except np.linalg.LinAlgError:
+                shift = -np.matmul(np.linalg.pinv(system), rhs[:, :, np.newaxis])[:, :, 0]
+        landmarks[:, sliding] += shift[:, :, np.newaxis] * tangent
+    return landmarks, nb_iter, float(change)
+
+
+def _process_pts(filen, epsilon=EPSILON, cache_dir=None, cache_hash=False):
+    """process_pts
+    Read the landmarks of a .pts file and remove the duplicates. This is the work done for each file
+    and it is defined at the module level so that it can be run in a worker process.
+    If a cache directory is supplied, the landmarks are loaded from the cache when the file and the
+    options have not changed, and are stored in the cache otherwise, along with the number of bytes
+    and points read and of duplicates removed so that they are also reported for cached files.
+
+    Args:
+        filen (str or _ArchiveMember): The path and name of the .pts file, or a member of an
+            archive.
+        epsilon (float): The relative tolerance used to detect duplicated landmarks.
+        cache_dir (str): The name of the directory where the cache entries are stored.
+        cache_hash (bool): Whether to also check a hash of the content of the file before using the
+            cache.
+
+    Returns:
+        An array of landmarks where duplicates were removed and a dict describing the processing of
+        the file: the wall and CPU time of each stage, the number of bytes read, of points read and
+        of duplicates removed, and whether the cache was used.
+    """
+    info = {"stages": {}, "bytes": 0, "points": 0, "duplicates": 0, "cached": False}
+    if cache_dir is not None:
+        start_wall, start_cpu = time.time(), _cpu_time()
+        entry = _cache_entry(cache_dir, getattr(filen, "path", filen))
+        signature = json.dumps(_cache_signature(filen, epsilon, cache_hash), sort_keys=True)
+        if os.path.exists(entry):
+            try:
+                with np.load(entry) as cached:
+                    if str(cached["signature"]) == signature:
+                        data = cached["landmarks"]
+                        for key, value in zip(_CACHED_COUNTS, cached["counts"].tolist()):
+                            info[key] = value
+                        info["cached"] = True
+            except (IOError, OSError, ValueError, KeyError):
+                # A corrupted entry is simply replaced
+                pass
+        info["stages"]["cache"] = (time.time() - start_wall, _cpu_time() - start_cpu)
+        if info["cached"]:
+            return data, info
+    start_wall, start_cpu = time.time(), _cpu_time()
+    if isinstance(filen, _ArchiveMember):
+        _, data = _parse_pts(filen.content, filen.path)
+        info["bytes"] = len(filen.content)
+    else:
+        _, data = _read_pts(filen)
+        info["bytes"] = os.path.getsize(filen)
+    info["stages"]["parsing"] = (time.time() - start_wall, _cpu_time() - start_cpu)
+    info["points"] = data.shape[0]
+    # Remove duplicates landmarks generated that are generally present in the .pts files
+    start_wall, start_cpu = time.time(), _cpu_time()
+    data = _remove_duplicates(data, epsilon=epsilon)
+    info["stages"]["dedup"] = (time.time() - start_wall, _cpu_time() - start_cpu)
+    info["duplicates"] = info["points"] - data.shape[0]
+    if cache_dir is not None:
+        # Store the entry in a temporary file that is renamed, so that concurrent runs never read a
+        # partial entry, and stale entries of the same file are replaced.
+        filed, tmp_entry = tempfile.mkstemp(prefix=".", suffix=".npz.tmp", dir=cache_dir)
+        with os.fdopen(filed, "wb") as filep:
+            np.savez(
+                filep,
+                landmarks=data,
+                signature=np.array(signature),
+                counts=np.array([info[key] for key in _CACHED_COUNTS], dtype=np.int64),
+            )
+        getattr(os, "replace", os.rename)(tmp_entry, entry)
+    return data, info
+
+
+def _evict_cache(cache_dir, filenames):
+    """evict_cache
+    Remove the cache entries of the .pts files that do not exist anymore. The entries of the
+    members of an archive are kept as long as the archive exists.
+
+    Args:
+        cache_dir (str): The name of the directory where the cache entries are stored.
+        filenames (array of str): The .pts files that have just been processed, whose entries are
+            up to date.
+    """
+    current = set(os.path.basename(_cache_entry(cache_dir, filen)) for filen in filenames)
+    for entry in os.listdir(cache_dir):
+        if not entry.endswith(".npz") or entry in current:
+            continue
+        entry = os.path.join(cache_dir, entry)
+        try:
+            with np.load(entry) as cached:
+                signature = json.loads(str(cached["signature"]))
+                stale = not os.path.exists(signature.get("archive", signature["path"]))
+        except (IOError, OSError, ValueError, KeyError):
+            stale = True
+        if stale:
+            os.remove(entry)
+
+
+def _with_items(func, items):
+    """with_items
+    Return the items along with the results of func, so that the items do not need to be kept by
+    the caller of a pool of worker processes.
+
+    Args:
+        func (function): The function to apply.
+        items (array): The items to process.
+
+    Returns:
+        An array of tuples containing each item and the result of func.
+    """
+    return [(item, func(item)) for item in items]
+
+
+def _imap(func, items, workers=1, chunksize=16):
+    """imap
+    Apply func to each item, either in the current process or in a pool of worker processes, and
+    yield the results in the same order as the items.
+
+    Args:
+        func (function): The function to apply, which must be defined at the module level.
+        items (iterable): The items to process.
+        workers (int): The number of worker processes. 1 processes the items in the current
+            process and 0 uses as many processes as there are CPUs.
+        chunksize (int): The number of items sent at once to a worker process.
+
+    Returns:
+        A generator of tuples containing each item and the result of func, in the order of items.
+        The items can be produced by a generator, which is consumed in the current process as the
+        results are yielded: at most two chunks per worker process are read ahead, so that the
+        memory used does not depend on the number of items.
+    """
+    assert workers >= 0, "The number of workers must be positive or null."
+    if workers == 1:
+        for item in items:
+            yield item, func(item)
+        return
+    workers = workers if workers > 0 else multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(workers)
+    # Pool.imap reads all the items at once in a thread, so the chunks are submitted one by one
+    # once the oldest chunk in flight is done
+    pending = []
+    try:
+        for chunk in _chunks(items, chunksize):
+            pending.append(pool.apply_async(_with_items, (func, chunk)))
+            if len(pending) == 2 * workers:
+                for result in pending.pop(0).get():
+                    yield result
+        for task in pending:
+            for result in task.get():
+                yield result
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def _chunks(items, size):
+    """chunks
+    Group items in lists of at most size items.
+
+    Args:
+        items (iterable): The items to group.
+        size (int): The maximum number of items in each group.
+
+    Returns:
+        A generator of lists of items.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _get_id(filen):
+    """get_id
+    Return the unique ID of a .pts file that corresponds to the file path and name.
+
+    Args:
+        filen (str): The path and name of the .pts file.
+
+    Returns:
+        A str containing the last directory and the name of the file.
+    """
+    # .replace("//", "/") replaces "//" by "/" that occurs on Windows. This is used to enable
+    # comparisons with reference files in tests for all OS.
+    return "/".join(filen.split(os.sep)[-2:]).replace("//", "/")
+
+
+def _count_features(filen):
+    """count_features
+    Return the number of features of a .pts file, used to check that the names of the files and
+    directories are consistent.
+
+    Args:
+        filen (str): The path and name of the .pts file.
+
+    Returns:
+        An int containing the number of features.
+    """
+    return filen[filen.find(os.sep) + 1 :].count("_") + filen.count(os.sep)
+
+
+def _feature_position(name, nb_landmark, nb_feature, feature_names=None):
+    """feature_position
+    Return the position of a feature among the features of the files, from its name in the header.
+
+    Args:
+        name (str): The name of the feature in the header, or None.
+        nb_landmark (int): The number of landmarks.
+        nb_feature (int): The number of features.
+        feature_names (str or array of str): The feature names used in the header.
+
+    Returns:
+        An int containing the position of the feature, or None if name is None.
+    """
+    if name is None:
+        return None
+    names = _csv_header(nb_landmark, nb_feature, feature_names)[1 + nb_landmark * 3 :]
+    assert name in names, "The feature " + name + " is not one of " + ", ".join(names) + "."
+    return names.index(name)
+
+
+def _get_features(filen):
+    """get_features
+    Return the features described in the name of a .pts file, separated by "_".
+
+    Args:
+        filen (str): The path and name of the .pts file.
+
+    Returns:
+        An array of str containing the features.
+    """
+    filen = filen.split(".")[-2]
+    return (
+        filen[filen.find(os.sep) + 1 :]
+        .replace("_", ",")
+        .replace("-", ".")
+        .split(os.sep)[-1]
+        .split(",")
+    )
+
+
+class LandmarkSet(object):
+    """LandmarkSet
+    The landmarks of a specimen, stored in a contiguous array along with the ID and the features
+    described in the name of its .pts file.
+
+    Args:
+        coords (array): The coordinates of shape (number of landmarks, 3), which are not copied if
+            they are already stored in a contiguous array of the requested type.
+        ident (str): The ID of the specimen.
+        factors (tuple of str): The features of the specimen.
+        path (str): The path and name of the .pts file.
+        dtype (type): The type of the coordinates (e.g. np.float32 to halve the memory used), by
+            default the type of coords.
+    """
+
+    __slots__ = ("coords", "ident", "factors", "path")
+
+    def __init__(self, coords, ident=None, factors=(), path=None, dtype=None):
+        self.coords = np.ascontiguousarray(coords, dtype=dtype)
+        assert self.coords.ndim == 2 and self.coords.shape[1] == 3, (
+            "The coordinates must be of shape (number of landmarks, 3)."
+        )
+        self.ident = ident
+        self.factors = tuple(factors)
+        self.path = path
+
+    @classmethod
+    def from_file(cls, filen, epsilon=EPSILON, dtype=None):
+        """from_file
+        Read the landmarks of a .pts file and remove the duplicates.
+
+        Args:
+            filen (str): The path and name of the .pts file.
+            epsilon (float): The relative tolerance used to detect duplicated landmarks.
+            dtype (type): The type of the coordinates.
+
+        Returns:
+            A LandmarkSet.
+        """
+        _, data = _read_pts(filen)
+        return cls(
+            _remove_duplicates(data, epsilon), _get_id(filen), _get_features(filen), filen, dtype
+        )
+
+    def __len__(self):
+        return self.coords.shape[0]
+
+
+class LandmarkBatch(object):
+    """LandmarkBatch
+    The landmarks of several specimens having the same number of landmarks, stored in a single
+    contiguous array along with their IDs and features. This is the data given to each stage of
+    pts2csv() after the files are read: the mirroring, the reordering, the alignment and the
+    export all use the array without copying it when possible.
+
+    Args:
+        coords (array): The coordinates of shape (number of specimens, number of landmarks, 3).
+        ids (array of str): The ID of each specimen.
+        factors (array of tuple of str): The features of each specimen.
+        paths (array of str): The path and name of the .pts file of each specimen.
+    """
+
+    __slots__ = ("coords", "ids", "factors", "paths")
+
+    def __init__(self, coords, ids, factors, paths=None):
+        self.coords = np.asarray(coords)
+        assert self.coords.ndim == 3 and self.coords.shape[2] == 3, (
+            "The coordinates must be of shape (number of specimens, number of landmarks, 3)."
+        )
+        assert len(ids) == len(factors) == self.coords.shape[0], (
+            "There must be one ID and one tuple of features per specimen."
+        )
+        self.ids = ids
+        self.factors = factors
+        self.paths = paths if paths is not None else [None] * len(ids)
+
+    @classmethod
+    def from_sets(cls, sets, dtype=None):
+        """from_sets
+        Gather several LandmarkSet in a single contiguous array.
+
+        Args:
+            sets (array of LandmarkSet): The landmarks of each specimen, which must all have the
+                same number of landmarks.
+            dtype (type): The type of the coordinates, by default the type of the first set.
+
+        Returns:
+            A LandmarkBatch.
+        """
+        assert sets, "At least one LandmarkSet must be supplied."
+        coords = np.empty(
+            (len(sets), len(sets[0]), 3), dtype=dtype if dtype is not None else sets[0].coords.dtype
+        )
+        for index, landmark_set in enumerate(sets):
+            assert len(landmark_set) == coords.shape[1], (
+                "Some landmarks may not be correctly superimposed for "
+                + str(landmark_set.path)
+                + " because there are "
+                + str(len(landmark_set))
+                + " landmarks detected instead of "
+                + str(coords.shape[1])
+            )
+            coords[index] = landmark_set.coords
+        return cls(
+            coords,
+            [landmark_set.ident for landmark_set in sets],
+            [landmark_set.factors for landmark_set in sets],
+            [landmark_set.path for landmark_set in sets],
+        )
+
+    @classmethod
+    def concatenate(cls, batches):
+        """concatenate
+        Gather several LandmarkBatch in a single one.
+
+        Args:
+            batches (array of LandmarkBatch): The batches to gather.
+
+        Returns:
+            A LandmarkBatch.
+        """
+        if len(batches) == 1:
+            return batches[0]
+        return cls(
+            np.concatenate([batch.coords for batch in batches], axis=0),
+            [ident for batch in batches for ident in batch.ids],
+            [factors for batch in batches for factors in batch.factors],
+            [path for batch in batches for path in batch.paths],
+        )
+
+    def with_coords(self, coords):
+        """with_coords
+        Return a LandmarkBatch sharing the IDs, features and paths of this one with other
+        coordinates.
+
+        Args:
+            coords (array): The coordinates of shape (number of specimens, number of landmarks, 3).
+
+        Returns:
+            A LandmarkBatch.
+        """
+        return LandmarkBatch(coords, self.ids, self.factors, self.paths)
+
+    def __len__(self):
+        return self.coords.shape[0]
+
+    def __getitem__(self, index):
+        # The coordinates of the returned LandmarkSet are a view of the coordinates of the batch
+        return LandmarkSet(
+            self.coords[index], self.ids[index], self.factors[index], self.paths[index]
+        )
+
+
+class _RunReport(object):
+    """RunReport
+    Gather the statistics of a run of pts2csv(): the wall and CPU time of each stage, the number of
+    files and points processed per second, the number of bytes read and written, the number of
+    duplicates removed in each file and the slowest files.
+    The times of the stages done for each file (parsing, dedup and cache) are summed over the files,
+    which can exceed the total time of the run when several workers are used.
+
+    Args:
+        hooks (array of function): Functions called with the name of an event ("file", "stage",
+            "progress", "sliding" or "report") and a dict describing it, e.g. to send the
+            statistics to a metrics collector.
+        verbose (bool): Whether to print the progress of the run.
+        nb_slowest (int): The number of slowest files to report.
+    """
+
+    def __init__(self, hooks=None, verbose=False, nb_slowest=_NB_SLOWEST):
+        self.hooks = list(hooks or [])
+        self.verbose = verbose
+        self.nb_slowest = nb_slowest
+        self.start_wall = time.time()
+        self.start_cpu = _cpu_time()
+        self.last_progress = None
+        self.stages = {}
+        self.nb_file = 0
+        self.nb_point = 0
+        self.nb_cached = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.duplicates = []
+        self.slowest = []
+        self.outputs = []
+        self.sliding = []
+        self.specimens = None
+
+    def _emit(self, event, data):
+        """emit
+        Call the hooks with an event.
+
+        Args:
+            event (str): The name of the event.
+            data (dict): The description of the event.
+        """
+        for hook in self.hooks:
+            hook(event, data)
+
+    def add_stage(self, name, wall, cpu):
+        """add_stage
+        Add the wall and CPU time spent in a stage.
+
+        Args:
+            name (str): The name of the stage.
+            wall (float): The wall time in seconds.
+            cpu (float): The CPU time in seconds.
+        """
+        stage = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+        stage["wall"] += wall
+        stage["cpu"] += cpu
+        self._emit("stage", {"stage": name, "wall": wall, "cpu": cpu})
+
+    def timed(self, name, items):
+        """timed
+        Yield the items of an iterable while measuring the wall and CPU time spent producing them,
+        e.g. while walking the directories as the files are processed.
+
+        Args:
+            name (str): The name of the stage.
+            items (iterable): The items to yield.
+
+        Returns:
+            A generator of the items.
+        """
+        items = iter(items)
+        while True:
+            start_wall, start_cpu = time.time(), _cpu_time()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                self.add_stage(name, time.time() - start_wall, _cpu_time() - start_cpu)
+            yield item
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """stage
+        Measure the wall and CPU time spent in a block of code.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        start_wall, start_cpu = time.time(), _cpu_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.time() - start_wall, _cpu_time() - start_cpu)
+
+    def add_file(self, filen, info):
+        """add_file
+        Add the statistics of a processed file.
+
+        Args:
+            filen (str): The path and name of the .pts file.
+            info (dict): The description of the processing returned by _process_pts().
+        """
+        self.nb_file += 1
+        self.nb_point += info["points"]
+        self.nb_cached += info["cached"]
+        self.bytes_read += info["bytes"]
+        self.duplicates.append({"file": filen, "duplicates": info["duplicates"]})
+        duration = 0.0
+        for name, (wall, cpu) in info["stages"].items():
+            stage = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            stage["wall"] += wall
+            stage["cpu"] += cpu
+            duration += wall
+        # Keep the slowest files in a heap whose first item is the fastest of them
+        if len(self.slowest) < self.nb_slowest:
+            heapq.heappush(self.slowest, (duration, filen))
+        elif self.slowest and duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, filen))
+        data = dict(info)
+        data["file"] = filen
+        self._emit("file", data)
+
+    def add_output(self, filenames):
+        """add_output
+        Add the files generated by an exporter.
+
+        Args:
+            filenames (array of str): The path and name of the generated files.
+        """
+        for filen in filenames:
+            self.outputs.append(filen)
+            self.bytes_written += os.path.getsize(filen)
+
+    def add_sliding(self, nb_iter, change, converged):
+        """add_sliding
+        Add the convergence of the sliding of the semilandmarks of an output.
+
+        Args:
+            nb_iter (int): The number of iterations done.
+            change (float): The last relative change of the sum of squared Procrustes distances.
+            converged (bool): Whether the sliding converged before the maximum number of iterations.
+        """
+        sliding = {"iterations": nb_iter, "change": change, "converged": converged}
+        self.sliding.append(sliding)
+        self._emit("sliding", sliding)
+
+    def progress(self, done, total):
+        """progress
+        Report the progress of the run, at most once every _PROGRESS_INTERVAL seconds.
+
+        Args:
+            done (int): The number of files processed.
+            total (int): The number of files to process, or None if it is not known yet.
+        """
+        now = time.time()
+        if (
+            self.last_progress is not None
+            and now - self.last_progress < _PROGRESS_INTERVAL
+            and done != total
+        ):
+            return
+        self.last_progress = now
+        rate = done / max(now - self.start_wall, 1e-9)
+        self._emit("progress", {"done": done, "total": total, "files_per_second": rate})
+        if self.verbose:
+            print(
+                str(done)
+                + ("" if total is None else "/" + str(total))
+                + " files processed ("
+                + "%.1f" % rate
+                + " files/s)"
+            )
+
+    def as_dict(self):
+        """as_dict
+        Return the statistics of the run.
+
+        Returns:
+            A dict that can be serialized in JSON.
+        """
+        wall = time.time() - self.start_wall
+        report = {
+            "wall": wall,
+            "cpu": _cpu_time() - self.start_cpu,
+            "stages": self.stages,
+            "files": self.nb_file,
+            "cached_files": self.nb_cached,
+            "points": self.nb_point,
+            "files_per_second": self.nb_file / max(wall, 1e-9),
+            "points_per_second": self.nb_point / max(wall, 1e-9),
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "duplicates_removed": sum(item["duplicates"] for item in self.duplicates),
+            "duplicates_per_file": self.duplicates,
+            "slowest_files": [
+                {"file": filen, "wall": duration}
+                for duration, filen in sorted(self.slowest, reverse=True)
+            ],
+            "outputs": self.outputs,
+        }
+        if self.sliding:
+            report["sliding"] = self.sliding
+        if self.specimens is not None:
+            report["specimens"] = self.specimens
+        self._emit("report", report)
+        return report
+
+
+def _outliers(values, threshold=_OUTLIER_THRESHOLD):
+    """outliers
+    Find the values that are far from the median, i.e. whose modified z-score, the deviation from
+    the median relatively to the median absolute deviation, exceeds a threshold. When more than half
+    of the values are equal to the median, any other value is an outlier.
+
+    Args:
+        values (array): The values.
+        threshold (float): The modified z-score above which a value is an outlier.
+
+    Returns:
+        An array of int containing the indices of the outliers.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    deviation = np.abs(values - np.median(values))
+    spread = np.median(deviation)
+    if spread == 0:
+        return np.flatnonzero(deviation > 0)
+    return np.flatnonzero(0.6745 * deviation / spread > threshold)
+
+
+class _SpecimenIndex(object):
+    """SpecimenIndex
+    Index the specimens of a run of pts2csv() to find the specimens exported several times, e.g.
+    re-exported scans or copied files, and the specimens whose number of points or centroid size is
+    far from the ones of the cohort, e.g. mislabeled files.
+    An exact duplicate has the same coordinates, which are hashed. A near duplicate has coordinates
+    differing by less than the tolerance once both specimens are centered and scaled to a unit
+    centroid size. Instead of comparing every pair of specimens, the scaled landmarks are projected
+    on a few random directions whose absolute weights sum to 1, so that the projections of near
+    duplicates also differ by less than the tolerance. The projections are rounded on a grid of
+    size tolerance and only the specimens found in the same or a neighboring cell are compared.
+    The scaled landmarks of each specimen are kept in memory as float32 for these comparisons.
+
+    Args:
+        tolerance (float): The maximum difference between the scaled coordinates of duplicates.
+        nb_projection (int): The number of random projections.
+        threshold (float): The modified z-score above which the number of points or the centroid
+            size of a specimen is an outlier.
+    """
+
+    def __init__(self, tolerance=_DUPLICATE_TOLERANCE, nb_projection=_NB_PROJECTION, threshold=_OUTLIER_THRESHOLD):
+        assert tolerance > 0, "The tolerance (" + str(tolerance) + ") must be positive."
+        self.tolerance = tolerance
+        self.nb_projection = nb_projection
+        self.threshold = threshold
+        self.hashes = {}
+        self.buckets = {}
+        self.projections = {}
+        self.neighbors = np.array(
+            np.meshgrid(*[[-1, 0, 1]] * nb_projection, indexing="ij"), dtype=np.int64
+        ).reshape(nb_projection, -1).T
+        self.shapes = []
+        self.ids = []
+        self.paths = []
+        self.points = []
+        self.centroid_sizes = []
+        self.duplicates = []
+
+    def add(self, batch, points):
+        """add
+        Index the landmarks of several specimens.
+
+        Args:
+            batch (LandmarkBatch): The deduplicated landmarks of several files.
+            points (array of int): The number of points read in each file, before the duplicates
+                were removed.
+        """
+        coords = np.asarray(batch.coords, dtype=np.float64)
+        centered = coords - coords.mean(axis=1)[:, np.newaxis, :]
+        centroid_size = np.sqrt(np.einsum("nkj,nkj->n", centered, centered))
+        scaled = centered / np.where(centroid_size > 0, centroid_size, 1.0)[:, np.newaxis, np.newaxis]
+        scaled = scaled.reshape(scaled.shape[0], -1)
+        nb_coord = scaled.shape[1]
+        if nb_coord not in self.projections:
+            # The same directions are used for all the specimens having the same number of landmarks
+            directions = np.random.RandomState(nb_coord).normal(size=(nb_coord, self.nb_projection))
+            self.projections[nb_coord] = directions / np.abs(directions).sum(axis=0)
+        cells = np.floor(scaled.dot(self.projections[nb_coord]) / self.tolerance).astype(np.int64)
+        for row in range(coords.shape[0]):
+            index = len(self.ids)
+            self.ids.append(batch.ids[row])
+            self.paths.append(batch.paths[row])
+            self.points.append(int(points[row]))
+            self.centroid_sizes.append(float(centroid_size[row]))
+            self.shapes.append(scaled[row].astype(np.float32))
+            # 64-bit hashes are enough to avoid collisions between millions of specimens
+            key = hashlib.sha1(coords[row].tobytes()).digest()[:8]
+            if key in self.hashes:
+                self.duplicates.append((index, self.hashes[key], True))
+            else:
+                self.hashes[key] = index
+                first = self._find_near(scaled[row], cells[row])
+                if first is not None:
+                    self.duplicates.append((index, first, False))
+            self.buckets.setdefault((nb_coord,) + tuple(cells[row]), []).append(index)
+
+    def _find_near(self, shape, cell):
+        """find_near
+        Find the first specimen whose scaled coordinates differ from the ones of a specimen by less
+        than the tolerance, among the specimens whose projections are in the same or a neighboring
+        cell.
+
+        Args:
+            shape (array): The scaled coordinates of the specimen.
+            cell (array of int): The cell of the projections of the specimen.
+
+        Returns:
+            The index of the first near duplicate, or None if there is none.
+        """
+        candidates = []
+        for neighbor in cell + self.neighbors:
+            candidates.extend(self.buckets.get((shape.shape[0],) + tuple(neighbor), []))
+        if not candidates:
+            return None
+        candidates.sort()
+        distances = np.abs(np.array([self.shapes[index] for index in candidates]) - shape).max(axis=1)
+        near = np.flatnonzero(distances < self.tolerance)
+        return candidates[near[0]] if near.size else None
+
+    def as_dict(self):
+        """as_dict
+        Describe the duplicated specimens and the outliers.
+
+        Returns:
+            A dict that can be serialized in JSON, containing the duplicated specimens with the
+            first specimen they duplicate, the medians of the number of points and of the centroid
+            size of the cohort, and the specimens whose number of points or centroid size is an
+            outlier.
+        """
+        if not self.ids:
+            return {"duplicates": [], "point_outliers": [], "size_outliers": []}
+        return {
+            "duplicates": [
+                {
+                    "id": self.ids[index],
+                    "file": self.paths[index],
+                    "duplicate_of": self.paths[first],
+                    "exact": exact,
+                }
+                for index, first, exact in self.duplicates
+            ],
+            "median_points": float(np.median(self.points)),
+            "median_centroid_size": float(np.median(self.centroid_sizes)),
+            "point_outliers": [
+                {"id": self.ids[index], "file": self.paths[index], "points": self.points[index]}
+                for index in _outliers(self.points, self.threshold)
+            ],
+            "size_outliers": [
+                {
+                    "id": self.ids[index],
+                    "file": self.paths[index],
+                    "centroid_size": self.centroid_sizes[index],
+                }
+                for index in _outliers(self.centroid_sizes, self.threshold)
+            ],
+        }
+
+
+def _load_rules(filen):
+    """load_rules
+    Read a rule table from a JSON file containing a list of rules, or from a CSV file with a match,
+    a mirror and an order column (e.g. the row "jaw=upper;tooth0*,1,36 35 34 ..." mirrors and
+    reorders the upper teeth whose position starts with tooth0).
+
+    Args:
+        filen (str): The path and name of the JSON or CSV file.
+
+    Returns:
+        An array of dict describing each rule, as accepted by the rules argument of pts2csv().
+    """
+    with open(filen, "r") as filep:
+        if not filen.lower().endswith(".csv"):
+            return json.load(filep)
+        rules = []
+        for row in csv.DictReader(filep):
+            rule = {"match": [cond.strip() for cond in row.get("match", "").split(";") if cond.strip()]}
+            if row.get("mirror", "").strip().lower() in ("1", "true", "yes"):
+                rule["mirror"] = True
+            if row.get("order", "").strip():
+                rule["order"] = row["order"]
+            rules.append(rule)
+        return rules
+
+
+class _RuleTable(object):
+    """RuleTable
+    Compiled table of rules selecting which specimens are mirrored and how their landmarks are
+    reordered, depending on the features described in the name of their .pts file.
+    Each rule is a dict with the keys:
+    - "match": the conditions that all the features of a specimen must fulfill, either a dict
+      mapping a feature name of the header (e.g. "jaw", or "Feature7" when no feature names are
+      supplied) to a glob pattern that this feature must match, or a list of conditions that are
+      either a glob pattern that at least one feature must match (e.g. "upper") or a "name=pattern"
+      str. A rule without conditions matches every specimen.
+    - "mirror": whether to mirror the landmarks on the z-axis.
+    - "order": the permutation to apply to the landmarks, as an array of int or a str of int
+      separated with a comma or a space.
+    The first rule matching a specimen is applied, the landmarks being mirrored before being
+    reordered. The rule matching each distinct tuple of features is only searched once, and the
+    permutations are stored as index arrays.
+
+    Args:
+        rules (array of dict): The rules, in order of priority.
+        feature_names (str or array of str): The feature names used in the header.
+    """
+
+    def __init__(self, rules, feature_names=None):
+        assert isinstance(rules, list) and rules, "The rules must be a non-empty list of dict."
+        if isinstance(feature_names, str):
+            feature_names = feature_names.split(",")
+        self.feature_names = feature_names
+        self.conditions = []
+        self.orders = []
+        mirror = []
+        for rule in rules:
+            unknown = set(rule) - set(["match", "mirror", "order"])
+            assert not unknown, "Unknown keys in the rule " + str(rule) + ": " + ", ".join(sorted(unknown))
+            match = rule.get("match", [])
+            if isinstance(match, dict):
+                conditions = sorted(match.items())
+            else:
+                if isinstance(match, str):
+                    match = [match]
+                conditions = [
+                    tuple(cond.split("=", 1)) if "=" in cond else (None, cond) for cond in match
+                ]
+            self.conditions.append(conditions)
+            order = rule.get("order")
+            if order is not None:
+                if isinstance(order, str):
+                    order = order.replace(",", " ").split()
+                order = np.array([int(val) for val in order], dtype=np.intp)
+                assert np.array_equal(np.sort(order), np.arange(len(order))), (
+                    "The order of the rule " + str(rule) + " must be a permutation of the landmarks."
+                )
+            self.orders.append(order)
+            mirror.append(bool(rule.get("mirror", False)))
+        # The last element is used by the specimens that no rule matches, whose index is -1
+        self.mirror = np.array(mirror + [False], dtype=bool)
+        self.reorder = np.array([order is not None for order in self.orders] + [False], dtype=bool)
+        self.positions = None
+        self.cache = {}
+
+    def _resolve(self, nb_feature):
+        """resolve
+        Replace the feature names of the conditions by the position of the features.
+
+        Args:
+            nb_feature (int): The number of features of the specimens.
+        """
+        names = self.feature_names
+        if names is None:
+            names = ["Feature" + str(numb) for numb in range(1, nb_feature + 1)]
+        positions = dict((name, index) for index, name in enumerate(names))
+        self.positions = []
+        for conditions in self.conditions:
+            for name, _ in conditions:
+                assert name is None or name in positions, (
+                    "The feature " + name + " of the rules is not one of " + ", ".join(names) + "."
+                )
+            self.positions.append(
+                [(None if name is None else positions[name], pattern) for name, pattern in conditions]
+            )
+
+    def _find(self, factors):
+        """find
+        Return the index of the first rule matching a tuple of features, -1 if none does.
+
+        Args:
+            factors (tuple of str): The features of a specimen.
+        """
+        for index, conditions in enumerate(self.positions):
+            if all(
+                any(fnmatch.fnmatchcase(factor, pattern) for factor in factors)
+                if position is None
+                else fnmatch.fnmatchcase(factors[position], pattern)
+                for position, pattern in conditions
+            ):
+                return index
+        return -1
+
+    def match(self, factors):
+        """match
+        Find the rule applied to each specimen.
+
+        Args:
+            factors (array of tuple of str): The features of each specimen.
+
+        Returns:
+            An array of int containing the index of the rule applied to each specimen, -1 for the
+            specimens that no rule matches.
+        """
+        indices = np.empty(len(factors), dtype=np.intp)
+        for numb, factor in enumerate(factors):
+            factor = tuple(factor)
+            index = self.cache.get(factor)
+            if index is None:
+                if self.positions is None:
+                    self._resolve(len(factor))
+                index = self.cache[factor] = self._find(factor)
+            indices[numb] = index
+        return indices
+
+
+class _Variant(object):
+    """Variant
+    Describe one output of pts2csv(): which landmarks are mirrored and reordered and where they are
+    exported. The deduplicated landmarks of each chunk of files are given to every variant, so that
+    several outputs are generated from a single reading of the .pts files.
+
+    Args:
+        mirror_factor (str): The name of the factor to use for mirroring the landmarks on the z-axis.
+        order (str or array of int): The new order to apply to the landmarks.
+        order_factor (str): The name of the factor to use for reordering the landmarks.
+        feature_names (str or array of str): The feature names to use in the header.
+        align (bool): Whether to align the landmarks with a Generalized Procrustes Analysis, in
+            which case the landmarks are only exported once all the files have been processed.
+        verbose (bool): Whether to output details during the process.
+        report (_RunReport): The statistics of the run where the time spent in each stage is added.
+        rules (array of dict): The rules selecting the landmarks to mirror and reorder depending on
+            the features of each file, which replace the mirror_factor, order and order_factor.
+        slide (str): The criterion minimized when sliding the semilandmarks along their curves,
+            "bending_energy" or "procrustes", in which case the landmarks are only exported once
+            all the files have been processed. None does not slide the semilandmarks.
+        slide_max_iter (int): The maximum number of iterations of the sliding.
+    """
+
+    def __init__(
+        self,
+        mirror_factor=None,
+        order=None,
+        order_factor=None,
+        feature_names=None,
+        align=False,
+        verbose=False,
+        report=None,
+        rules=None,
+        slide=None,
+        slide_max_iter=_SLIDE_MAX_ITER,
+    ):
+        assert rules is None or (mirror_factor is None and order is None and order_factor is None), (
+            "The rules cannot be combined with the mirror_factor, order and order_factor."
+        )
+        assert (order is None and order_factor is None) or (
+            order is not None
+            and order_factor is not None
+            and (isinstance(order_factor, str) or isinstance(order_factor, list))
+        ), "Must supply order and order_factor."
+        assert slide is None or slide in _SLIDING_METHODS, (
+            "The sliding method (" + str(slide) + ") must be one of "
+            + ", ".join(_SLIDING_METHODS) + "."
+        )
+        if isinstance(order, str):
+            order = [int(val) for val in order.split(",")]
+        self.mirror_factor = mirror_factor
+        self.order = order
+        self.order_factor = order_factor
+        self.feature_names = feature_names
+        self.align = align
+        self.verbose = verbose
+        self.report = report if report is not None else _RunReport()
+        self.rules = _RuleTable(rules, feature_names) if rules is not None else None
+        self.slide = slide
+        self.slide_max_iter = slide_max_iter
+        # Positions of the semilandmarks and of their neighbors in the first file, set by pts2csv()
+        self.curve_neighbors = None
+        self.order_factor_found_at_least_in_one_file = False
+        self.mirror_applied_at_least_in_one_file = False
+        self.exporter = None
+        self.pending = []
+
+    def matches(self, filens, factors=None):
+        """matches
+        Find the files matching the mirror_factor and the order_factor, or the rules, of the
+        variant.
+
+        Args:
+            filens (array of str): The path and name of the .pts files.
+            factors (array of tuple of str): The features of each file, computed from filens if not
+                supplied.
+
+        Returns:
+            Two arrays of bool indicating which files are mirrored and which files are reordered.
+        """
+        if self.rules is not None:
+            if factors is None:
+                factors = [_get_features(filen) for filen in filens]
+            indices = self.rules.match(factors)
+            return self.rules.mirror[indices], self.rules.reorder[indices]
+        to_mirror = np.array(
+            [
+                self.mirror_factor is not None
+                and isinstance(self.mirror_factor, str)
+                and self.mirror_factor in filen
+                for filen in filens
+            ],
+            dtype=bool,
+        )
+        to_reorder = np.array(
+            [self.order_factor is not None and self.order_factor in filen for filen in filens],
+            dtype=bool,
+        )
+        return to_mirror, to_reorder
+
+    def apply(self, batch, inplace=False):
+        """apply
+        Mirror and reorder the landmarks of the files matching the factors of the variant.
+
+        Args:
+            batch (LandmarkBatch): The landmarks of several files.
+            inplace (bool): Whether the coordinates of the batch can be modified, when no other
+                variant uses them afterwards. Otherwise they are copied if they must be modified.
+
+        Returns:
+            A LandmarkBatch, sharing the coordinates of batch if they are not modified.
+        """
+        to_mirror, to_reorder = self.matches(batch.paths, batch.factors)
+        if not to_mirror.any() and not to_reorder.any():
+            return batch
+        landmarks = batch.coords if inplace else batch.coords.copy()
+        # Apply a z-axis mirror to the landmarks to study left-right differences in the given
+        # species
+        if to_mirror.any():
+            with self.report.stage("mirror"):
+                landmarks[to_mirror] = _reverse_z_batch(landmarks[to_mirror])
+            self.mirror_applied_at_least_in_one_file = True
+        # Reorder the landmarks as specified by the order argument only for the files containing
+        # the order_factor string.
+        if to_reorder.any():
+            self.order_factor_found_at_least_in_one_file = True
+            with self.report.stage("reorder"):
+                if self.rules is None:
+                    assert sorted(self.order) == list(range(landmarks.shape[1])), (
+                        "The order must be a permutation of the "
+                        + str(landmarks.shape[1])
+                        + " landmarks, i.e. contain each index from 0 to "
+                        + str(landmarks.shape[1] - 1)
+                        + " once."
+                    )
+                    landmarks[to_reorder] = landmarks[to_reorder][:, self.order]
+                else:
+                    # Apply the permutation of each rule to all the files it matches at once
+                    indices = self.rules.match(batch.factors)
+                    for index in np.unique(indices[to_reorder]):
+                        order = self.rules.orders[index]
+                        assert len(order) == landmarks.shape[1], (
+                            "The order of the rule "
+                            + str(index + 1)
+                            + " has "
+                            + str(len(order))
+                            + " landmarks instead of "
+                            + str(landmarks.shape[1])
+                            + "."
+                        )
+                        selected = indices == index
+                        landmarks[selected] = landmarks[selected][:, order]
+        return batch.with_coords(landmarks)
+
+    def order_of(self, filen, factors):
+        """order_of
+        Return the order of the landmarks of a file after the mirroring and reordering.
+
+        Args:
+            filen (str): The path and name of the .pts file.
+            factors (tuple of str): The features of the file.
+
+        Returns:
+            An array of int containing the index of each landmark before the reordering.
+        """
+        _, to_reorder = self.matches([filen], [factors])
+        if not to_reorder[0]:
+            return None
+        if self.rules is None:
+            return np.asarray(self.order, dtype=np.intp)
+        return self.rules.orders[self.rules.match([factors])[0]]
+
+    def extra_names(self):
+        """extra_names
+        Return the names of the values computed from the landmarks that are exported with them.
+        """
+        if self.align:
+            return list(_EXTRA_NAMES)
+        return []
+
+    def write(self, batch, inplace=False):
+        """write
+        Mirror and reorder the landmarks of several files and export them. If the landmarks are
+        aligned or slid, they are kept until all the files have been processed.
+
+        Args:
+            batch (LandmarkBatch): The landmarks of several files.
+            inplace (bool): Whether the coordinates of the batch can be modified.
+        """
+        batch = self.apply(batch, inplace)
+        if self.align or self.slide is not None:
+            self.pending.append(batch)
+        else:
+            with self.report.stage("export"):
+                self.exporter.write(batch.ids, batch.coords, batch.factors)
+
+    def flush(self):
+        """flush
+        Slide, align and export the landmarks kept until all the files have been processed.
+        """
+        if not self.pending:
+            return
+        batch = LandmarkBatch.concatenate(self.pending)
+        self.pending = []
+        landmarks = batch.coords
+        if self.slide is not None:
+            # The semilandmarks are found in the first file, and are at the same positions in all
+            # the files once they are reordered
+            sliding, before, after = self.curve_neighbors
+            order = self.order_of(batch.paths[0], batch.factors[0])
+            if order is not None:
+                position = np.argsort(order)
+                sliding, before, after = position[sliding], position[before], position[after]
+            with self.report.stage("slide"):
+                landmarks, nb_iter, change = _slide(
+                    landmarks, sliding, before, after, self.slide, self.slide_max_iter
+                )
+            self.report.add_sliding(nb_iter, change, change < _SLIDE_TOLERANCE)
+            if self.verbose:
+                print(
+                    "Semilandmarks slid in "
+                    + str(nb_iter)
+                    + " iterations (last relative change of the Procrustes distances: "
+                    + str(change)
+                    + ")"
+                )
+            if not self.align:
+                with self.report.stage("export"):
+                    self.exporter.write(batch.ids, landmarks, batch.factors)
+                return
+        with self.report.stage("align"):
+            landmarks, centroid_size, nb_iter, change = _procrustes(landmarks)
+        if self.verbose:
+            print(
+                "Procrustes alignment done in "
+                + str(nb_iter)
+                + " iterations (last change of the mean shape: "
+                + str(change)
+                + ")"
+            )
+        with self.report.stage("export"):
+            self.exporter.write(batch.ids, landmarks, batch.factors, centroid_size[:, np.newaxis])
+
+    def check(self):
+        """check
+        Check that the factors of the variant have been found in at least one file.
+        """
+        if self.order_factor is not None:
+            assert self.order_factor_found_at_least_in_one_file, (
+                "The order_factor ("
+                + self.order_factor
+                + ") provided has not been found in any file names."
+            )
+        if self.mirror_factor is not None:
+            assert self.mirror_applied_at_least_in_one_file, (
+                "The mirror_factor ("
+                + self.mirror_factor
+                + ") provided has not been found in any file names."
+            )
+
+    def modif(self):
+        """modif
+        Return the name of the modification applied to the data (e.g. none, reversed, and/or
+        reordered).
+        """
+        modif = ""
+        if self.order_factor_found_at_least_in_one_file:
+            modif += "_reordered"
+        if self.mirror_applied_at_least_in_one_file:
+            modif += "_reversed"
+        if self.slide is not None:
+            modif += "_slid"
+        if self.align:
+            modif += "_aligned"
+        return modif
+
+
+def _get_path(filen):
+    """_get_path
+    Return the absolute path of the provided file name from the absolute resources directory.
+
+    Args:
+        filen (str): The name of the file in the relative path of the package.
+
+    Returns:
+        An absolute path to the custom resources provided with the package.
+    """
+    return os.path.join(os.path.abspath(os.path.dirname(__file__)), filen)
+
+
+def _print_specimens(specimens, verbose=False):
+    """print_specimens
+    Print the number of duplicated specimens and of outliers found by a _SpecimenIndex and, in
+    verbose mode, the first ones of each kind.
+
+    Args:
+        specimens (dict): The duplicates and outliers, as returned by _SpecimenIndex.as_dict().
+        verbose (bool): Whether to print the files.
+    """
+    print(
+        str(len(specimens["duplicates"]))
+        + " duplicated specimens, "
+        + str(len(specimens["point_outliers"]))
+        + " outliers by number of points and "
+        + str(len(specimens["size_outliers"]))
+        + " outliers by centroid size found"
+    )
+    if not verbose:
+        return
+    lines = {
+        "duplicates": lambda item: (
+            ("Exact" if item["exact"] else "Near") + " duplicate: " + item["file"]
+            + " of " + item["duplicate_of"]
+        ),
+        "point_outliers": lambda item: (
+            "Outlier by number of points: " + item["file"] + " (" + str(item["points"]) + ")"
+        ),
+        "size_outliers": lambda item: (
+            "Outlier by centroid size: " + item["file"] + " (" + repr(item["centroid_size"]) + ")"
+        ),
+    }
+    for key in ["duplicates", "point_outliers", "size_outliers"]:
+        for item in specimens[key][:_NB_SHOWN]:
+            print(lines[key](item))
+        if len(specimens[key]) > _NB_SHOWN:
+            print("... and " + str(len(specimens[key]) - _NB_SHOWN) + " more")
+
+
+def pts2csv(
+    indir=None,
+    outdir=None,
+    mirror_factor=None,
+    order=None,
+    order_factor=None,
+    feature_names=None,
+    verbose=False,
+    epsilon=EPSILON,
+    workers=1,
+    cache_dir=None,
+    cache_hash=False,
+    output_format="csv",
+    variants=None,
+    align=False,
+    hooks=None,
+    include=None,
+    exclude=None,
+    exclude_dirs=None,
+    dtype=None,
+    precision=None,
+    notation=_NOTATION,
+    rules=None,
+    chunk_size=None,
+    shard_by=None,
+    slide=None,
+    slide_max_iter=_SLIDE_MAX_ITER,
+    check_specimens=False,
+    duplicate_tolerance=_DUPLICATE_TOLERANCE,
+):
+    """pts2csv
+    Convert .pts files from indir to a single .csv file
+
+    Args:
+        indir (str): The name of the directory where the .pts files are stored, or of a zip or tar
+        archive (possibly compressed) containing them, which is read without being extracted. The
+        IDs and features are the same as if the archive was extracted in its directory.
+        outdir (str): The name of the directory where the output files will be stored.
+        mirror_factor (str): The name of the factor to use for mirroring the landmarks on the z-axis.
+        order (str or array of int): A string (if supplied by the command line) or an array of int
+        (if called from another python script) indicating how to reorder the landmarks (e.g. "1,3,2"
+        if supplied from the command line or [1, 3, 2] if supplied by another python script).
+        order_factor (str): The name of the factor to use for reordering the landmarks.
+        feature_names (str or array of str): String describing each feature names separated with a
+        comma or array of string (e.g. "age,sex,size" if supplied from the command line or 
+        ["age", "sex", "size"] if supplied in python script).
+        verbose (bool): Whether to output details during the process.
+        epsilon (float): The relative tolerance used to detect duplicated landmarks.
+        workers (int): The number of processes used to read the files and remove the duplicates. 1
+        processes the files in the current process and 0 uses as many processes as there are CPUs.
+        cache_dir (str): The name of a directory where the processed landmarks of each file are
+        cached, so that the files that did not change since the previous run are not processed
+        again. The entries of the files that changed or do not exist anymore are evicted.
+        cache_hash (bool): Whether to also check a hash of the content of the files before using
+        the cache, in addition to their size and modification time.
+        output_format (str): The format of the output file, either "csv", "npy" to store the
+        landmarks in a memory-mappable .npy file with a companion "_factors.npz" file storing the
+        IDs and the features, or "npz" to store everything in a single .npz file. The npy and npz
+        files can be read with load_landmarks().
+        variants (array of dict): The outputs to generate from a single reading of the .pts files,
+        each one described by a dict that can contain the mirror_factor, order, order_factor and
+        feature_names keys (e.g. [{}, {"mirror_factor": "upper"}] generates landmarks.csv and
+        landmarks_reversed.csv). The feature_names argument is used for the variants that do not
+        define their own. Cannot be combined with the mirror_factor, order and order_factor
+        arguments.
+        align (bool): Whether to align the landmarks with a Generalized Procrustes Analysis after
+        the mirroring and reordering. The aligned landmarks have a unit centroid size and the
+        centroid size of each specimen is exported in an extra column after the coordinates. The
+        variants can also define their own align key.
+        hooks (array of function): Functions called during the run with the name of an event
+        ("file", "stage", "progress", "sliding" or "report") and a dict describing it, e.g. to send
+        the statistics of the run to a metrics collector.
+        include (str or array of str): The glob patterns that the names of the files to process
+        must match, separated with a comma if supplied from the command line (e.g. "*.pts,*.PTS").
+        Default to "*.pts".
+        exclude (str or array of str): The glob patterns of the names of the files to ignore (e.g.
+        "*_draft.pts").
+        exclude_dirs (str or array of str): The glob patterns of the names of the directories that
+        are not walked (e.g. ".git,backup*").
+        dtype (type or str): The type of the coordinates after the files are read, np.float64 by
+        default. np.float32 halves the memory used and the size of the npy and npz files but the
+        coordinates are rounded to about 7 significant digits.
+        precision (int): The number of digits of the coordinates in the csv: significant digits in
+        the general notation or digits after the decimal point in the fixed notation. By default,
+        the coordinates are written with all the digits needed to read back the exact values.
+        notation (str): "general" to use the scientific notation for large or small values (as with
+        "%g") or "fixed" to always use the decimal notation (as with "%f"), when a precision is
+        supplied.
+        rules (array of dict): A table of rules mirroring and reordering the landmarks depending on
+        the features of each file, so that files needing different permutations are processed in a
+        single run. Each rule is a dict with a "match" key giving the features the file must have
+        (e.g. {"jaw": "upper", "position": "tooth0*"} with the feature names of the header, or
+        ["upper"] to match any feature), a "mirror" key and an "order" key giving the permutation
+        of the landmarks. The first matching rule is applied. Cannot be combined with the
+        mirror_factor, order and order_factor arguments, and the variants can define their own
+        rules key.
+        chunk_size (int): The maximum number of rows of each output file. The rows are split in
+        files named "landmarks_00000.csv", "landmarks_00001.csv" and so on.
+        shard_by (str): The name of a feature in the header (e.g. "jaw", or "Feature7" when no
+        feature_names are supplied) whose values are written in different files (e.g.
+        "landmarks_lower.csv" and "landmarks_upper.csv"), possibly split by chunk_size. When the
+        output is split, a manifest named "landmarks_manifest.json" lists the files with their
+        number of rows and the IDs of their first and last rows, and the files are written
+        concurrently.
+        slide (str): Whether to slide the semilandmarks (C) along their curves after the mirroring
+        and reordering, toward the mean shape of the specimens, by minimizing the "bending_energy"
+        of the thin-plate spline from the mean shape or the "procrustes" distance to the mean
+        shape. The curves are read from the labels of the first file and must be at the same
+        positions in all the files once they are reordered. The slid landmarks stay in the
+        coordinate system of each specimen unless they are also aligned, and the convergence is
+        added to the returned dict. The variants can also define their own slide key.
+        slide_max_iter (int): The maximum number of iterations of the sliding.
+        check_specimens (bool): Whether to find the specimens exported several times, e.g.
+        re-exported scans or copied files, and the specimens whose number of points or centroid
+        size is far from the median of the cohort, e.g. mislabeled files. They are printed and
+        added to the returned dict. The landmarks are hashed and projected so that only the
+        specimens with close projections are compared.
+        duplicate_tolerance (float): The difference between the coordinates of two specimens,
+        relatively to their centroid size, below which they are considered as duplicates, once
+        centered and scaled to a unit centroid size.
+
+    Returns:
+        A dict describing the run: the wall and CPU time of each stage, the number of files and
+        points processed per second, the number of bytes read and written, the number of duplicates
+        removed in each file and the slowest files.
+    """
+    assert os.path.exists(indir), indir + " not found."
+    report = _RunReport(hooks, verbose)
+    if variants is None:
+        variants = [
+            _Variant(
+                mirror_factor,
+                order,
+                order_factor,
+                feature_names,
+                align,
+                verbose,
+                report,
+                rules,
+                slide,
+                slide_max_iter,
+            )
+        ]
+    else:
+        assert mirror_factor is None and order is None and order_factor is None and rules is None, (
+            "The mirror_factor, order, order_factor and rules must be supplied in the variants."
+        )
+        assert variants, "At least one variant must be supplied."
+        variants = [
+            _Variant(
+                variant.get("mirror_factor"),
+                variant.get("order"),
+                variant.get("order_factor"),
+                variant.get("feature_names", feature_names),
+                variant.get("align", align),
+                verbose,
+                report,
+                variant.get("rules"),
+                variant.get("slide", slide),
+                slide_max_iter,
+            )
+            for variant in variants
+        ]
+    archive = _is_archive(indir)
+    if not archive:
+        assert os.path.isdir(indir), indir + " is neither a directory nor a zip or tar archive."
+        if indir[-1] != os.sep:
+            indir += os.sep
+
+    assert output_format in _EXPORTERS, (
+        "The output_format (" + str(output_format) + ") must be one of "
+        + ", ".join(sorted(_EXPORTERS)) + "."
+    )
+    # The precision and notation only apply to the text of the csv
+    exporter_kwargs = {}
+    if output_format == "csv":
+        exporter_kwargs = {"precision": precision, "notation": notation}
+    if cache_dir is not None and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    nb_feature = 0
+    nb_landmark = 0
+    aligned = any(variant.align or variant.slide is not None for variant in variants)
+    curve_neighbors = None
+    specimen_index = _SpecimenIndex(duplicate_tolerance) if check_specimens else None
+    # The .pts files are processed while the directories are walked, or read from the archive
+    # without extracting it
+    list_pts_files = report.timed(
+        "listing", (_iter_archive if archive else _iter_pts)(indir, include, exclude, exclude_dirs)
+    )
+    # Read the .pts files and remove the duplicates, possibly in parallel, the results being gathered
+    # in the same order as the file names.
+    processed = _imap(
+        functools.partial(
+            _process_pts, epsilon=epsilon, cache_dir=cache_dir, cache_hash=cache_hash
+        ),
+        list_pts_files,
+        workers=workers,
+    )
+    filenames = []
+    try:
+        # Process the .pts files by chunks so that the memory used does not depend on the number
+        # of files
+        for chunk in _chunks(processed, _CHUNK_SIZE):
+            # For each .pts file
+            for filen, (data, info) in chunk:
+                filen = getattr(filen, "path", filen)
+                filenames.append(filen)
+                report.add_file(filen, info)
+                report.progress(len(filenames), None)
+                # Count the number of feature in that file
+                nb_detected_feature = _count_features(filen)
+                if nb_feature == 0:
+                    # Use the number of features from the first .pts file as reference
+                    nb_feature = nb_detected_feature
+                else:
+                    # Check that the number of feature between all .pts files are consistent
+                    assert nb_feature == nb_detected_feature, (
+                        "The name of the file or of the directory does not seems to be consistent because for "
+                        + filen
+                        + " because there are "
+                        + str(nb_detected_feature)
+                        + " detected features while "
+                        + str(nb_feature)
+                        + " were expected."
+                    )
+                if nb_landmark == 0:
+                    nb_landmark = len(data)
+                assert len(data) == nb_landmark, (
+                    "Some landmarks may not be correctly superimposed for "
+                    + filen
+                    + " because there are "
+                    + str(len(data))
+                    + " landmarks detected instead of "
+                    + str(nb_landmark)
+                )
+            # Gather the landmarks of the chunk in a single contiguous array
+            filens = [getattr(filen, "path", filen) for filen, _ in chunk]
+            batch = LandmarkBatch.from_sets(
+                [
+                    LandmarkSet(data, _get_id(filen), _get_features(filen), filen)
+                    for filen, (_, (data, _)) in zip(filens, chunk)
+                ],
+                dtype,
+            )
+            if specimen_index is not None:
+                with report.stage("index"):
+                    specimen_index.add(batch, [info["points"] for _, (_, info) in chunk])
+            if curve_neighbors is None and any(variant.slide is not None for variant in variants):
+                # Find the semilandmarks from the labels of the first file
+                first = chunk[0][0]
+                if isinstance(first, _ArchiveMember):
+                    labels, coord = _parse_pts(first.content, first.path)
+                else:
+                    labels, coord = _read_pts(first)
+                _, index = _remove_duplicates(coord, epsilon=epsilon, return_index=True)
+                curve_neighbors = _curve_neighbors(labels, coord, index)
+                for variant in variants:
+                    variant.curve_neighbors = curve_neighbors
+            # Give the landmarks to every variant, the last one modifying them in place unless
+            # they are kept by an aligned or slid variant
+            for index, variant in enumerate(variants):
+                if variant.exporter is None:
+                    # The header is written as soon as the number of landmarks and features are
+                    # known
+                    create = functools.partial(
+                        _EXPORTERS[output_format],
+                        nb_landmark,
+                        len(batch.factors[0]),
+                        outdir=outdir,
+                        feature_names=variant.feature_names,
+                        extra_names=variant.extra_names(),
+                        **exporter_kwargs
+                    )
+                    if chunk_size is None and shard_by is None:
+                        variant.exporter = create()
+                    else:
+                        variant.exporter = _ShardedExporter(
+                            create,
+                            chunk_size,
+                            _feature_position(
+                                shard_by, nb_landmark, len(batch.factors[0]), variant.feature_names
+                            ),
+                            shard_by,
+                        )
+                variant.write(batch, inplace=index == len(variants) - 1 and not aligned)
+        assert filenames, "There are no .pts files in " + indir
+        report.progress(len(filenames), len(filenames))
+        for variant in variants:
+            variant.flush()
+            variant.check()
+        if specimen_index is not None:
+            report.specimens = specimen_index.as_dict()
+            _print_specimens(report.specimens, verbose)
+        modifs = [variant.modif() for variant in variants]
+        assert len(set(modifs)) == len(modifs), (
+            "Several variants would generate the same file, each variant must apply different "
+            + "modifications."
+        )
+    except BaseException:
+        for variant in variants:
+            if variant.exporter is not None:
+                variant.exporter.abort()
+        raise
+    with report.stage("export"):
+        for variant, modif in zip(variants, modifs):
+            variant.exporter.close(modif)
+            report.add_output(variant.exporter.filenames)
+    if cache_dir is not None:
+        with report.stage("cache"):
+            _evict_cache(cache_dir, filenames)
+    return report.as_dict()
+
+
+def _try(func, item):
+    """try
+    Apply func to an item and return the error instead of raising it, so that an invalid file does
+    not stop the processing of the other files.
+
+    Args:
+        func (function): The function to apply.
+        item: The item to process.
+
+    Returns:
+        A tuple containing the result of func, or None, and the error message, or None.
+    """
+    try:
+        return func(item), None
+    except (AssertionError, ValueError, IOError, OSError) as error:
+        return None, str(error)
+
+
+def _format_csv(rows):
+    """format_csv
+    Format rows as CSV lines, as they are written by csv.writer.
+
+    Args:
+        rows (array): The values of each row.
+
+    Returns:
+        An array of str containing each line with its line terminator.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    lines = []
+    for row in rows:
+        writer.writerow(row)
+        lines.append(buf.getvalue())
+        buf.seek(0)
+        buf.truncate()
+    return lines
+
+
+class _Watcher(object):
+    """Watcher
+    Keep the outputs of pts2csv() up to date with the .pts files of a directory. The formatted row
+    of each file is kept in memory, so that when files are added, changed or removed only these
+    files are processed and the outputs are updated in place: the rows are appended when the files
+    come after all the others in the sorted order, otherwise the outputs are rewritten from the
+    first affected row. An output is fully rewritten when its name or header changes or when it
+    does not have the expected size anymore.
+    The rows after the first affected one are not written atomically, so a reader may see a
+    partially updated output while it is being updated.
+
+    Args:
+        indir (str): The name of the directory where the .pts files are stored.
+        outdir (str): The name of the directory where the output files will be stored.
+        variants (array of _Variant): The outputs to keep up to date, which cannot be aligned or
+            slid.
+        epsilon (float): The relative tolerance used to detect duplicated landmarks.
+        workers (int): The number of processes used to read the files and remove the duplicates.
+        cache_dir (str): The name of a directory where the processed landmarks of each file are
+            cached.
+        cache_hash (bool): Whether to also check a hash of the content of the files before using
+            the cache.
+        include (str or array of str): The glob patterns that the file names must match.
+        exclude (str or array of str): The glob patterns of the file names to ignore.
+        exclude_dirs (str or array of str): The glob patterns of the directory names to ignore.
+        verbose (bool): Whether to output details during the process.
+        precision (int): The number of digits of the coordinates, None to write the exact values.
+        notation (str): "general" or "fixed".
+    """
+
+    def __init__(
+        self,
+        indir,
+        outdir=None,
+        variants=None,
+        epsilon=EPSILON,
+        workers=1,
+        cache_dir=None,
+        include=None,
+        exclude=None,
+        exclude_dirs=None,
+        verbose=False,
+        precision=None,
+        notation=_NOTATION,
+        cache_hash=False,
+    ):
+        assert os.path.isdir(indir), indir + " must be a directory to be watched."
+        self.precision = precision
+        self.notation = notation
+        self.indir = indir
+        self.outdir = os.path.abspath(outdir if outdir is not None else "./")
+        self.variants = variants if variants is not None else [_Variant()]
+        assert not any(variant.align or variant.slide is not None for variant in self.variants), (
+            "The aligned and slid landmarks depend on all the specimens and cannot be updated in "
+            + "place."
+        )
+        self.process = functools.partial(
+            _try,
+            functools.partial(
+                _process_pts, epsilon=epsilon, cache_dir=cache_dir, cache_hash=cache_hash
+            ),
+        )
+        self.workers = workers
+        self.patterns = (include, exclude, exclude_dirs)
+        self.verbose = verbose
+        # Encoding used by the exporter to write the text of the csv
+        self.encoding = locale.getpreferredencoding(False)
+        self.signatures = {}
+        self.paths = []
+        self.lines = [{} for _ in self.variants]
+        self.sizes = [{} for _ in self.variants]
+        self.outputs = [None for _ in self.variants]
+        self.expected_sizes = [None for _ in self.variants]
+        self.nb_landmark = 0
+        self.nb_feature = 0
+        self.nb_column = 0
+
+    def snapshot(self):
+        """snapshot
+        Return the size and modification time of each .pts file of the directory.
+
+        Returns:
+            A dict containing the signature of each .pts file.
+        """
+        signatures = {}
+        for filen in _iter_pts(self.indir, *self.patterns):
+            try:
+                stat = os.stat(filen)
+            except OSError:
+                # The file has been removed since the directory was read
+                continue
+            signatures[filen] = (stat.st_size, getattr(stat, "st_mtime_ns", stat.st_mtime))
+        return signatures
+
+    def _check(self, filen, data):
+        """check
+        Check that a file has the same number of landmarks and features as the other files.
+
+        Args:
+            filen (str): The path and name of the .pts file.
+            data (array): The landmarks of the file.
+        """
+        if self.nb_landmark == 0:
+            self.nb_landmark = len(data)
+            self.nb_feature = _count_features(filen)
+            # The header uses the number of features of the name of the file
+            self.nb_column = len(_get_features(filen))
+        assert len(data) == self.nb_landmark, (
+            "Some landmarks may not be correctly superimposed for "
+            + filen
+            + " because there are "
+            + str(len(data))
+            + " landmarks detected instead of "
+            + str(self.nb_landmark)
+        )
+        assert _count_features(filen) == self.nb_feature, (
+            "The name of the file or of the directory does not seems to be consistent for "
+            + filen
+            + " because there are "
+            + str(_count_features(filen))
+            + " detected features while "
+            + str(self.nb_feature)
+            + " were expected."
+        )
+
+    def update(self, signatures):
+        """update
+        Process the files that were added or changed since the previous update and update the
+        outputs. The files that cannot be processed are reported and ignored until they change.
+
+        Args:
+            signatures (dict): The signature of each .pts file, as returned by snapshot().
+
+        Returns:
+            An array of str containing the path and name of the files that were added, changed or
+            removed.
+        """
+        changed = sorted(
+            filen for filen in signatures if self.signatures.get(filen) != signatures[filen]
+        )
+        removed = sorted(filen for filen in self.signatures if filen not in signatures)
+        if not changed and not removed and all(self.outputs):
+            return []
+        self.signatures = dict(signatures)
+        first = len(self.paths)
+        # Remove the rows of the removed and changed files
+        for filen in removed + changed:
+            index = bisect.bisect_left(self.paths, filen)
+            if index < len(self.paths) and self.paths[index] == filen:
+                del self.paths[index]
+                for lines, sizes in zip(self.lines, self.sizes):
+                    del lines[filen]
+                    del sizes[filen]
+            first = min(first, index)
+        # Process the added and changed files and insert their rows
+        filens = []
+        landmarks = []
+        for filen, (result, error) in _imap(self.process, changed, workers=self.workers):
+            if error is None:
+                try:
+                    self._check(filen, result[0])
+                except AssertionError as check_error:
+                    error = str(check_error)
+            if error is not None:
+                print("Ignored " + filen + ": " + error)
+                continue
+            data = result[0]
+            filens.append(filen)
+            landmarks.append(data)
+        if filens:
+            batch = LandmarkBatch.from_sets(
+                [
+                    LandmarkSet(data, _get_id(filen), _get_features(filen), filen)
+                    for filen, data in zip(filens, landmarks)
+                ]
+            )
+            for variant, lines, sizes in zip(self.variants, self.lines, self.sizes):
+                landmark_batch = variant.apply(batch)
+                rows = _format_rows(
+                    landmark_batch.ids,
+                    landmark_batch.coords,
+                    landmark_batch.factors,
+                    precision=self.precision,
+                    notation=self.notation,
+                )
+                for filen, line in zip(filens, rows):
+                    lines[filen] = line
+                    sizes[filen] = len(line.encode(self.encoding))
+            for filen in filens:
+                index = bisect.bisect_left(self.paths, filen)
+                self.paths.insert(index, filen)
+                first = min(first, index)
+        if self.nb_landmark:
+            modifs = []
+            for variant in self.variants:
+                to_mirror, to_reorder = variant.matches(self.paths)
+                variant.mirror_applied_at_least_in_one_file = bool(to_mirror.any())
+                variant.order_factor_found_at_least_in_one_file = bool(to_reorder.any())
+                modifs.append(variant.modif())
+            assert len(set(modifs)) == len(modifs), (
+                "Several variants would generate the same file, each variant must apply different "
+                + "modifications."
+            )
+            for index in range(len(self.variants)):
+                self._write(index, first)
+        return sorted(removed + changed)
+
+    def _write(self, index, first):
+        """write
+        Update the output of a variant from the row of the first affected file.
+
+        Args:
+            index (int): The index of the variant.
+            first (int): The index in the sorted files of the first row to write.
+        """
+        variant = self.variants[index]
+        lines, sizes = self.lines[index], self.sizes[index]
+        output = os.path.join(self.outdir, "landmarks" + variant.modif() + ".csv")
+        header = _format_csv(
+            [_csv_header(self.nb_landmark, self.nb_column, variant.feature_names)]
+        )[0]
+        offset = len(header.encode(self.encoding)) + sum(
+            sizes[filen] for filen in self.paths[:first]
+        )
+        expected = offset + sum(sizes[filen] for filen in self.paths[first:])
+        # The output is only updated in place if it has not been changed since the previous update
+        if output == self.outputs[index] and os.path.isfile(output):
+            if os.path.getsize(output) == self.expected_sizes[index]:
+                with open(output, "r+b") as filep:
+                    filep.seek(offset)
+                    filep.truncate()
+                    filep.write(
+                        "".join(lines[filen] for filen in self.paths[first:]).encode(self.encoding)
+                    )
+                self.expected_sizes[index] = expected
+                print(
+                    "File successfully updated: "
+                    + output
+                    + " ("
+                    + str(len(self.paths) - first)
+                    + " rows written)"
+                )
+                return
+        exporter = _CsvExporter(
+            self.nb_landmark, self.nb_column, outdir=self.outdir, feature_names=variant.feature_names
+        )
+        try:
+            exporter.writelines(lines[filen] for filen in self.paths)
+        except BaseException:
+            exporter.abort()
+            raise
+        exporter.close(variant.modif())
+        self.outputs[index] = output
+        self.expected_sizes[index] = expected
+
+
+def watch(
+    indir=None,
+    outdir=None,
+    mirror_factor=None,
+    order=None,
+    order_factor=None,
+    feature_names=None,
+    verbose=False,
+    epsilon=EPSILON,
+    workers=1,
+    cache_dir=None,
+    variants=None,
+    include=None,
+    exclude=None,
+    exclude_dirs=None,
+    interval=_WATCH_INTERVAL,
+    debounce=_WATCH_DEBOUNCE,
+    max_updates=None,
+    precision=None,
+    notation=_NOTATION,
+    rules=None,
+    cache_hash=False,
+):
+    """watch
+    Generate the csv files like pts2csv() and keep them up to date by polling indir for .pts files
+    that are added, changed or removed. Only these files are processed and the csv files are
+    updated in place, at a cost proportional to the change instead of the number of files.
+
+    Args:
+        indir (str): The name of the directory where the .pts files are stored.
+        outdir (str): The name of the directory where the output files will be stored.
+        mirror_factor (str): The name of the factor to use for mirroring the landmarks on the z-axis.
+        order (str or array of int): The new order to apply to the landmarks.
+        order_factor (str): The name of the factor to use for reordering the landmarks.
+        feature_names (str or array of str): The feature names to use in the header.
+        verbose (bool): Whether to output details during the process.
+        epsilon (float): The relative tolerance used to detect duplicated landmarks.
+        workers (int): The number of processes used to read the files and remove the duplicates.
+        cache_dir (str): The name of a directory where the processed landmarks of each file are
+        cached, so that restarting the watch does not process all the files again.
+        variants (array of dict): The outputs to keep up to date, as in pts2csv(). The aligned and
+        slid outputs are not supported because they depend on all the specimens.
+        include (str or array of str): The glob patterns that the file names must match.
+        exclude (str or array of str): The glob patterns of the file names to ignore.
+        exclude_dirs (str or array of str): The glob patterns of the directory names to ignore.
+        interval (float): The duration in seconds between two polls of indir.
+        debounce (float): The duration in seconds without any change to wait before processing
+        the changes, so that a burst of changes is processed at once.
+        max_updates (int): The number of updates after which the watch stops, None to watch until
+        interrupted.
+        precision (int): The number of digits of the coordinates, None to write the exact values.
+        notation (str): "general" or "fixed", when a precision is supplied.
+        rules (array of dict): A table of rules mirroring and reordering the landmarks depending on
+        the features of each file, as in pts2csv().
+        cache_hash (bool): Whether to also check a hash of the content of the files before using
+        the cache.
+    """
+    if variants is None:
+        variants = [
+            _Variant(mirror_factor, order, order_factor, feature_names, rules=rules)
+        ]
+    else:
+        assert mirror_factor is None and order is None and order_factor is None and rules is None, (
+            "The mirror_factor, order, order_factor and rules must be supplied in the variants."
+        )
+        variants = [
+            _Variant(
+                variant.get("mirror_factor"),
+                variant.get("order"),
+                variant.get("order_factor"),
+                variant.get("feature_names", feature_names),
+                variant.get("align", False),
+                rules=variant.get("rules"),
+                slide=variant.get("slide"),
+            )
+            for variant in variants
+        ]
+    if cache_dir is not None and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    watcher = _Watcher(
+        indir,
+        outdir,
+        variants,
+        epsilon,
+        workers,
+        cache_dir,
+        include,
+        exclude,
+        exclude_dirs,
+        verbose,
+        precision,
+        notation,
+        cache_hash,
+    )
+    watcher.update(watcher.snapshot())
+    nb_update = 0
+    try:
+        while max_updates is None or nb_update < max_updates:
+            time.sleep(interval)
+            signatures = watcher.snapshot()
+            if signatures == watcher.signatures:
+                continue
+            # Wait until the files stop changing so that a burst of changes is processed at once
+            # and the files being written are not read
+            while True:
+                time.sleep(debounce)
+                latest = watcher.snapshot()
+                if latest == signatures:
+                    break
+                signatures = latest
+            updated = watcher.update(signatures)
+            nb_update += 1
+            if verbose:
+                print(str(len(updated)) + " files added, changed or removed")
+    except KeyboardInterrupt:
+        pass
+
+
+def compare(filen1, filen2, tolerance=EPSILON, chunk_size=2 ** 16):
+    """compare
+    Compare two outputs of pts2csv(), in any output format, to detect the differences between two
+    releases or two sets of options. The specimens are matched by ID and the absolute deviation of
+    the coordinates of each landmark is computed by chunks of specimens, so that the memory used
+    does not depend on the number of specimens when the landmarks are memory-mapped.
+
+    Args:
+        filen1 (str): The path and name of the reference .csv, .npy or .npz file.
+        filen2 (str): The path and name of the compared file.
+        tolerance (float): The absolute deviation above which a coordinate is considered different.
+        chunk_size (int): The number of specimens compared at once.
+
+    Returns:
+        A dict containing the number of specimens found in both files, the IDs of the specimens
+        missing from filen2 ("missing") or only found in filen2 ("extra"), the IDs of the specimens
+        whose features or whose landmarks differ, the maximum and mean absolute deviation of each
+        landmark ("max_deviation" and "mean_deviation") and over all the landmarks ("max" and
+        "mean"), and whether the two files are equal up to the tolerance ("equal").
+    """
+    ids1, landmarks1, features1, feature_names1 = load_landmarks(filen1)
+    ids2, landmarks2, features2, feature_names2 = load_landmarks(filen2)
+    assert landmarks1.shape[1] == landmarks2.shape[1], (
+        "The files have a different number of landmarks: "
+        + str(landmarks1.shape[1])
+        + " in "
+        + filen1
+        + " and "
+        + str(landmarks2.shape[1])
+        + " in "
+        + filen2
+        + "."
+    )
+    for filen, ids in [(filen1, ids1), (filen2, ids2)]:
+        assert len(np.unique(ids)) == len(ids), "The IDs of " + filen + " are not unique."
+    # Find each ID of the reference among the sorted IDs of the compared file, the specimens being
+    # compared in the order of the reference, which keeps the reads of memory-mapped landmarks
+    # sequential
+    sorter = np.argsort(ids2, kind="mergesort")
+    position = np.minimum(np.searchsorted(ids2, ids1, sorter=sorter), max(len(ids2) - 1, 0))
+    index1 = np.flatnonzero(ids2[sorter[position]] == ids1) if len(ids2) else np.arange(0)
+    index2 = sorter[position[index1]]
+    nb_landmark = landmarks1.shape[1]
+    max_deviation = np.zeros(nb_landmark)
+    sum_deviation = np.zeros(nb_landmark)
+    different = []
+    for start in range(0, len(index1), chunk_size):
+        chunk1, chunk2 = index1[start : start + chunk_size], index2[start : start + chunk_size]
+        deviation = np.abs(
+            np.asarray(landmarks1[chunk1], dtype=np.float64)
+            - np.asarray(landmarks2[chunk2], dtype=np.float64)
+        )
+        max_deviation = np.maximum(max_deviation, deviation.max(axis=(0, 2)))
+        sum_deviation += deviation.sum(axis=(0, 2))
+        different.extend(ids1[chunk1[(deviation > tolerance).any(axis=(1, 2))]].tolist())
+    same_features = (
+        features1.shape[1] == features2.shape[1]
+        and np.array_equal(feature_names1, feature_names2)
+    )
+    if features1.shape[1] == features2.shape[1]:
+        different_features = ids1[index1[(features1[index1] != features2[index2]).any(axis=1)]]
+    else:
+        different_features = ids1[index1]
+    mean_deviation = sum_deviation / max(len(index1) * 3, 1)
+    result = {
+        "nb_common": len(index1),
+        "missing": np.setdiff1d(ids1, ids2, assume_unique=True).tolist(),
+        "extra": np.setdiff1d(ids2, ids1, assume_unique=True).tolist(),
+        "different_landmarks": different,
+        "different_features": different_features.tolist(),
+        "max_deviation": max_deviation.tolist(),
+        "mean_deviation": mean_deviation.tolist(),
+        "max": float(max_deviation.max()),
+        "mean": float(mean_deviation.mean()),
+    }
+    result["equal"] = bool(
+        same_features
+        and not result["missing"]
+        and not result["extra"]
+        and not different
+        and not result["different_features"]
+    )
+    return result
+
+
+def _run_job(request):
+    """run_job
+    Run a job received by the server and describe its result.
+
+    Args:
+        request (dict): The job, containing the name of the function to call ("pts2csv" by default
+            or "compare"), its keyword arguments ("kwargs") and an "id" returned with the result.
+
+    Returns:
+        A dict containing the id of the job, whether it succeeded ("ok") and either the value
+        returned by the function ("result") or the error raised ("error").
+    """
+    response = {"id": request.get("id")}
+    try:
+        function = request.get("function", "pts2csv")
+        assert function in _SERVER_FUNCTIONS, (
+            "The function (" + str(function) + ") must be one of "
+            + ", ".join(sorted(_SERVER_FUNCTIONS)) + "."
+        )
+        response["result"] = globals()[function](**request.get("kwargs", {}))
+        response["ok"] = True
+    except Exception as error:
+        response["ok"] = False
+        response["error"] = type(error).__name__ + ": " + str(error)
+    return response
+
+
+class _Server(object):
+    """Server
+    Run the jobs received by serve() in a fixed number of threads, so that the module and NumPy are
+    only imported once for all the jobs. The jobs wait in a bounded queue: when it is full, no more
+    requests are read until a job is completed.
+
+    Args:
+        jobs (int): The number of jobs run concurrently.
+        queue_size (int): The maximum number of jobs waiting to be run.
+    """
+
+    def __init__(self, jobs=_SERVER_JOBS, queue_size=_SERVER_QUEUE_SIZE):
+        assert jobs > 0, "The number of concurrent jobs must be positive."
+        self.queue = queue.Queue(queue_size)
+        self.threads = [threading.Thread(target=self._work) for _ in range(jobs)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        """work
+        Run the jobs of the queue until None is received.
+        """
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            request, respond = item
+            respond(_run_job(request))
+
+    def submit(self, line, respond):
+        """submit
+        Queue the job described by a JSON line, waiting while the queue is full.
+
+        Args:
+            line (str): The JSON description of the job.
+            respond (function): The function called with the description of the result.
+        """
+        try:
+            request = json.loads(line)
+            assert isinstance(request, dict), "A job must be described by a JSON object."
+        except (ValueError, AssertionError) as error:
+            respond({"id": None, "ok": False, "error": type(error).__name__ + ": " + str(error)})
+            return
+        self.queue.put((request, respond))
+
+    def stop(self):
+        """stop
+        Wait until all the queued jobs are completed and stop the threads.
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+def _respond_to(filep, encoding=None):
+    """respond_to
+    Return a function writing the results of the jobs as JSON lines to a file, which can be called
+    concurrently by several threads.
+
+    Args:
+        filep (file): The file where the results are written.
+        encoding (str): The encoding of the lines when filep is a binary file, None otherwise.
+
+    Returns:
+        A function taking the description of a result.
+    """
+    lock = threading.Lock()
+
+    def respond(response):
+        line = json.dumps(response, sort_keys=True) + "\n"
+        with lock:
+            filep.write(line.encode(encoding) if encoding else line)
+            filep.flush()
+
+    return respond
+
+
+def _is_socket(path):
+    """is_socket
+    Return True if path is a Unix socket.
+
+    Args:
+        path (str): The path to check.
+    """
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def _remove_stale_socket(socket_path):
+    """remove_stale_socket
+    Remove the socket left by a previous server that did not stop properly, so that a new server can
+    listen to the same path. Any other file at that path is kept and raises an error, as well as a
+    socket that a server is still listening to.
+
+    Args:
+        socket_path (str): The path of the Unix socket.
+    """
+    if not os.path.lexists(socket_path):
+        return
+    assert _is_socket(socket_path), socket_path + " already exists and is not a socket."
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        # No server listens to the socket anymore
+        os.remove(socket_path)
+        return
+    finally:
+        sock.close()
+    assert False, "A server is already listening to " + socket_path + "."
+
+
+def serve(socket_path=None, jobs=_SERVER_JOBS, queue_size=_SERVER_QUEUE_SIZE):
+    """serve
+    Run pts2csv() or compare() jobs sent as JSON lines, either on the standard input or to a Unix
+    socket, so that many small jobs do not pay the startup of the interpreter and the import of
+    NumPy. Each line describes a job, e.g. {"id": 1, "kwargs": {"indir": "/data/specimen1/",
+    "outdir": "/data/specimen1/"}}, or {"id": 2, "function": "compare", "kwargs": {...}}, and a line
+    is written back for each job when it is completed, e.g. {"id": 1, "ok": true, "result": {...}}
+    or {"id": 2, "ok": false, "error": "..."}. The jobs run concurrently, so the results can come
+    back in a different order than the jobs.
+    On the standard input, the server stops once all the jobs have been read and completed, and the
+    messages of the jobs are written to the standard error. On a Unix socket, each connection can
+    send several jobs and the server runs until interrupted. Use client() to send a job.
 
     Args:
-        indir (str): The name of the directory where the output files will be stored.
-        mirror_factor (str): The name of the factor to use for mirroring the landmarks on the z-axis.
-        order (str or array of int): A string (if supplied by the command line) or an array of int
-        (if called from another python script) indicating how to reorder the landmarks (e.g. "1,3,2"
-        if supplied from the command line or [1, 3, 2] if supplied by another python script).
-        order_factor (str): The name of the factor to use for reordering the landmarks.
-        feature_names (str or array of str): String describing each feature names separated with a
-        comma or array of string (e.g. "age,sex,size" if supplied from the command line or 
-        ["age", "sex", "size"] if supplied in python script).
-        verbose (bool): Whether to output details during the process.
+        socket_path (str): The path of the Unix socket to listen to, None to read the jobs from the
+            standard input.
+        jobs (int): The number of jobs run concurrently.
+        queue_size (int): The maximum number of jobs waiting to be run.
     """
-    assert os.path.exists(indir) and os.path.isdir(indir), indir + " not found."
-    assert (order is None and order_factor is None) or (
-        order is not None
-        and order_factor is not None
-        and (isinstance(order_factor, str) or isinstance(order_factor, list))
-    ), "Must supply order and order_factor."
-    if indir[-1] != os.sep:
-        indir += os.sep
+    server = _Server(jobs, queue_size)
+    if socket_path is None:
+        respond = _respond_to(sys.stdout)
+        # The messages printed by the jobs must not be mixed with the results
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            for line in iter(sys.stdin.readline, ""):
+                if line.strip():
+                    server.submit(line, respond)
+        finally:
+            server.stop()
+            sys.stdout = stdout
+        return
 
-    nb_feature = 0
-    nb_landmark = 0
-    list_pts_files = _list_pts(indir)
-    data2write = []
-    order_factor_found_at_least_in_one_file = False
-    mirror_applied_at_least_in_one_file = False
-    # For each .pts file
-    for index, filen in enumerate(list_pts_files):
-        if verbose:
-            print(str(index + 1) + "/" + str(len(list_pts_files)) + " " + filen)
-        # Count the number of feature in that file
-        nb_detected_feature = filen[filen.find(os.sep) + 1 :].count("_") + filen.count(
-            os.sep
-        )
-        if nb_feature == 0:
-            # Use the number of features from the first .pts file as reference
-            nb_feature = nb_detected_feature
-        else:
-            # Check that the number of feature between all .pts files are consistent
-            assert nb_feature == nb_detected_feature, (
-                "The name of the file or of the directory does not seems to be consistent because for "
-                + filen
-                + " because there are "
-                + str(nb_detected_feature)
-                + " detected features while "
-                + str(nb_feature)
-                + " were expected."
-            )
-        data = []
-        # Gather semi-landmarks (S) and landmarks (C)
-        with open(filen, "r") as filep:
-            for line in filep:
-                if line[0] in ["S", "C"]:
-                    data.append(",".join(line[:-1].split("  ")[1:]))
-        # Remove duplicates landmarks generated that are generally present in the .pts files
-        data = _remove_duplicates(data)
-        if nb_landmark == 0:
-            nb_landmark = len(data)
-        assert len(data) == nb_landmark, (
-            "Some landmarks may not be correctly superimposed for "
-            + filen
-            + " because there are "
-            + str(len(data))
-            + " landmarks detected instead of "
-            + str(nb_landmark)
-        )
-        # Apply a z-axis mirror to the landmarks to study left-right differences in the given species
-        if (
-            mirror_factor is not None
-            and isinstance(mirror_factor, str)
-            and mirror_factor in filen
-        ):
-            data = _reverse_z(data)
-            mirror_applied_at_least_in_one_file = True
-        # Reorder the landmarks as specified by the order argument only for the files containing the
-        # order_factor string.
-        if order_factor is not None and order_factor in filen:
-            order_factor_found_at_least_in_one_file = True
-            if isinstance(order, str):
-                order = [int(val) for val in order.split(",")]
-            data = np.array(data)
-            data = data[order]
-            data = data.tolist()
-        # Add a new row to the data
-        # This first column contains an unique ID for each sample that corresponds to the file path
-        # and name.
-        # .replace("//", "/") replaces "//" by "/" that occurs on Windows. This is used to enable
-        # comparisons with reference files in tests for all OS.
-        row = ["/".join(filen.split(os.sep)[-2:]).replace("//", "/")]
-        data = np.array(data)
-        for val in data.reshape(data.shape[0] * data.shape[1]):
-            row.append(val)
-        filen = filen.split(".")[-2]
-        for feature in (
-            filen[filen.find(os.sep) + 1 :]
-            .replace("_", ",")
-            .replace("-", ".")
-            .split(os.sep)[-1]
-            .split(",")
-        ):
-            row.append(feature)
-        data2write.append(row)
-    if order_factor is not None:
-        assert order_factor_found_at_least_in_one_file, (
-            "The order_factor ("
-            + order_factor
-            + ") provided has not been found in any file names."
-        )
-    if mirror_factor is not None:
-        assert mirror_applied_at_least_in_one_file, (
-            "The mirror_factor ("
-            + mirror_factor
-            + ") provided has not been found in any file names."
-        )
-    modif = ""
-    if order_factor_found_at_least_in_one_file:
-        modif += "_reordered"
-    if mirror_applied_at_least_in_one_file:
-        modif += "_reversed"
-    _export2csv(
-        outdir=outdir,
-        data=data2write,
-        nb_landmark=nb_landmark,
-        feature_names=feature_names,
-        modif=modif,
-    )
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            pending = [0]
+            done = threading.Condition()
+            respond = _respond_to(self.wfile, "utf-8")
+
+            def respond_when_done(response):
+                try:
+                    respond(response)
+                except (IOError, OSError):
+                    # The client is gone, the job is completed anyway
+                    pass
+                with done:
+                    pending[0] -= 1
+                    done.notify_all()
+
+            for line in iter(self.rfile.readline, b""):
+                if line.strip():
+                    with done:
+                        pending[0] += 1
+                    server.submit(line.decode("utf-8"), respond_when_done)
+            # Keep the connection open until all the jobs it sent are completed
+            with done:
+                while pending[0]:
+                    done.wait()
+
+    assert hasattr(socketserver, "ThreadingUnixStreamServer"), "Unix sockets are not supported."
+    _remove_stale_socket(socket_path)
+    unix_server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    unix_server.daemon_threads = True
+    print("Listening on " + socket_path)
+    try:
+        unix_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        unix_server.server_close()
+        server.stop()
+        if _is_socket(socket_path):
+            os.remove(socket_path)
+
+
+def client(socket_path, kwargs, function="pts2csv"):
+    """client
+    Send a job to a server started with serve() on a Unix socket and wait for its result. The
+    relative paths are resolved by the server, so absolute paths should be supplied.
+
+    Args:
+        socket_path (str): The path of the Unix socket of the server.
+        kwargs (dict): The keyword arguments of the function, which must be JSON serializable.
+        function (str): The name of the function to call, "pts2csv" or "compare".
+
+    Returns:
+        A dict containing whether the job succeeded ("ok") and either the value returned by the
+        function ("result") or the error raised ("error").
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        request = {"id": 0, "function": function, "kwargs": kwargs}
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as filep:
+            line = filep.readline()
+    finally:
+        sock.close()
+    assert line, "The server closed the connection without result."
+    return json.loads(line.decode("utf-8"))
 
 
 def _same_file(filen1, filen2):
@@ -380,10 +4119,9 @@ def _same_file_up_to_epsilon(filen1, filen2, eps=1e-9):
             line_ref = next(filep_ref)
             line_test = next(filep_test)
             assert line_ref == line_test, "Invalid line generated for " + filen1 + ":\n" + line_test + "\nthat is different from the reference file " + filen2 + ":\n" + line_ref
-            for line_ref, line_test in zip(filep_ref, filep_test):
-                # Checks that the 38 3D landmarks generated are equal up to epsilon to the reference
-                for val_ref, val_test in zip(line_test.split(",")[1:38 * 3 + 1], line_test.split(",")[1:38 * 3 + 1]):
-                    assert abs(float(val_ref) - float(val_test)) < eps, "Invalid value detected for " + filen1 + ":\n" + line_test + "\nthat is different from the reference file " + filen2 + ":\n" + line_ref
+    # Checks that all the landmarks generated are equal up to epsilon to the reference
+    result = compare(filen2, filen1, eps)
+    assert result["equal"], "Invalid values detected for " + filen1 + " that are different from the reference file " + filen2 + ": " + json.dumps(dict((key, result[key]) for key in ["missing", "extra", "different_landmarks", "different_features", "max"]))
     return True
 
 
@@ -514,11 +4252,898 @@ def test_no_regression():
     _validation_against_ref()
 
 
+def test_remove_duplicates():
+    """test_remove_duplicates
+
+    Verify that the points whose coordinates differ by less than epsilon times the coordinates of a
+    previous point are removed, for a few points and for many points sharing the same x
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    points = [[1, 1, 1], [1 + 5e-7, 1, 1], [1 + 5e-6, 1, 1], [-1, -1, -1], [-1, -1, -1 + 1e-9], [1, 1, 1]]
+    for epsilon, expected in [(1e-7, [0, 1, 2, 3, 4]), (EPSILON, [0, 2, 3, 4]), (1e-5, [0, 3, 4])]:
+        _, index = _remove_duplicates(points, epsilon, return_index=True)
+        assert index.tolist() == expected, "Invalid duplicates with an epsilon of " + str(epsilon) + "."
+    try:
+        _remove_duplicates(points, 0)
+    except AssertionError:
+        pass
+    else:
+        raise AssertionError("An epsilon of 0 must be rejected.")
+    # Many points sharing the same x and copies of some of them moved by less than epsilon
+    rng = np.random.RandomState(0)
+    points = np.column_stack([np.ones(20000), rng.uniform(1, 100, (20000, 2))])
+    copies = points[:1000] * (1 + rng.uniform(-5e-7, 5e-7, (1000, 3)))
+    _, index = _remove_duplicates(np.concatenate([points, copies]), return_index=True)
+    assert index.tolist() == list(range(20000)), "Invalid duplicates of the points sharing the same x."
+
+
+def test_reverse_z_batch():
+    """test_reverse_z_batch
+
+    Verify that mirroring the example specimens at once gives the same landmarks as mirroring each
+    specimen on its own relatively to its plane fitted by np.linalg.lstsq
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = _get_path("example/")
+    batch = np.array([_remove_duplicates(_read_pts(filen)[1]) for filen in _list_pts(indir)])
+    mirrored = _reverse_z_batch(batch)
+    assert mirrored.shape == batch.shape, "Invalid shape of the mirrored landmarks."
+    for data, mirrored_data in zip(batch, mirrored):
+        matrix_xy = np.concatenate((data[:, :2], np.ones((len(data), 1))), axis=1)
+        fit = np.linalg.lstsq(matrix_xy, data[:, 2], rcond=None)[0]
+        normal = np.array([fit[0], fit[1], -1.0])
+        t = (-fit[2] - data.dot(normal)) / normal.dot(normal)
+        expected = data + 2.0 * t[:, np.newaxis] * normal
+        assert np.allclose(mirrored_data, expected, rtol=0.0, atol=1e-9), "Invalid mirrored landmarks."
+        assert np.allclose(_reverse_z_batch(data[np.newaxis])[0], mirrored_data, rtol=0.0, atol=1e-9), (
+            "The mirrored landmarks depend on the other specimens of the batch."
+        )
+
+
+def test_atomic_write():
+    """test_atomic_write
+
+    Verify that a run failing on a malformed file keeps the landmarks.csv file of the previous
+    run unchanged and leaves no temporary file in the output directory
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = tempfile.mkdtemp()
+    outdir = tempfile.mkdtemp()
+    try:
+        filenames = sorted(os.listdir(_get_path("example/")))
+        for filen in filenames:
+            shutil.copy(os.path.join(_get_path("example/"), filen), indir)
+        pts2csv(indir=indir, outdir=outdir)
+        with open(os.path.join(outdir, "landmarks.csv"), "rb") as filep:
+            content = filep.read()
+        # The last file is malformed, so the run fails once the other files are read
+        with open(os.path.join(indir, filenames[-1]), "a") as filep:
+            filep.write("S052 1 2\n")
+        try:
+            pts2csv(indir=indir, outdir=outdir)
+            assert False, "The malformed file must be detected."
+        except AssertionError as error:
+            assert filenames[-1] in str(error), str(error)
+        assert os.listdir(outdir) == ["landmarks.csv"], "Stray files: " + ",".join(os.listdir(outdir))
+        with open(os.path.join(outdir, "landmarks.csv"), "rb") as filep:
+            assert filep.read() == content, "The landmarks.csv file of the previous run was modified."
+    finally:
+        shutil.rmtree(indir)
+        shutil.rmtree(outdir)
+
+
+def test_parse_pts():
+    """test_parse_pts
+
+    Verify that the records of a .pts file are parsed whatever the whitespace between the values
+    and the other lines, and that a record without exactly 3 coordinates is reported with its line
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    labels, coord = _parse_pts(b"Version 1.0\n3\nS000 1 2 3\nS001  4.5  -5e-1  6\r\nC000-000\t7\t 8   9\n")
+    assert labels == ["S000", "S001", "C000-000"], "Invalid labels."
+    assert coord.tolist() == [[1.0, 2.0, 3.0], [4.5, -0.5, 6.0], [7.0, 8.0, 9.0]], "Invalid coordinates."
+    # The records are checked one by one when the other lines prevent the bulk parsing
+    for content in [b"S000 1 2 3\nS001 4 5 6", b"Version 1.0\n2\nS000 1 2 3\nend\nS001 4 5 6\n"]:
+        labels, coord = _parse_pts(content)
+        assert labels == ["S000", "S001"] and coord.tolist() == [[1, 2, 3], [4, 5, 6]], "Invalid records."
+    try:
+        _parse_pts(b"Version 1.0\n2\nS000 1 2 3 4\nS001 1 2\n", "bad.pts")
+        assert False, "A record with 4 coordinates must be detected."
+    except AssertionError as error:
+        assert "bad.pts at line 3" in str(error), str(error)
+
+
+def test_cache():
+    """test_cache
+
+    Verify that the unchanged files are loaded from the cache with the same statistics, that the
+    changed files are processed again and that the entries of the removed files are evicted
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        indir = os.path.join(tmpdir, "example")
+        cache_dir = os.path.join(tmpdir, "cache")
+        shutil.copytree(_get_path("example/"), indir)
+        filenames = _list_pts(indir)
+        first = pts2csv(indir, tmpdir, cache_dir=cache_dir)
+        assert first["cached_files"] == 0, "No file can be cached on the first run."
+        report = pts2csv(indir, tmpdir, cache_dir=cache_dir)
+        assert report["cached_files"] == len(filenames), "The unchanged files must be cached."
+        for key in ["points", "bytes_read", "duplicates_removed"]:
+            assert report[key] == first[key], "Invalid " + key + " for the cached files."
+        assert _same_file(os.path.join(tmpdir, "landmarks.csv"), _get_path("test/landmarks_ref.csv"))
+        mtime = os.path.getmtime(filenames[0]) + 10
+        os.utime(filenames[0], (mtime, mtime))
+        report = pts2csv(indir, tmpdir, cache_dir=cache_dir)
+        assert report["cached_files"] == len(filenames) - 1, "A changed file must be processed again."
+        os.remove(filenames[1])
+        report = pts2csv(indir, tmpdir, cache_dir=cache_dir)
+        assert report["cached_files"] == len(filenames) - 1, "Invalid number of cached files."
+        assert len(os.listdir(cache_dir)) == len(filenames) - 1, "The entry of a removed file must be evicted."
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_report():
+    """test_report
+
+    Verify that the hooks receive the events of the run, that the progress is rate-limited, that
+    the duplicates are reported with the name of each file and that --stats stores the statistics
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filenames = _list_pts(_get_path("example/"))
+        events = []
+        report = pts2csv(_get_path("example/"), tmpdir, hooks=[lambda event, data: events.append((event, data))])
+        names = [event for event, _ in events]
+        for name in ["file", "stage", "progress", "report"]:
+            assert name in names, "The hooks must receive the " + name + " events."
+        assert names.count("file") == len(filenames), "The hooks must receive an event per file."
+        assert events[-1] == ("report", report), "The last event must be the report of the run."
+        progress = [data for event, data in events if event == "progress"]
+        assert progress[-1]["done"] == progress[-1]["total"] == len(filenames), "The progress must end with all the files."
+        files = [item["file"] for item in report["duplicates_per_file"]]
+        assert sorted(files) == sorted(filenames), "The duplicates must be reported for each file."
+        assert report["duplicates_removed"] == sum(item["duplicates"] for item in report["duplicates_per_file"])
+        events = []
+        run_report = _RunReport(hooks=[lambda event, data: events.append(data["done"])])
+        for done in range(1, 11):
+            run_report.progress(done, 10)
+        assert events == [1, 10], "The progress must be reported at most once per interval and at the end."
+        stats = os.path.join(tmpdir, "stats.json")
+        subprocess.check_call(
+            [sys.executable, _get_path("Scyland3D.py"), "-i", _get_path("example/"), "-o", tmpdir, "--stats", stats]
+        )
+        with open(stats, "r") as filep:
+            stats = json.load(filep)
+        assert stats["files"] == len(filenames), "Invalid number of files in the statistics."
+        assert stats["duplicates_per_file"] == report["duplicates_per_file"], "Invalid duplicates in the statistics."
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_align():
+    """test_align
+
+    Verify that the Generalized Procrustes Analysis scales the specimens to a unit centroid size and
+    collapses rotated, scaled and translated copies of a specimen to the same shape, and that the
+    aligned landmarks are exported with their centroid size
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = _get_path("example/")
+    filenames = _list_pts(indir)
+    shape = LandmarkSet.from_file(filenames[0]).coords
+    random = np.random.RandomState(0)
+    copies = []
+    for scale in [1.0, 0.5, 3.0]:
+        rotation, _ = np.linalg.qr(random.normal(size=(3, 3)))
+        rotation *= np.linalg.det(rotation)
+        copies.append(scale * shape.dot(rotation) + random.normal(size=3) * 100)
+    aligned, centroid_size, _, _ = _procrustes(copies)
+    assert np.allclose(np.einsum("nkj,nkj->n", aligned, aligned), 1), "The centroid size must be 1."
+    assert np.allclose(aligned, aligned[0], atol=1e-9), "The copies must have the same shape."
+    assert np.allclose(centroid_size / centroid_size[0], [1.0, 0.5, 3.0]), "Invalid centroid size."
+    outdir = tempfile.mkdtemp()
+    try:
+        pts2csv(indir=indir, outdir=outdir, align=True)
+        filen = os.path.join(outdir, "landmarks_aligned.csv")
+        assert os.path.isfile(filen), "The aligned landmarks must be exported with the _aligned suffix."
+        with open(filen, "r") as filep:
+            rows = list(csv.reader(filep))
+        assert "centroid_size" in rows[0], "The centroid size must be exported."
+        column = rows[0].index("centroid_size")
+        batch = LandmarkBatch.from_sets([LandmarkSet.from_file(pts) for pts in filenames])
+        _, centroid_size, _, _ = _procrustes(batch.coords)
+        exported = [float(row[column]) for row in rows[1:]]
+        assert np.allclose(sorted(exported), sorted(centroid_size)), "Invalid exported centroid size."
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_variants():
+    """test_variants
+
+    Verify that generating the three reference files in a single call gives the same files as
+    generating them one by one
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = _get_path("example/")
+    dirn = _get_path("./")
+    outdir = tempfile.mkdtemp()
+    order = list(range(36, -1, -1)) + [37]
+    feature_names = "identifier,species,location,length,sex,stage,jaw,position,generation"
+    try:
+        pts2csv(
+            indir=indir,
+            outdir=outdir,
+            variants=[
+                {},
+                {"order": order, "order_factor": "upper"},
+                {"mirror_factor": "upper", "feature_names": feature_names},
+            ],
+        )
+        assert _same_file(
+            os.path.join(outdir, "landmarks.csv"), dirn + "test/landmarks_ref.csv"
+        ), "Generated file does not match the default reference."
+        assert _same_file(
+            os.path.join(outdir, "landmarks_reordered.csv"),
+            dirn + "test/landmarks_reordered_ref.csv",
+        ), "Generated file does not match the reference for the reordering."
+        assert _same_file_up_to_epsilon(
+            os.path.join(outdir, "landmarks_reversed.csv"),
+            dirn + "test/landmarks_reversed_ref.csv",
+        ), "Generated file does not match the reference for the reversing."
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_rules():
+    """test_rules
+
+    Verify that a rule table read from a CSV file gives the same files as the order_factor and
+    mirror_factor arguments, that several rules are applied in a single run, and that an order
+    which is not a permutation of the landmarks is rejected
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = _get_path("example/")
+    dirn = _get_path("./")
+    outdir = tempfile.mkdtemp()
+    order = list(range(36, -1, -1)) + [37]
+    try:
+        rules_filen = os.path.join(outdir, "rules.csv")
+        with open(rules_filen, "w") as filep:
+            filep.write("match,mirror,order\nFeature7=upper,0," + " ".join(str(val) for val in order) + "\n")
+        pts2csv(indir=indir, outdir=outdir, rules=_load_rules(rules_filen))
+        assert _same_file(
+            os.path.join(outdir, "landmarks_reordered.csv"),
+            dirn + "test/landmarks_reordered_ref.csv",
+        ), "Generated file does not match the reference for the reordering."
+        pts2csv(indir=indir, outdir=outdir, output_format="npz")
+        pts2csv(
+            indir=indir,
+            outdir=outdir,
+            output_format="npz",
+            rules=[{"match": ["upper", "tooth09"], "order": order}, {"match": "upper", "mirror": True}],
+        )
+        _, landmarks, features, _ = load_landmarks(os.path.join(outdir, "landmarks.npz"))
+        _, rules_landmarks, _, _ = load_landmarks(os.path.join(outdir, "landmarks_reordered_reversed.npz"))
+        for coords, rules_coords, feature in zip(landmarks, rules_landmarks, features):
+            if "upper" not in feature:
+                expected = coords
+            elif "tooth09" in feature:
+                expected = coords[order]
+            else:
+                expected = _reverse_z(coords)
+            assert np.allclose(rules_coords, expected), "Invalid rule applied to " + ",".join(feature)
+        try:
+            pts2csv(indir=indir, outdir=outdir, order_factor="upper", order="1,2")
+            assert False, "An order which is not a permutation of the landmarks must be detected."
+        except AssertionError as error:
+            assert "permutation of the 38 landmarks" in str(error), str(error)
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_compare():
+    """test_compare
+
+    Verify that the csv and npz outputs are found equal, and that missing, extra and different
+    specimens are detected
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = _get_path("example/")
+    outdir = tempfile.mkdtemp()
+    try:
+        pts2csv(indir=indir, outdir=outdir, mirror_factor="upper")
+        pts2csv(indir=indir, outdir=outdir, mirror_factor="upper", output_format="npz")
+        reference = os.path.join(outdir, "landmarks_reversed.csv")
+        assert compare(reference, os.path.join(outdir, "landmarks_reversed.npz"), 0.0)["equal"], (
+            "The csv and npz files must be equal."
+        )
+        with open(reference, "r") as filep:
+            lines = filep.readlines()
+        fields = lines[2].split(",")
+        fields[4] = repr(float(fields[4]) + 0.5)
+        lines[2] = ",".join(fields)
+        modified = os.path.join(outdir, "modified.csv")
+        with open(modified, "w") as filep:
+            filep.writelines(lines[:1] + lines[2:-1] + [lines[-1].replace(lines[-1].split(",")[0], "new/id", 1)])
+        result = compare(reference, modified)
+        assert not result["equal"], "The differences must be detected."
+        assert result["missing"] == [lines[1].split(",")[0], lines[-1].split(",")[0]], "Invalid missing specimens."
+        assert result["extra"] == ["new/id"] and result["different_landmarks"] == [fields[0]], "Invalid differences."
+        assert result["max_deviation"][1] == result["max"] and abs(result["max"] - 0.5) < 1e-9, "Invalid deviation."
+        try:
+            _same_file_up_to_epsilon(modified, reference)
+        except AssertionError:
+            pass
+        else:
+            raise AssertionError("_same_file_up_to_epsilon must detect the different values.")
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_shards():
+    """test_shards
+
+    Verify that the rows written in shards by chunk_size and shard_by, listed by the manifest, are
+    the rows of the single output
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = _get_path("example/")
+    outdir = tempfile.mkdtemp()
+    try:
+        pts2csv(indir=indir, outdir=outdir)
+        with open(os.path.join(outdir, "landmarks.csv"), "r") as filep:
+            header = filep.readline()
+            rows = filep.readlines()
+        for kwargs in [{"chunk_size": 2}, {"shard_by": "Feature7", "chunk_size": 2}, {"shard_by": "Feature7", "output_format": "npz"}]:
+            shard_dir = tempfile.mkdtemp(dir=outdir)
+            pts2csv(indir=indir, outdir=shard_dir, **kwargs)
+            with open(os.path.join(shard_dir, "landmarks_manifest.json"), "r") as filep:
+                manifest = json.load(filep)
+            assert manifest["rows"] == len(rows), "Invalid number of rows in the manifest."
+            for filen in os.listdir(shard_dir):
+                assert os.stat(os.path.join(shard_dir, filen)).st_mode & 0o777 == 0o666 & ~_UMASK, (
+                    "The shards must have the default permissions."
+                )
+            shard_ids = []
+            for shard in manifest["shards"]:
+                ids, landmarks, _, _ = load_landmarks(os.path.join(shard_dir, shard["files"][0]))
+                assert len(ids) == shard["rows"] and shard["rows"] <= kwargs.get("chunk_size", len(rows)), "Invalid shard."
+                assert ids[0] == shard["first_id"] and ids[-1] == shard["last_id"], "Invalid ID range."
+                shard_ids.extend(ids.tolist())
+            assert sorted(shard_ids) == sorted(row.split(",")[0] for row in rows), "Invalid rows in the shards."
+        assert [shard["files"] for shard in manifest["shards"]] == [["landmarks_lower.npz"], ["landmarks_upper.npz"]], "Invalid shard names."
+        for output_format in ["csv", "npy"]:
+            exporter = _ShardedExporter(functools.partial(_EXPORTERS[output_format], 1, 1, outdir=outdir), chunk_size=2)
+            exporter.write(["a", "b", "c"], np.zeros((3, 1, 3)), [("x",), ("y",), ("z",)])
+            shards = [exporter.shards[key]["exporter"] for key in exporter.keys]
+            assert [shard.out_file.closed for shard in shards] == [True, False], "The full shards must be closed."
+            exporter.close("_early")
+            assert load_landmarks(os.path.join(outdir, exporter.filenames[0]))[0].tolist() == ["a", "b"], "Invalid full shard."
+            # The least recently written shards are suspended and reopened when they get more rows
+            exporter = _ShardedExporter(functools.partial(_EXPORTERS[output_format], 1, 1, outdir=outdir), shard_by=0, max_open=2)
+            for ids in [["a", "b", "c"], ["d", "e"], ["f", "g", "h"]]:
+                exporter.write(ids, np.arange(len(ids) * 3.0).reshape(-1, 1, 3), [("v" + str(ord(ident) % 4),) for ident in ids])
+                shards = [exporter.shards[key]["exporter"] for key in exporter.keys]
+                assert sum(not shard.out_file.closed for shard in shards) <= 2, "Too many open shards."
+            exporter.close("_lru")
+            shards = [load_landmarks(filen)[0].tolist() for filen in exporter.filenames if filen.endswith((".csv", ".npy"))]
+            assert shards == [["a", "e"], ["b", "f"], ["c", "g"], ["d", "h"]], "Invalid suspended shards."
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_parallel():
+    """test_parallel
+
+    Verify that processing the files in worker processes generates the same file as the serial run
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = _get_path("example/")
+    outdir = tempfile.mkdtemp()
+    try:
+        pts2csv(indir=indir, outdir=outdir, mirror_factor="upper", workers=1)
+        with open(os.path.join(outdir, "landmarks_reversed.csv"), "rb") as filep:
+            serial = filep.read()
+        pts2csv(indir=indir, outdir=outdir, mirror_factor="upper", workers=2)
+        with open(os.path.join(outdir, "landmarks_reversed.csv"), "rb") as filep:
+            parallel = filep.read()
+    finally:
+        shutil.rmtree(outdir)
+    assert serial == parallel, "The parallel run does not match the serial run."
+    # The items are read ahead by at most two chunks per worker process
+    consumed = []
+    items = (consumed.append(item) or item for item in range(-1000, 0))
+    results = _imap(abs, items, workers=2, chunksize=4)
+    assert next(results) == (-1000, 1000), "Invalid first result."
+    assert len(consumed) == 2 * 2 * 4, "The items must not be read ahead by more than two chunks per worker."
+    assert list(results)[-1] == (-1, 1) and len(consumed) == 1000, "Invalid results."
+
+
+def test_output_format():
+    """test_output_format
+
+    Verify that the landmarks exported in the npy and npz formats match the ones exported in the CSV
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = _get_path("example/")
+    outdir = tempfile.mkdtemp()
+    try:
+        pts2csv(indir=indir, outdir=outdir, mirror_factor="upper")
+        pts2csv(indir=indir, outdir=outdir, mirror_factor="upper", output_format="npy")
+        pts2csv(indir=indir, outdir=outdir, mirror_factor="upper", output_format="npz")
+        with open(os.path.join(outdir, "landmarks_reversed.csv"), "r") as filep:
+            rows = list(csv.reader(filep))[1:]
+        for extension in [".npy", ".npz"]:
+            ids, landmarks, features, _ = load_landmarks(
+                os.path.join(outdir, "landmarks_reversed" + extension)
+            )
+            landmarks = landmarks.reshape(len(rows), -1)
+            for row, ident, coord, feature in zip(rows, ids, landmarks, features):
+                assert row[0] == ident, "Invalid ID in the " + extension + " file."
+                assert [float(val) for val in row[1 : 1 + len(coord)]] == coord.tolist(), (
+                    "Invalid landmarks in the " + extension + " file."
+                )
+                assert row[1 + len(coord) :] == feature.tolist(), (
+                    "Invalid features in the " + extension + " file."
+                )
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_archive():
+    """test_archive
+
+    Verify that reading the .pts files from zip and tar archives gives the same file as reading
+    them from the extracted directory
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        indir = os.path.join(tmpdir, "example")
+        shutil.copytree(_get_path("example/"), indir)
+        filenames = sorted(os.listdir(indir), reverse=True)
+        with zipfile.ZipFile(os.path.join(tmpdir, "example.zip"), "w") as zfile:
+            for filen in filenames:
+                zfile.write(os.path.join(indir, filen), "example/" + filen)
+        with tarfile.open(os.path.join(tmpdir, "example.tar.gz"), "w:gz") as tfile:
+            for filen in filenames:
+                tfile.add(os.path.join(indir, filen), "example/" + filen)
+        pts2csv(indir=indir, outdir=tmpdir, mirror_factor="upper")
+        for archive in ["example.zip", "example.tar.gz"]:
+            outdir = os.path.join(tmpdir, archive + "_out")
+            os.makedirs(outdir)
+            pts2csv(indir=os.path.join(tmpdir, archive), outdir=outdir, mirror_factor="upper")
+            with open(os.path.join(tmpdir, "landmarks_reversed.csv"), "rb") as filep:
+                expected = filep.read()
+            with open(os.path.join(outdir, "landmarks_reversed.csv"), "rb") as filep:
+                assert filep.read() == expected, "Invalid file generated from " + archive
+        # The members stored out of order are read again when they do not fit in memory
+        archive = os.path.join(tmpdir, "example.tar.gz")
+        for max_pending in [_MAX_PENDING_BYTES, 0, os.path.getsize(os.path.join(indir, filenames[0]))]:
+            members = list(_iter_tar(archive, [_PTS_PATTERN], [], [], max_pending))
+            assert [member.path for member in members] == [os.path.join(tmpdir, "example", filen) for filen in sorted(filenames)], "Invalid order."
+            for member in members:
+                with open(os.path.join(indir, os.path.basename(member.path)), "rb") as filep:
+                    assert member.content == filep.read(), "Invalid content of " + member.path
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_watch():
+    """test_watch
+
+    Verify that the csv updated in place after files are added, changed and removed is the same as
+    the csv generated from scratch
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        indir = os.path.join(tmpdir, "example")
+        outdir = os.path.join(tmpdir, "out")
+        os.makedirs(outdir)
+        shutil.copytree(_get_path("example/"), indir)
+        filenames = sorted(os.listdir(indir))
+        watcher = _Watcher(indir, outdir, [_Variant(), _Variant(mirror_factor="upper")])
+        assert len(watcher.update(watcher.snapshot())) == len(filenames), "Invalid initial update."
+        os.remove(os.path.join(indir, filenames[1]))
+        added = "999999Z" + filenames[0][filenames[0].find("_") :]
+        shutil.copy(os.path.join(indir, filenames[0]), os.path.join(indir, added))
+        with open(os.path.join(indir, filenames[2]), "rb") as filep:
+            content = filep.read()
+        with open(os.path.join(indir, filenames[2]), "wb") as filep:
+            # Move a semilandmark that is not duplicated
+            lines = content.split(b"\n")
+            lines[20] = lines[20].replace(b"  ", b"  -", 1)
+            filep.write(b"\n".join(lines))
+        assert watcher.update(watcher.snapshot()) == sorted(
+            os.path.join(indir, filen) for filen in [filenames[1], filenames[2], added]
+        ), "Invalid changes detected."
+        assert watcher.update(watcher.snapshot()) == [], "Invalid changes detected."
+        pts2csv(indir=indir, outdir=tmpdir, variants=[{}, {"mirror_factor": "upper"}])
+        for modif in ["", "_reversed"]:
+            with open(os.path.join(tmpdir, "landmarks" + modif + ".csv"), "rb") as filep:
+                expected = filep.read()
+            with open(os.path.join(outdir, "landmarks" + modif + ".csv"), "rb") as filep:
+                assert filep.read() == expected, "Invalid update of landmarks" + modif + ".csv"
+        # The outputs depending on all the specimens or not written as csv are rejected
+        for variant in [{"align": True}, {"slide": "procrustes"}]:
+            try:
+                watch(indir, outdir, variants=[variant], max_updates=0)
+            except AssertionError:
+                pass
+            else:
+                raise AssertionError("The variant " + str(variant) + " must be rejected.")
+        process = subprocess.Popen(
+            [sys.executable, _get_path("Scyland3D.py"), "-i", indir, "-o", outdir, "-w", "--output_format", "npy", "--align"],
+            stderr=subprocess.PIPE,
+        )
+        _, error = process.communicate()
+        assert process.returncode == 2, "The unsupported options must be rejected in watch mode."
+        assert b"--output_format, --align cannot be used in watch mode" in error, "Invalid error."
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_landmark_batch():
+    """test_landmark_batch
+
+    Verify that the landmarks of a LandmarkBatch are stored in a single array shared with its
+    LandmarkSet, and that the float32 landmarks exported in the npy format match the float64 ones
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = _get_path("example/")
+    filenames = _list_pts(indir)
+    batch = LandmarkBatch.from_sets([LandmarkSet.from_file(filen) for filen in filenames])
+    assert batch.coords.flags["C_CONTIGUOUS"] and len(batch) == len(filenames), "Invalid batch."
+    assert np.shares_memory(batch[1].coords, batch.coords), "The LandmarkSet must be a view."
+    assert batch[1].factors == tuple(_get_features(filenames[1])), "Invalid features."
+    outdir = tempfile.mkdtemp()
+    try:
+        pts2csv(indir=indir, outdir=outdir, output_format="npy", dtype=np.float32)
+        _, landmarks, _, _ = load_landmarks(os.path.join(outdir, "landmarks.npy"))
+        assert landmarks.dtype == np.float32, "The landmarks must be stored as float32."
+        assert np.allclose(landmarks, batch.coords, rtol=1e-6), "Invalid float32 landmarks."
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_precision():
+    """test_precision
+
+    Verify that the coordinates formatted at once are the same as the ones written by csv.writer,
+    that the float32 coordinates are written with their shortest representation and that the
+    precision and notation are applied
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    coords = np.array([[1.5312591e1, -2e-7, 1e16], [0.1, 1.0 / 3.0, 123456.789]])
+    assert _format_rows(["a,b"], coords.reshape(1, 2, 3), [("x", "y")]) == _format_csv(
+        [["a,b"] + coords.ravel().tolist() + ["x", "y"]]
+    ), "The exact coordinates must be written as with csv.writer."
+    assert _format_coords(coords, 3) == ["15.3,-2e-07,1e+16", "0.1,0.333,1.23e+05"], (
+        "Invalid general notation."
+    )
+    assert _format_coords(coords, 2, "fixed") == [
+        "15.31,-0.00,10000000000000000.00",
+        "0.10,0.33,123456.79",
+    ], "Invalid fixed notation."
+    assert _format_coords(coords.astype(np.float32)) == ["15.312591,-2e-07,1e+16", "0.1,0.33333334,123456.79"], (
+        "The float32 values must be written with their shortest representation."
+    )
+    outdir = tempfile.mkdtemp()
+    try:
+        pts2csv(indir=_get_path("example/"), outdir=outdir, dtype=np.float32)
+        with open(os.path.join(outdir, "landmarks.csv"), "r") as filep:
+            rows = list(csv.reader(filep))[1:]
+        values = [value for row in rows for value in row[1 : 1 + 38 * 3]]
+        assert all(str(np.float32(value)) == value for value in values), "Invalid float32 coordinates."
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_discovery():
+    """test_discovery
+
+    Verify that the .pts files are yielded in the sorted order of their paths and that the include,
+    exclude and exclude_dirs patterns are applied to the names of the files and directories
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    indir = tempfile.mkdtemp()
+    try:
+        for name in ["b/c.pts", "b.pts", "b-a.pts", "a.pts.bak", "a_draft.pts", "skip/d.pts", "b/e.PTS"]:
+            filen = os.path.join(indir, name)
+            if not os.path.isdir(os.path.dirname(filen)):
+                os.makedirs(os.path.dirname(filen))
+            open(filen, "w").close()
+        expected = [os.path.join(indir, name) for name in ["a_draft.pts", "b-a.pts", "b.pts", "b/c.pts", "skip/d.pts"]]
+        assert list(_iter_pts(indir)) == sorted(expected), "Invalid order of the .pts files."
+        assert list(_iter_pts(indir, "*.pts,*.PTS", "*_draft.pts", ["skip"])) == [
+            os.path.join(indir, name) for name in ["b-a.pts", "b.pts", "b/c.pts", "b/e.PTS"]
+        ], "Invalid filtering of the .pts files."
+    finally:
+        shutil.rmtree(indir)
+
+
+def test_slide():
+    """test_slide
+
+    Verify that the semilandmarks are found from the labels of the .pts files and that only them
+    slide, along their tangents, reducing the Procrustes distances between the specimens
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    filen = _list_pts(_get_path("example/"))[0]
+    labels, coord = _read_pts(filen)
+    data, index = _remove_duplicates(coord, return_index=True)
+    sliding, before, after = _curve_neighbors(labels, coord, index)
+    assert sliding.tolist() == list(range(7, 38)), "The semilandmarks must be the points of the curves."
+    assert (before[0], after[0], before[10], after[10]) == (0, 8, 16, 1), "Invalid neighbors on the curves."
+    rng = np.random.RandomState(0)
+    landmarks = data + rng.normal(0.0, 0.01, (20,) + data.shape)
+    tangent = landmarks[:, after] - landmarks[:, before]
+    landmarks[:, sliding] += rng.uniform(-0.3, 0.3, (20, len(sliding), 1)) * tangent
+    tangent = landmarks[:, after] - landmarks[:, before]
+    aligned, _, _, _ = _procrustes(landmarks)
+    for method in _SLIDING_METHODS:
+        slid, nb_iter, change = _slide(landmarks, sliding, before, after, method, max_iter=3)
+        assert nb_iter == 3 and change > 0, "The sliding must stop after max_iter iterations."
+        fixed = np.setdiff1d(np.arange(data.shape[0]), sliding)
+        assert np.array_equal(slid[:, fixed], landmarks[:, fixed]), "The landmarks must not slide."
+        shift = slid[:, sliding] - landmarks[:, sliding]
+        assert np.allclose(np.cross(shift, tangent), 0.0, atol=1e-12), (
+            "The semilandmarks must slide along their tangents."
+        )
+        aligned_slid, _, _, _ = _procrustes(slid)
+        assert np.sum((aligned_slid - aligned_slid.mean(axis=0)) ** 2) < 0.5 * np.sum(
+            (aligned - aligned.mean(axis=0)) ** 2
+        ), "The sliding must reduce the Procrustes distances."
+    outdir = tempfile.mkdtemp()
+    try:
+        report = pts2csv(_get_path("example/"), outdir, variants=[{}, {"slide": "procrustes"}], slide_max_iter=2)
+        assert [sliding["iterations"] for sliding in report["sliding"]] == [2], "Invalid report."
+        _, landmarks, _, _ = load_landmarks(os.path.join(outdir, "landmarks.csv"))
+        _, slid, _, _ = load_landmarks(os.path.join(outdir, "landmarks_slid.csv"))
+        assert np.array_equal(slid[:, :7], landmarks[:, :7]), "The landmarks must not slide."
+        assert not np.allclose(slid, landmarks), "The semilandmarks must slide."
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_specimen_index():
+    """test_specimen_index
+
+    Verify that the specimens exported several times are found by their hashes, whether their
+    coordinates are equal or close, and that the outliers are found against the median
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    filenames = _list_pts(_get_path("example/"))
+    landmarks = np.array([_remove_duplicates(_read_pts(filen)[1]) for filen in filenames])
+    rng = np.random.RandomState(0)
+    # Copy the first specimen, add a tiny noise to the second one and scale the third one
+    landmarks = np.concatenate([landmarks, [landmarks[0], landmarks[1] + rng.normal(0.0, 1e-9, landmarks[1].shape), 10.0 * landmarks[2]]])
+    paths = ["file" + str(index) for index in range(len(landmarks))]
+    index = _SpecimenIndex()
+    index.add(LandmarkBatch(landmarks[:4], paths[:4], [()] * 4, paths[:4]), [52] * 4)
+    index.add(LandmarkBatch(landmarks[4:], paths[4:], [()] * 4, paths[4:]), [52, 60, 52, 52])
+    specimens = index.as_dict()
+    assert [(item["file"], item["duplicate_of"], item["exact"]) for item in specimens["duplicates"]] == [
+        ("file5", "file0", True),
+        ("file6", "file1", False),
+        ("file7", "file2", False),
+    ], "Invalid duplicates."
+    assert [item["file"] for item in specimens["point_outliers"]] == ["file5"], "Invalid outliers by number of points."
+    assert [item["file"] for item in specimens["size_outliers"]] == ["file7"], "Invalid outliers by centroid size."
+    # The copies whose scaled coordinates differ by slightly less than the tolerance are duplicates,
+    # the noise being adjusted so that the largest difference is the expected one once scaled
+    def scale(shape):
+        shape = shape - shape.mean(axis=0)
+        return shape / np.sqrt(np.sum(shape * shape))
+    for ratio in [0.1, 0.9, 1.1, 2.0]:
+        for row in range(20):
+            shape = landmarks[row % 3]
+            noise = rng.uniform(-1.0, 1.0, shape.shape)
+            amplitude = ratio * _DUPLICATE_TOLERANCE * np.sqrt(np.sum((shape - shape.mean(axis=0)) ** 2))
+            for _ in range(5):
+                difference = np.abs(scale(shape + amplitude * noise) - scale(shape)).max()
+                amplitude *= ratio * _DUPLICATE_TOLERANCE / difference
+            index = _SpecimenIndex()
+            index.add(LandmarkBatch(np.array([shape, shape + amplitude * noise]), ["a", "b"], [()] * 2, ["a", "b"]), [52] * 2)
+            assert bool(index.as_dict()["duplicates"]) == (ratio < 1), "Invalid near duplicate with a difference of " + str(ratio) + " times the tolerance."
+    outdir = tempfile.mkdtemp()
+    try:
+        report = pts2csv(_get_path("example/"), outdir, check_specimens=True)
+        assert not report["specimens"]["duplicates"], "The example files are not duplicated."
+        assert report["specimens"]["median_points"] == 52, "Invalid median number of points."
+        # The number of points of the cached files are the ones of the files
+        indir = os.path.join(outdir, "example")
+        shutil.copytree(_get_path("example/"), indir)
+        cache_dir = os.path.join(outdir, "cache")
+        pts2csv(indir, outdir, cache_dir=cache_dir)
+        for filen in _list_pts(indir)[:2]:
+            mtime = os.path.getmtime(filen) + 10
+            os.utime(filen, (mtime, mtime))
+        report = pts2csv(indir, outdir, cache_dir=cache_dir, check_specimens=True)
+        assert report["cached_files"] == 3, "Invalid number of cached files."
+        assert report["specimens"]["median_points"] == 52, "Invalid median number of points of the cached files."
+        assert not report["specimens"]["point_outliers"], "The cached files must not be outliers."
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_server():
+    """test_server
+
+    Verify that the jobs read from the standard input by the server give the same files as the
+    direct calls and that the errors are reported without stopping the server
+
+    Args:
+        None
+    Returns:
+        None
+    """
+    outdir = tempfile.mkdtemp()
+    stdin, stdout = sys.stdin, sys.stdout
+    try:
+        jobs = [
+            {"id": 1, "kwargs": {"indir": _get_path("example/"), "outdir": outdir}},
+            {"id": 2, "kwargs": {"indir": os.path.join(outdir, "missing/"), "outdir": outdir}},
+        ]
+        sys.stdin = io.StringIO(u"".join(json.dumps(job) + "\n" for job in jobs) + u"not a job\n")
+        sys.stdout = io.StringIO()
+        serve(jobs=2, queue_size=1)
+        responses = sys.stdout.getvalue()
+    finally:
+        sys.stdin, sys.stdout = stdin, stdout
+    try:
+        responses = dict((response["id"], response) for response in map(json.loads, responses.splitlines()))
+        assert set(responses) == set([1, 2, None]), "A result must be written for each job."
+        assert responses[1]["ok"] and responses[1]["result"]["files"] == 5, "Invalid result."
+        assert _same_file(os.path.join(outdir, "landmarks.csv"), _get_path("test/landmarks_ref.csv"))
+        assert not responses[2]["ok"] and not responses[None]["ok"], "The errors must be reported."
+        # Only a socket that no server listens to is removed
+        filen = os.path.join(outdir, "server.sock")
+        open(filen, "w").close()
+        try:
+            _remove_stale_socket(filen)
+            assert False, "A file that is not a socket must not be removed."
+        except AssertionError as error:
+            assert "not a socket" in str(error), str(error)
+        assert os.path.exists(filen), "A file that is not a socket must not be removed."
+        os.remove(filen)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(filen)
+        sock.close()
+        _remove_stale_socket(filen)
+        assert not os.path.lexists(filen), "A stale socket must be removed."
+    finally:
+        shutil.rmtree(outdir)
+
+
 if __name__ == "__main__":
     """main entry point
-    Parse arguments and call the function to convert multiple .pts files to a single csv file
+    Parse arguments and call the function to convert multiple .pts files to a single csv file, or
+    compare two generated files with the compare subcommand
     """
-    parser = argparse.ArgumentParser(description='Scyland3D: Processing 3D landmarks.')
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        parser = argparse.ArgumentParser(prog="Scyland3D compare", description='Scyland3D: Comparing the landmarks of two generated files.')
+        parser.add_argument('reference', help='the reference .csv, .npy or .npz file')
+        parser.add_argument('compared', help='the compared .csv, .npy or .npz file')
+        parser.add_argument('-t', '--tolerance', type=float, default=EPSILON, help='the absolute deviation above which a coordinate is considered different')
+        parser.add_argument('--json', help='a JSON file where the whole comparison is stored')
+        args = parser.parse_args(sys.argv[2:])
+        result = compare(args.reference, args.compared, args.tolerance)
+        print(str(result["nb_common"]) + " specimens compared, " + str(len(result["missing"])) + " missing, " + str(len(result["extra"])) + " extra")
+        for key in ["missing", "extra", "different_landmarks", "different_features"]:
+            for ident in result[key][:_NB_SHOWN]:
+                print(key.replace("_", " ").capitalize() + ": " + ident)
+            if len(result[key]) > _NB_SHOWN:
+                print("... and " + str(len(result[key]) - _NB_SHOWN) + " more")
+        print("Maximum absolute deviation: " + repr(result["max"]) + ", mean absolute deviation: " + repr(result["mean"]))
+        worst = int(np.argmax(result["max_deviation"])) if result["max_deviation"] else 0
+        if result["max"] > 0:
+            print("Landmark with the largest deviation: " + str(worst + 1))
+        if args.json is not None:
+            with open(args.json, "w") as filep:
+                json.dump(result, filep, indent=2, sort_keys=True)
+        print("The files are equal" if result["equal"] else "The files are different")
+        sys.exit(0 if result["equal"] else 1)
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        parser = argparse.ArgumentParser(prog="Scyland3D serve", description='Scyland3D: Running the jobs sent as JSON lines to a Unix socket or to the standard input.')
+        parser.add_argument('-s', '--socket', help='the Unix socket to listen to, the jobs being read from the standard input by default')
+        parser.add_argument('-j', '--jobs', type=int, default=_SERVER_JOBS, help='the number of jobs run concurrently')
+        parser.add_argument('-q', '--queue_size', type=int, default=_SERVER_QUEUE_SIZE, help='the maximum number of jobs waiting to be run')
+        args = parser.parse_args(sys.argv[2:])
+        serve(args.socket, args.jobs, args.queue_size)
+        sys.exit(0)
+    is_client = len(sys.argv) > 1 and sys.argv[1] == "client"
+    if is_client:
+        parser = argparse.ArgumentParser(prog="Scyland3D client", description='Scyland3D: Sending the processing of 3D landmarks to a server.')
+        parser.add_argument('-s', '--socket', required=True, help='the Unix socket of the server')
+    else:
+        parser = argparse.ArgumentParser(description='Scyland3D: Processing 3D landmarks.')
     parser.add_argument('-i', '--indir', type=str, help='the input directory containing the landmarks to process')
     parser.add_argument('-o', '--outdir', help='the output directory containing the landmarks to process')
     parser.add_argument('-m', '--mirror_factor', help='the factor to be used when mirroring the corresponding landmarks')
@@ -526,8 +5151,79 @@ if __name__ == "__main__":
     parser.add_argument('-f', '--order_factor',help='the factor to be used when reordering the corresponding landmarks')
     parser.add_argument('-n', '--feature_names', help='the feature names to use in the header in the output file')
     parser.add_argument('-v', '--verbose', default=False, action="store_true", help='whether to output the processing steps')
+    parser.add_argument('-e', '--epsilon', type=float, default=EPSILON, help='the relative tolerance used to detect duplicated landmarks')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='the number of processes to use, 0 uses all the CPUs')
+    parser.add_argument('-c', '--cache', help='the directory where the processed files are cached between runs')
+    parser.add_argument('--cache_hash', default=False, action="store_true", help='whether to check the content of the files before using the cache')
+    parser.add_argument('--output_format', default="csv", choices=["csv", "npy", "npz"], help='the format of the output file')
+    parser.add_argument('-a', '--align', default=False, action="store_true", help='whether to align the landmarks with a Generalized Procrustes Analysis')
+    parser.add_argument('--stats', help='a JSON file where the statistics of the run are stored')
+    parser.add_argument('--include', help='the glob patterns of the files to process separated with a comma, "*.pts" by default')
+    parser.add_argument('--exclude', help='the glob patterns of the files to ignore separated with a comma')
+    parser.add_argument('--exclude_dirs', help='the glob patterns of the directories to ignore separated with a comma')
+    parser.add_argument('--variants', help='a JSON file containing the list of outputs to generate, each one described by its mirror_factor, order, order_factor and feature_names')
+    parser.add_argument('--dtype', default="float64", choices=["float64", "float32"], help='the type of the coordinates, float32 halving the memory used')
+    parser.add_argument('--rules', help='a JSON or CSV file containing the rules mirroring and reordering the landmarks depending on the features of each file')
+    parser.add_argument('--chunk_size', type=int, help='the maximum number of rows of each output file')
+    parser.add_argument('--shard_by', help='the name of the feature whose values are written in different output files')
+    parser.add_argument('--slide', choices=_SLIDING_METHODS, help='the criterion minimized when sliding the semilandmarks along their curves')
+    parser.add_argument('--slide_max_iter', type=int, default=_SLIDE_MAX_ITER, help='the maximum number of iterations of the sliding')
+    parser.add_argument('--check_specimens', default=False, action="store_true", help='whether to find the duplicated specimens and the outliers by number of points or centroid size')
+    parser.add_argument('--duplicate_tolerance', type=float, default=_DUPLICATE_TOLERANCE, help='the difference between the scaled coordinates below which two specimens are duplicates')
+    parser.add_argument('-p', '--precision', type=int, help='the number of digits of the coordinates in the csv, all the digits by default')
+    parser.add_argument('--notation', default=_NOTATION, choices=sorted(_NOTATIONS), help='the notation of the coordinates when a precision is supplied')
+    parser.add_argument('-w', '--watch', default=False, action="store_true", help='whether to keep the csv files up to date with the .pts files added, changed or removed in the input directory')
+    parser.add_argument('--interval', type=float, default=_WATCH_INTERVAL, help='the duration in seconds between two polls of the input directory in watch mode')
+    parser.add_argument('--debounce', type=float, default=_WATCH_DEBOUNCE, help='the duration in seconds without any change to wait before processing the changes in watch mode')
+    parser.add_argument('-l', '--list', default=False, action="store_true", help='whether to only print the files that would be processed')
     if len(sys.argv) == 1:
         parser.print_help(sys.stderr)
         sys.exit(1)
-    args = parser.parse_args()
-    pts2csv(args.indir, args.outdir, args.mirror_factor, args.order, args.order_factor, args.feature_names, args.verbose)
+    args = parser.parse_args(sys.argv[2:] if is_client else sys.argv[1:])
+    if args.list:
+        indir = args.indir if args.indir is not None else "./"
+        if _is_archive(indir):
+            filenames = (member.path for member in _iter_archive(indir, args.include, args.exclude, args.exclude_dirs))
+        else:
+            filenames = _iter_pts(indir, args.include, args.exclude, args.exclude_dirs)
+        for filen in filenames:
+            print(filen)
+        sys.exit(0)
+    if args.variants is not None:
+        with open(args.variants, "r") as filep:
+            args.variants = json.load(filep)
+    if args.rules is not None:
+        args.rules = _load_rules(args.rules)
+    if is_client:
+        # The server runs in its own directory so the paths are made absolute, the output being
+        # written to the current directory by default like without server
+        for key in ["indir", "outdir", "cache"]:
+            if getattr(args, key) is not None or key == "outdir":
+                setattr(args, key, os.path.abspath(getattr(args, key) or "./"))
+        kwargs = dict(
+            (key, getattr(args, name))
+            for key, name in [("indir", "indir"), ("outdir", "outdir"), ("mirror_factor", "mirror_factor"), ("order", "order"), ("order_factor", "order_factor"), ("feature_names", "feature_names"), ("verbose", "verbose"), ("epsilon", "epsilon"), ("workers", "jobs"), ("cache_dir", "cache"), ("cache_hash", "cache_hash"), ("output_format", "output_format"), ("variants", "variants"), ("align", "align"), ("include", "include"), ("exclude", "exclude"), ("exclude_dirs", "exclude_dirs"), ("dtype", "dtype"), ("precision", "precision"), ("notation", "notation"), ("rules", "rules"), ("chunk_size", "chunk_size"), ("shard_by", "shard_by"), ("slide", "slide"), ("slide_max_iter", "slide_max_iter"), ("check_specimens", "check_specimens"), ("duplicate_tolerance", "duplicate_tolerance")]
+        )
+        response = client(args.socket, kwargs)
+        if not response["ok"]:
+            sys.stderr.write(response["error"] + "\n")
+            sys.exit(1)
+        if args.stats is not None:
+            with open(args.stats, "w") as filep:
+                json.dump(response["result"], filep, indent=2, sort_keys=True)
+        sys.exit(0)
+    if args.watch:
+        # The outputs are csv files updated in place, which cannot depend on all the specimens
+        unsupported = [
+            "--" + name
+            for name, default in [("output_format", "csv"), ("dtype", "float64"), ("align", False), ("slide", None), ("chunk_size", None), ("shard_by", None), ("check_specimens", False), ("stats", None)]
+            if getattr(args, name) != default
+        ]
+        if unsupported:
+            parser.error(", ".join(unsupported) + " cannot be used in watch mode")
+        watch(args.indir, args.outdir, args.mirror_factor, args.order, args.order_factor, args.feature_names, args.verbose, args.epsilon, args.jobs, args.cache, args.variants, args.include, args.exclude, args.exclude_dirs, args.interval, args.debounce, None, args.precision, args.notation, args.rules, args.cache_hash)
+        sys.exit(0)
+    report = pts2csv(args.indir, args.outdir, args.mirror_factor, args.order, args.order_factor, args.feature_names, args.verbose, args.epsilon, args.jobs, args.cache, args.cache_hash, args.output_format, args.variants, args.align, None, args.include, args.exclude, args.exclude_dirs, args.dtype, args.precision, args.notation, args.rules, args.chunk_size, args.shard_by, args.slide, args.slide_max_iter, args.check_specimens, args.duplicate_tolerance)
+    if args.stats is not None:
+        with open(args.stats, "w") as filep:
+            json.dump(report, filep, indent=2, sort_keys=True)
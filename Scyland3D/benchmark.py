@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+#
+# Authors   Fidji Berio and Yann Bayle
+# E-mails   fidji.berio@ens-lyon.fr and bayle.yann@live.fr
+# License   MIT
+#
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+
+from . import Scyland3D
+
+# Number of landmarks (S) in the example files, the following points being semilandmarks (C)
+_NB_S = 7
+# Relative tolerance to consider that a stage is slower than in the previous results
+_REGRESSION_THRESHOLD = 1.25
+# Difference in seconds below which the durations of a stage are considered equal
+_MIN_DIFFERENCE = 1e-3
+
+
+def generate_corpus(outdir, nb_file=5, nb_point=38, duplicate_rate=0.3, depth=1, seed=0):
+    """generate_corpus
+    Generate a synthetic tree of .pts files in the Landmark Editor format modeled on the example
+    files, i.e. files named after 9 features separated by "_" and containing landmarks (S) followed
+    by semilandmarks (C), some of them being exported twice.
+
+    Args:
+        outdir (str): The name of the directory where the tree is generated.
+        nb_file (int): The number of .pts files.
+        nb_point (int): The number of distinct points in each file, i.e. the number of landmarks
+            remaining after the duplicates are removed.
+        duplicate_rate (float): The number of duplicated points in each file relatively to
+            nb_point. Half of the duplicates are exact copies and the other half differ by less than
+            the default epsilon.
+        depth (int): The number of directories between outdir and the .pts files.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        An array of the generated .pts file names.
+    """
+    assert nb_file > 0 and nb_point > 0, "The number of files and points must be positive."
+    assert depth >= 0, "The depth must be positive or null."
+    rng = np.random.RandomState(seed)
+    # All specimens are variations of a same shape with positive coordinates like in the examples
+    shape = rng.uniform(20.0, 30.0, (nb_point, 3))
+    nb_duplicate = int(round(nb_point * duplicate_rate))
+    # Spread the files in directories so that each directory contains about the same number of
+    # entries
+    per_dir = max(1, int(np.ceil(nb_file ** (1.0 / (depth + 1)))))
+    labels = ["S%03d" % index for index in range(min(_NB_S, nb_point))]
+    labels += ["C%03d-%03d" % divmod(index, 100) for index in range(nb_point - len(labels))]
+    filenames = []
+    for index in range(nb_file):
+        dirn = os.path.join(
+            outdir,
+            *["dir%03d" % ((index // per_dir ** (depth - level)) % per_dir) for level in range(depth)]
+        )
+        if not os.path.isdir(dirn):
+            os.makedirs(dirn)
+        filen = os.path.join(
+            dirn,
+            "%07dG_canicula_%s_%d_%s_mature_%s_tooth%02d_%d.pts"
+            % (
+                index,
+                ["mediterranean", "atlantic"][rng.randint(2)],
+                rng.randint(30, 60),
+                ["female", "male"][rng.randint(2)],
+                ["lower", "upper"][rng.randint(2)],
+                rng.randint(1, 20),
+                rng.randint(1, 5),
+            ),
+        )
+        coord = shape + rng.normal(0.0, 0.2, shape.shape)
+        records = [labels[point] + "  " + "  ".join("%.7e" % val for val in coord[point])
+                   for point in range(nb_point)]
+        # Insert the duplicates after the point they duplicate, as the endpoints of the curves are
+        # exported again in the example files
+        for count, point in enumerate(np.sort(rng.randint(nb_point, size=nb_duplicate))[::-1]):
+            values = coord[point]
+            if count % 2:
+                values = values * (1.0 + rng.uniform(-1e-8, 1e-8, 3))
+            records.insert(
+                point + 1, "C999-%03d  " % (count % 1000) + "  ".join("%.7e" % val for val in values)
+            )
+        with open(filen, "w") as filep:
+            filep.write("Version 1.0\n" + str(len(records)) + "\n" + "\n".join(records) + "\n")
+        filenames.append(filen)
+    return filenames
+
+
+def _timeit(func, repeat):
+    """timeit
+    Return the result of func and the minimum wall time of repeat calls.
+
+    Args:
+        func (function): The function to time.
+        repeat (int): The number of calls.
+
+    Returns:
+        The result of the last call and the minimum duration in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        durations.append(time.time() - start)
+    return result, min(durations)
+
+
+def benchmark_stages(indir, repeat=3):
+    """benchmark_stages
+    Time each stage of pts2csv() on the .pts files of indir: the listing of the files, their
+    parsing, the removal of the duplicates, the mirroring, the reordering and the export, as well
+    as the whole pts2csv() call.
+
+    Args:
+        indir (str): The name of the directory where the .pts files are stored.
+        repeat (int): The number of times each stage is run, the minimum duration being kept.
+
+    Returns:
+        A dict containing the duration in seconds of each stage.
+    """
+    outdir = tempfile.mkdtemp()
+    try:
+        timings = {}
+        filenames, timings["listing"] = _timeit(lambda: Scyland3D._list_pts(indir), repeat)
+        parsed, timings["parsing"] = _timeit(
+            lambda: [Scyland3D._read_pts(filen)[1] for filen in filenames], repeat
+        )
+        deduplicated, timings["dedup"] = _timeit(
+            lambda: [Scyland3D._remove_duplicates(data) for data in parsed], repeat
+        )
+        landmarks = np.array(deduplicated)
+        _, timings["mirror"] = _timeit(lambda: Scyland3D._reverse_z_batch(landmarks), repeat)
+        order = np.arange(landmarks.shape[1])[::-1]
+        _, timings["reorder"] = _timeit(lambda: landmarks[:, order], repeat)
+        ids = [Scyland3D._get_id(filen) for filen in filenames]
+        features = [Scyland3D._get_features(filen) for filen in filenames]
+
+        def export():
+            exporter = Scyland3D._CsvExporter(landmarks.shape[1], len(features[0]), outdir=outdir)
+            exporter.write(ids, landmarks, features)
+            exporter.close()
+
+        _, timings["export"] = _timeit(export, repeat)
+        _, timings["pts2csv"] = _timeit(
+            lambda: Scyland3D.pts2csv(indir=indir, outdir=outdir), repeat
+        )
+    finally:
+        shutil.rmtree(outdir)
+    return timings
+
+
+def run_benchmark(
+    nb_files=(1, 100),
+    nb_points=(38,),
+    duplicate_rate=0.3,
+    depth=1,
+    repeat=3,
+    output="benchmark.json",
+):
+    """run_benchmark
+    Generate a synthetic corpus for each combination of number of files and of points per file, time
+    the stages of pts2csv() on it and store the results in a JSON file.
+
+    Args:
+        nb_files (array of int): The numbers of .pts files to benchmark.
+        nb_points (array of int): The numbers of points per file to benchmark.
+        duplicate_rate (float): The number of duplicated points in each file relatively to the
+            number of points.
+        depth (int): The number of directories between the root of the corpus and the .pts files.
+        repeat (int): The number of times each stage is run, the minimum duration being kept.
+        output (str): The path and name of the JSON file where the results are stored.
+
+    Returns:
+        A dict containing the results.
+    """
+    results = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": [],
+    }
+    for nb_file in nb_files:
+        for nb_point in nb_points:
+            indir = tempfile.mkdtemp()
+            try:
+                generate_corpus(indir, nb_file, nb_point, duplicate_rate, depth)
+                timings = benchmark_stages(indir, repeat)
+            finally:
+                shutil.rmtree(indir)
+            results["runs"].append(
+                {
+                    "nb_file": nb_file,
+                    "nb_point": nb_point,
+                    "duplicate_rate": duplicate_rate,
+                    "depth": depth,
+                    "timings": timings,
+                }
+            )
+            print(
+                str(nb_file)
+                + " files, "
+                + str(nb_point)
+                + " points: "
+                + ", ".join(
+                    stage + " " + "%.4f" % timings[stage] + "s" for stage in sorted(timings)
+                )
+            )
+    with open(output, "w") as filep:
+        json.dump(results, filep, indent=2, sort_keys=True)
+    print("File successfully generated: " + output)
+    return results
+
+
+def find_regressions(previous, current, threshold=_REGRESSION_THRESHOLD, min_difference=_MIN_DIFFERENCE):
+    """find_regressions
+    Compare the results of two benchmarks and list the stages that became slower.
+
+    Args:
+        previous (dict): The results of the reference benchmark, e.g. of the previous release.
+        current (dict): The results of the new benchmark.
+        threshold (float): The ratio between the new and the previous durations above which a stage
+            is considered slower.
+        min_difference (float): The difference in seconds below which a stage is not considered
+            slower, to ignore the noise of the fastest stages.
+
+    Returns:
+        An array of str describing each regression.
+    """
+    reference = {}
+    for run in previous["runs"]:
+        reference[(run["nb_file"], run["nb_point"], run["duplicate_rate"], run["depth"])] = run
+    regressions = []
+    for run in current["runs"]:
+        key = (run["nb_file"], run["nb_point"], run["duplicate_rate"], run["depth"])
+        if key not in reference:
+            continue
+        for stage, duration in sorted(run["timings"].items()):
+            previous_duration = reference[key]["timings"].get(stage)
+            if (
+                previous_duration
+                and duration > threshold * previous_duration
+                and duration - previous_duration > min_difference
+            ):
+                regressions.append(
+                    stage
+                    + " with "
+                    + str(key[0])
+                    + " files of "
+                    + str(key[1])
+                    + " points: "
+                    + "%.4f" % duration
+                    + "s instead of "
+                    + "%.4f" % previous_duration
+                    + "s"
+                )
+    return regressions
+
+
+def test_generate_corpus():
+    """test_generate_corpus
+    Verify that the generated .pts files are spread at the requested depth, are named after 9
+    features, contain the requested number of distinct points once the duplicates are removed and
+    are reproducible.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    outdir = tempfile.mkdtemp()
+    try:
+        filenames = generate_corpus(outdir, nb_file=6, nb_point=20, duplicate_rate=0.3, depth=2)
+        assert Scyland3D._list_pts(outdir) == sorted(filenames), "Invalid list of .pts files."
+        for filen in filenames:
+            assert len(os.path.relpath(filen, outdir).split(os.sep)) == 3, "Invalid depth of " + filen
+            assert len(Scyland3D._get_features(filen)) == 9, "Invalid features in " + filen
+            labels, coord = Scyland3D._read_pts(filen)
+            labels = [label for label in labels if not label.startswith("C999")]
+            assert len(labels) == 20 and labels[:_NB_S] == ["S%03d" % index for index in range(_NB_S)], (
+                "Invalid records in " + filen
+            )
+            assert len(Scyland3D._remove_duplicates(coord)) == 20, "Invalid duplicates in " + filen
+        other = tempfile.mkdtemp(dir=outdir)
+        for filen, other_filen in zip(filenames, generate_corpus(other, 6, 20, 0.3, 2)):
+            assert os.path.relpath(filen, outdir) == os.path.relpath(other_filen, other), "Not reproducible."
+    finally:
+        shutil.rmtree(outdir)
+
+
+def test_find_regressions():
+    """test_find_regressions
+    Verify that only the stages slower by more than the threshold and by more than the minimum
+    difference are reported, and that the runs absent from the previous results are ignored.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    run = {"nb_file": 100, "nb_point": 38, "duplicate_rate": 0.3, "depth": 1}
+    previous = {"runs": [dict(run, timings={"parsing": 0.1, "dedup": 0.0001, "export": 0.2})]}
+    current = {
+        "runs": [
+            dict(run, timings={"parsing": 0.2, "dedup": 0.0005, "export": 0.22, "mirror": 1.0}),
+            dict(run, nb_file=1, timings={"parsing": 10.0}),
+        ]
+    }
+    regressions = find_regressions(previous, current)
+    assert regressions == ["parsing with 100 files of 38 points: 0.2000s instead of 0.1000s"], regressions
+    assert len(find_regressions(previous, current, threshold=1.05)) == 2, "Invalid threshold."
+    assert len(find_regressions(previous, current, min_difference=0.0)) == 2, "Invalid minimum difference."
+    assert find_regressions(previous, previous) == [], "Identical results must not be regressions."
+
+
+if __name__ == "__main__":
+    """main entry point
+    Parse arguments and benchmark pts2csv on synthetic corpora
+    """
+    parser = argparse.ArgumentParser(description='Scyland3D: Benchmarking the processing of 3D landmarks.')
+    parser.add_argument('-f', '--files', type=int, nargs='+', default=[1, 100], help='the numbers of .pts files to generate')
+    parser.add_argument('-p', '--points', type=int, nargs='+', default=[38], help='the numbers of points per file to generate')
+    parser.add_argument('-d', '--duplicate_rate', type=float, default=0.3, help='the number of duplicated points relatively to the number of points')
+    parser.add_argument('--depth', type=int, default=1, help='the number of directories between the root of the corpus and the .pts files')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='the number of times each stage is run')
+    parser.add_argument('-o', '--output', default="benchmark.json", help='the JSON file where the results are stored')
+    parser.add_argument('-c', '--compare', help='a JSON file of previous results to detect regressions')
+    parser.add_argument('-g', '--generate', help='only generate a corpus in the given directory')
+    args = parser.parse_args()
+    if args.generate is not None:
+        generate_corpus(args.generate, args.files[0], args.points[0], args.duplicate_rate, args.depth)
+        sys.exit(0)
+    results = run_benchmark(args.files, args.points, args.duplicate_rate, args.depth, args.repeat, args.output)
+    if args.compare is not None:
+        with open(args.compare, "r") as filep:
+            regressions = find_regressions(json.load(filep), results)
+        for regression in regressions:
+            print("Regression: " + regression)
+        sys.exit(1 if regressions else 0)
@@ -1,7 +1,34 @@
 echo 'Testing call from python...'
 python -c 'import Scyland3D; Scyland3D.test_no_regression()'
+python -c 'import Scyland3D; Scyland3D.test_remove_duplicates()'
+python -c 'import Scyland3D; Scyland3D.test_reverse_z_batch()'
+python -c 'import Scyland3D; Scyland3D.test_atomic_write()'
+python -c 'import Scyland3D; Scyland3D.test_parse_pts()'
+python -c 'import Scyland3D; Scyland3D.test_cache()'
+python -c 'import Scyland3D; Scyland3D.test_report()'
+python -c 'import Scyland3D; Scyland3D.test_align()'
+python -c 'import Scyland3D; Scyland3D.test_variants()'
+python -c 'import Scyland3D; Scyland3D.test_rules()'
+python -c 'import Scyland3D; Scyland3D.test_compare()'
+python -c 'import Scyland3D; Scyland3D.test_shards()'
+python -c 'import Scyland3D; Scyland3D.test_parallel()'
+python -c 'import Scyland3D; Scyland3D.test_output_format()'
+python -c 'import Scyland3D; Scyland3D.test_archive()'
+python -c 'import Scyland3D; Scyland3D.test_watch()'
+python -c 'import Scyland3D; Scyland3D.test_landmark_batch()'
+python -c 'import Scyland3D; Scyland3D.test_precision()'
+python -c 'import Scyland3D; Scyland3D.test_discovery()'
+python -c 'import Scyland3D; Scyland3D.test_slide()'
+python -c 'import Scyland3D; Scyland3D.test_specimen_index()'
+python -c 'import Scyland3D; Scyland3D.test_server()'
+(cd .. && python -c 'from Scyland3D import benchmark; benchmark.test_generate_corpus()')
+(cd .. && python -c 'from Scyland3D import benchmark; benchmark.test_find_regressions()')
 echo 'Testing call from the command line...'
 python Scyland3D.py -i "example/"
 python Scyland3D.py -i "example/" -f "upper" -r "36, 35, 34, 33, 32, 31, 30, 29, 28, 27, 26, 25, 24, 23, 22, 21, 20, 19, 18, 17, 16, 15, 14, 13, 12, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1, 0, 37"
 python Scyland3D.py -i "example/" -m "upper" -n "identifier,species,location,length,sex,stage,jaw,position,generation"
 python -c 'import Scyland3D; Scyland3D._validation_against_ref()'
+python Scyland3D.py -i "example/" -m "upper" -n "identifier,species,location,length,sex,stage,jaw,position,generation" -j 2
+python -c 'import Scyland3D; Scyland3D._validation_against_ref()'
+echo 'Testing the comparison from the command line...'
+python Scyland3D.py compare "test/landmarks_reordered_ref.csv" "landmarks_reordered.csv" -t 0